@@ -5,17 +5,43 @@ Checks for THE MONSTERS (LABUBU) stock availability and sends email notification
 """
 
 import os
+import signal
 import sys
 import time
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timezone, timedelta
-import requests
-import json
+
+from coalescer import DEFAULT_COOLDOWN, DEFAULT_WINDOW, NotificationCoalescer
+from collection_config import load_collection_configs
+from dashboard import DEFAULT_HOST as DEFAULT_DASHBOARD_HOST, DashboardServer, DashboardState
+from diff_engine import DiffEngine, in_stock_alerts, total_stock, upcoming_alerts
+from email_utils import RateLimiter, close_smtp_senders
+from http_client import get_default_client
+from keyword_matcher import compile_keyword
+from notification_queue import DEFAULT_SPILL_FILE, NotificationDispatcher, PartialDeliveryError
+from notifiers import DeliveryError, FileNotifier, NotifierGroup, SMTPNotifier, WebhookNotifier
+from observation_store import ObservationStore
+from page_cache import DEFAULT_CACHE_DIR, PageCache
+from popmart_api import DEFAULT_CONCURRENCY, fetch_collections
+from scheduler import (
+    DEFAULT_BASE_INTERVAL,
+    DEFAULT_BURST_INTERVAL,
+    DEFAULT_BURST_LEAD,
+    DEFAULT_BURST_TAIL,
+    DEFAULT_MIN_INTERVAL,
+    AdaptiveScheduler,
+    DropTimers,
+)
+from state_store import StateError, atomic_write_json, load_json
+from subscriptions import SubscriptionRegistry
 
 STOCK_HISTORY_FILE = 'stock_history.json'
 UPTIME_HISTORY_FILE = 'uptime_history.json'
+# Seconds a stopping daemon waits for queued notifications before spilling them
+DAEMON_SHUTDOWN_TIMEOUT = 30
+# Emails per recipient per hour before sends are delayed (0 = unlimited)
+DEFAULT_EMAIL_RATE_LIMIT = 20
+# Schema version of stock_history.json (1 = ID sets, 2 = fingerprints)
+STOCK_HISTORY_VERSION = 2
 JST = timezone(timedelta(hours=9))
 
 
@@ -24,570 +50,741 @@ def get_jst_now():
     return datetime.now(JST)
 
 
-def load_previous_stock():
-    """Load previous stock status from file"""
-    if os.path.exists(STOCK_HISTORY_FILE):
-        try:
-            with open(STOCK_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+def _validate_stock_history(data):
+    """Raise ValueError unless data is a stock history this version can read"""
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+
+    version = data.get('version')
+    if version is None:
+        # Unversioned files predate fingerprints and are only read as legacy ID sets
+        return
+    if version != STOCK_HISTORY_VERSION:
+        raise ValueError(f"unsupported schema version {version}")
+
+    collections = data.get('collections')
+    if not isinstance(collections, dict):
+        raise ValueError("'collections' is missing")
+    for collection_id, entry in collections.items():
+        if not isinstance(entry, dict) or not isinstance(entry.get('products'), dict):
+            raise ValueError(f"collection {collection_id} has no product fingerprints")
+    if not isinstance(data.get('notified', {}), dict):
+        raise ValueError("'notified' is not an object")
+
+
+def _validate_uptime_history(data):
+    """Raise ValueError unless data is an upTime history object"""
+    if not isinstance(data, dict):
+        raise ValueError("not a JSON object")
+
+
+def _load_history(path, validate):
+    """
+    Load a history file (or its backup), returning {} if none was saved yet
+
+    Raises:
+        StateError: If the file exists but neither it nor its backup is valid
+    """
+    data = load_json(path, validate)
+    return {} if data is None else data
+
+
+def load_previous_products():
+    """
+    Load per-product fingerprints and notification cooldowns from file
+
+    Returns:
+        tuple: ({collection_id (str): {product_id: fingerprint, ...}, ...},
+                {cooldown key: UNIX timestamp of the last notification, ...})
+    """
+    data = _load_history(STOCK_HISTORY_FILE, _validate_stock_history)
+    fingerprints = {
+        collection_id: entry['products']
+        for collection_id, entry in data.get('collections', {}).items()
+        if 'products' in entry
+    }
+    return fingerprints, data.get('notified', {})
+
 
+def save_current_products(fingerprints, notified=None):
+    """
+    Save per-product fingerprints and notification cooldowns to file
 
-def save_current_stock(product_ids):
-    """Save current stock status to file"""
+    The file is replaced atomically and the previous generation is kept as a
+    backup, so a killed run never leaves a truncated history behind.
+
+    Args:
+        fingerprints: Dict with format {collection_id: {product_id: fingerprint, ...}, ...}
+        notified: Dict with format {cooldown key: UNIX timestamp, ...}
+    """
     try:
-        with open(STOCK_HISTORY_FILE, 'w') as f:
-            json.dump({'product_ids': list(product_ids), 'timestamp': get_jst_now().isoformat()}, f)
+        atomic_write_json(STOCK_HISTORY_FILE, {
+            'version': STOCK_HISTORY_VERSION,
+            'collections': {
+                str(collection_id): {'products': products}
+                for collection_id, products in fingerprints.items()
+            },
+            'notified': notified or {},
+            'timestamp': get_jst_now().isoformat()
+        })
     except Exception as e:
         print(f"Warning: Could not save stock history: {e}")
 
 
-def load_previous_uptimes():
-    """Load previous upTime tracking from file"""
-    if os.path.exists(UPTIME_HISTORY_FILE):
-        try:
-            with open(UPTIME_HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except Exception:
+def load_previous_stock(default_collection_id=None):
+    """
+    Load in-stock product IDs from a history file written before fingerprints
+
+    Only used to avoid re-notifying on the first run after an upgrade.
+
+    Args:
+        default_collection_id: Collection that owns a single-collection history
+            file written before histories were namespaced per collection
+
+    Returns:
+        dict: {collection_id (str): [product_id, ...], ...}
+    """
+    data = _load_history(STOCK_HISTORY_FILE, _validate_stock_history)
+
+    if 'product_ids' in data:
+        if default_collection_id is None:
             return {}
-    return {}
+        return {str(default_collection_id): data['product_ids']}
 
+    return {
+        collection_id: entry['product_ids']
+        for collection_id, entry in data.get('collections', {}).items()
+        if 'product_ids' in entry
+    }
 
-def save_current_uptimes(uptime_data):
+
+def load_previous_uptimes(default_collection_id=None):
     """
-    Save current upTime tracking to file
+    Load upTime tracking from the history file written before fingerprints
+
+    Only used to avoid re-notifying on the first run after an upgrade.
 
     Args:
-        uptime_data: Dict with format {'product_id_uptime': {...}, ...}
+        default_collection_id: Collection that owns a single-collection history
+            file written before histories were namespaced per collection
+
+    Returns:
+        dict: {collection_id (str): {product_id: upTime, ...}, ...}
     """
-    try:
-        with open(UPTIME_HISTORY_FILE, 'w') as f:
-            json.dump(uptime_data, f)
-    except Exception as e:
-        print(f"Warning: Could not save uptime history: {e}")
+    data = _load_history(UPTIME_HISTORY_FILE, _validate_uptime_history)
 
+    if 'collections' not in data:
+        legacy = {k: v for k, v in data.items() if k != 'timestamp'}
+        if default_collection_id is None or not legacy:
+            return {}
+        return {str(default_collection_id): legacy}
 
-def check_upcoming_sales(collection_id=223, keyword=None, debug=False):
+    return data['collections']
+
+
+def scan_collection(config, snapshot, engine, legacy_product_ids=None, legacy_uptimes=None, debug=False,
+                    subscribed=False):
     """
-    Check for products with future upTime (upcoming sales)
+    Diff one collection snapshot against its fingerprints and pick what to notify
+
+    The collection keyword only selects what the configured recipients and
+    channels are told about. When subscriptions cover the collection, every
+    product is diffed and each alert is tagged with 'matches_keyword', so a
+    subscriber whose keyword lies outside the collection keyword still gets
+    their matches.
 
     Args:
-        collection_id: Collection ID to check
-        keyword: Filter products by keyword
+        config: Collection config ({'id': int, 'keyword': str})
+        snapshot: CollectionSnapshot of the collection
+        engine: DiffEngine holding the fingerprints of every collection
+        legacy_product_ids: In-stock IDs from a pre-fingerprint history file, if any
+        legacy_uptimes: {product_id: upTime} from a pre-fingerprint history file, if any
         debug: If True, print debug information
+        subscribed: True if any subscription covers this collection
 
     Returns:
-        tuple: (all_products, upcoming_products)
+        dict: {'events': [ChangeEvent, ...], 'upcoming': {product_id: upTime},
+               'new_upcoming': [...], 'new_in_stock': [...]}
     """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-            'Accept': '*/*',
-            'Referer': 'https://www.popmart.com/',
-        }
-
-        all_products = []
-        page = 1
+    collection_id = config['id']
+    keyword = config['keyword']
+    now_timestamp = snapshot.timestamp
+    first_scan = not engine.has_state(collection_id)
+
+    matcher = compile_keyword(keyword)
+    # Normalized titles are cached per product, so one query is a substring test per product
+    products = snapshot.products if subscribed else matcher.filter(snapshot.products)
+
+    events = engine.diff(collection_id, products)
+    fingerprints = engine.fingerprints[str(collection_id)]
+
+    new_upcoming_products = upcoming_alerts(events, now_timestamp)
+    new_products = in_stock_alerts(events)
+    if subscribed:
+        for product in new_upcoming_products + new_products:
+            product['matches_keyword'] = matcher.matches(product['title'], product['id'])
+
+    # First scan after upgrading from ID-set history: skip what was already notified.
+    # Legacy files hold IDs as JSON strings while the API may return ints, so compare as str
+    if first_scan and (legacy_product_ids or legacy_uptimes):
+        notified_ids = {str(pid) for pid in legacy_product_ids or []}
+        notified_uptimes = {str(pid): up_time for pid, up_time in (legacy_uptimes or {}).items()}
+        before = len(new_products) + len(new_upcoming_products)
+        new_products = [p for p in new_products if str(p['id']) not in notified_ids]
+        new_upcoming_products = [
+            p for p in new_upcoming_products if notified_uptimes.get(str(p['id'])) != p['upTime']
+        ]
+        skipped = before - len(new_products) - len(new_upcoming_products)
+        print(f"Upgrade: skipped {skipped} product(s) already notified in the legacy history")
 
-        while True:
-            api_url = f"https://cdn-global.popmart.com/shop_productoncollection-{collection_id}-1-{page}-jp-ja.json"
+    upcoming = {pid: fp['u'] for pid, fp in fingerprints.items() if fp['u'] > now_timestamp}
+    in_stock_count = sum(1 for fp in fingerprints.values() if total_stock(fp) > 0)
 
-            try:
-                response = requests.get(api_url, headers=headers, timeout=30)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    break
-                raise
-
-            data = response.json()
-            products = data.get('productData', [])
-            if not products:
-                break
-
-            all_products.extend(products)
-            page += 1
-
-        # Current timestamp
-        now_timestamp = int(get_jst_now().timestamp())
-
-        # Find products with future upTime
-        upcoming_products = []
-
-        for product in all_products:
-            product_title = product.get('title', '')
-
-            # Filter by keyword if specified
-            if keyword and keyword.lower() not in product_title.lower():
-                continue
-
-            up_time = product.get('upTime', 0)
-
-            # Check if upTime is in the future (upcoming sale)
-            if up_time > now_timestamp:
-                sale_datetime = datetime.fromtimestamp(up_time, JST)
-                upcoming_products.append({
-                    'id': product.get('id'),
-                    'title': product_title,
-                    'upTime': up_time,
-                    'upTime_str': sale_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                    'url': f"https://www.popmart.com/jp/products/{product.get('id')}"
-                })
+    if events:
+        counts = {}
+        for event in events:
+            counts[event.kind] = counts.get(event.kind, 0) + 1
+        print("Changes: " + ', '.join(f"{kind} {count}" for kind, count in counts.items()))
+        if debug:
+            for event in events:
+                print(f"  - [{event.kind}] {event.product['title']}"
+                      + (f" (SKU {event.sku_id})" if event.sku_id is not None else '')
+                      + (f": {event.before} → {event.after}" if event.before is not None else ''))
+    else:
+        print("Changes: none")
 
-                if debug:
-                    print(f"⏰ UPCOMING: {product_title}")
-                    print(f"   Sale starts: {sale_datetime.strftime('%Y-%m-%d %H:%M:%S')} JST")
-                    print(f"   URL: https://www.popmart.com/jp/products/{product.get('id')}\n")
+    if upcoming:
+        print(f"✓ {len(upcoming)} upcoming sale(s), {len(new_upcoming_products)} new/updated")
+    else:
+        print("✗ No upcoming sales detected")
 
-        return all_products, upcoming_products
+    if in_stock_count:
+        print(f"✓ {in_stock_count} product(s) in stock, {len(new_products)} new/restocked")
+    else:
+        print("✗ No products in stock")
 
-    except Exception as e:
-        print(f"Error checking upcoming sales: {e}")
-        raise
+    return {
+        'events': events,
+        'upcoming': upcoming,
+        'new_upcoming': new_upcoming_products,
+        'new_in_stock': new_products,
+    }
 
 
-def check_stock(collection_id=223, keyword=None, debug=False):
+def _env_number(name, default, parse=int, minimum=0):
     """
-    Check stock availability for products in a collection
+    Read a numeric setting from the environment
+
+    Exits with status 1 if the value is not a number or is below minimum.
 
     Args:
-        collection_id: Collection ID to check (default: 223 for THE MONSTERS)
-        keyword: Filter products by keyword (e.g., "LABUBU", "ラブブ")
-        debug: If True, print debug information
+        name: Environment variable name
+        default: Value used when the variable is unset or empty
+        parse: int or float
+        minimum: Smallest accepted value
 
     Returns:
-        list: List of in-stock products
+        int or float: The parsed value
     """
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return parse(default)
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-            'Accept': '*/*',
-            'Referer': 'https://www.popmart.com/',
-        }
-
-        # Fetch all pages
-        # URL pattern: shop_productoncollection-{collection_id}-1-{page}-jp-ja.json
-        all_products = []
-        page = 1
-        total_products = None
-        collection_name = None
+        number = parse(value)
+    except ValueError:
+        number = None
+    # `not >=` also rejects NaN
+    if number is None or not number >= minimum:
+        expected = 'an integer' if parse is int else 'a number'
+        print(f"Error: Invalid {name}: {value!r} (expected {expected} >= {minimum})")
+        sys.exit(1)
+    return number
 
-        while True:
-            api_url = f"https://cdn-global.popmart.com/shop_productoncollection-{collection_id}-1-{page}-jp-ja.json"
 
-            try:
-                response = requests.get(api_url, headers=headers, timeout=30)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                # 404 means no more pages
-                if e.response.status_code == 404:
-                    break
-                raise
+def load_settings():
+    """
+    Read checker configuration from environment variables
 
-            data = response.json()
+    Exits with status 1 if the configuration is invalid.
 
-            if page == 1:
-                total_products = data.get('total', 0)
-                collection_name = data.get('name', 'Unknown')
+    Returns:
+        dict: Settings shared by every check in this process
+    """
+    keyword = os.environ.get('KEYWORD', '')  # Optional: filter by keyword (e.g., "LABUBU")
 
-            products = data.get('productData', [])
-            if not products:
-                break
+    # One ID, a comma-separated list ("223:LABUBU,241") or a JSON config file
+    try:
+        collections = load_collection_configs(os.environ.get('COLLECTION_ID', ''), default_keyword=keyword)
+    except ValueError as e:
+        print(f"Error: Invalid COLLECTION_ID: {e}")
+        sys.exit(1)
 
-            all_products.extend(products)
+    # On-disk cache for conditional page requests (empty string disables it)
+    page_cache_dir = os.environ.get('PAGE_CACHE_DIR', DEFAULT_CACHE_DIR)
 
-            # If we've fetched all products, stop
-            if total_products and len(all_products) >= total_products:
-                break
+    # Optional SQLite time-series store of every per-SKU observation
+    observation_db = os.environ.get('OBSERVATION_DB', '')
 
-            page += 1
+    # Optional per-recipient subscriptions (JSON file)
+    subscriptions_file = os.environ.get('SUBSCRIPTIONS_FILE', '')
+    subscriptions = None
+    if subscriptions_file:
+        try:
+            subscriptions = SubscriptionRegistry.load(subscriptions_file)
+        except ValueError as e:
+            print(f"Error: Invalid SUBSCRIPTIONS_FILE: {e}")
+            sys.exit(1)
+        print(f"Loaded {len(subscriptions)} subscription(s) for {len(subscriptions.recipients)} recipient(s)")
+        unknown = set(subscriptions.collection_ids) - {c['id'] for c in collections}
+        if unknown:
+            print(f"Warning: Subscribed collection(s) not in COLLECTION_ID: {', '.join(map(str, sorted(unknown)))}")
+
+    settings = {
+        'collections': collections,
+        # Number of collections, and pages per collection, fetched in parallel (1 = sequential)
+        'fetch_concurrency': _env_number('FETCH_CONCURRENCY', DEFAULT_CONCURRENCY, minimum=1),
+        'page_cache': PageCache(page_cache_dir) if page_cache_dir else None,
+        'store': ObservationStore(observation_db) if observation_db else None,
+        'debug': os.environ.get('DEBUG_MODE', 'false').lower() == 'true',
+        # Email configuration
+        'smtp_server': os.environ.get('SMTP_SERVER'),
+        'smtp_port': _env_number('SMTP_PORT', 587, minimum=1),
+        'smtp_username': os.environ.get('SMTP_USERNAME'),
+        'smtp_password': os.environ.get('SMTP_PASSWORD'),
+        'recipient_email': os.environ.get('RECIPIENT_EMAIL'),
+        'subscriptions': subscriptions,
+        'email_rate_limit': _env_number('EMAIL_RATE_LIMIT', DEFAULT_EMAIL_RATE_LIMIT),
+        # Coalescing window and per-product cooldown for notifications (seconds)
+        'notify_window': _env_number('NOTIFY_WINDOW', DEFAULT_WINDOW, parse=float),
+        'notify_cooldown': _env_number('NOTIFY_COOLDOWN', DEFAULT_COOLDOWN, parse=float),
+        # Additional channels: comma-separated webhook URLs, and a JSON Lines file ('-' = stdout)
+        'webhook_urls': [u.strip() for u in os.environ.get('WEBHOOK_URL', '').split(',') if u.strip()],
+        'notify_file': os.environ.get('NOTIFY_FILE', ''),
+    }
+
+    # Email configuration is optional in debug mode, or when another channel is configured
+    other_channels = settings['webhook_urls'] or settings['notify_file']
+    if not settings['debug'] and not other_channels and not email_configured(settings):
+        print("Error: Missing email configuration. Please set environment variables:")
+        print("  SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, RECIPIENT_EMAIL (or SUBSCRIPTIONS_FILE)")
+        print("  (or WEBHOOK_URL / NOTIFY_FILE for other notification channels)")
+        sys.exit(1)
 
-        if debug:
-            print(f"\n=== DEBUG MODE ===")
-            print(f"Collection: {collection_name}")
-            print(f"Total products: {total_products}")
-            print(f"Fetched products: {len(all_products)}")
-            print(f"Pages fetched: {page}")
-            print("==================\n")
-
-        in_stock_products = []
-
-        for product in all_products:
-            product_title = product.get('title', '')
-
-            # Filter by keyword if specified
-            if keyword and keyword.lower() not in product_title.lower():
-                continue
-
-            # Check all SKUs for this product
-            product_skus = []
-            total_stock = 0
-            for sku in product.get('skus', []):
-                stock = sku.get('stock', {})
-                online_stock = stock.get('onlineStock', 0)
-
-                if online_stock > 0:
-                    product_skus.append({
-                        'price': sku.get('price', 0),
-                        'currency': sku.get('currency', 'JPY'),
-                        'stock': online_stock
-                    })
-                    total_stock += online_stock
-
-            # If any SKU has stock, add the product once
-            if product_skus:
-                in_stock_products.append({
-                    'id': product.get('id'),
-                    'title': product_title,
-                    'skus': product_skus,
-                    'total_stock': total_stock,
-                    'url': f"https://www.popmart.com/jp/products/{product.get('id')}"
-                })
+    return settings
 
-                if debug:
-                    print(f"✓ IN STOCK: {product_title}")
-                    for sku_info in product_skus:
-                        print(f"  Price: {sku_info['price']} {sku_info['currency']} - 在庫あり")
-                    print(f"  URL: https://www.popmart.com/jp/products/{product.get('id')}\n")
 
-        if debug and not in_stock_products:
-            print("✗ No products in stock")
+def email_configured(settings):
+    """True if SMTP is configured and there is at least one recipient or subscription"""
+    smtp_keys = ('smtp_server', 'smtp_username', 'smtp_password')
+    return all(settings[k] for k in smtp_keys) and bool(settings['recipient_email'] or settings['subscriptions'])
 
-        return in_stock_products
 
+def record_observations(store, snapshots):
+    """
+    Record every per-SKU observation of the snapshots in the observation store
+
+    Storage errors are reported but never fail the check.
+
+    Args:
+        store: ObservationStore
+        snapshots: CollectionSnapshot objects fetched this run
+    """
+    try:
+        rows = sum(store.record_snapshot(snapshot) for snapshot in snapshots)
+        deleted = store.apply_retention()
+        print(f"Observations: {rows} recorded" + (f", {deleted} pruned" if deleted else ''))
     except Exception as e:
-        print(f"Error checking stock: {e}")
-        raise
+        print(f"Warning: Could not record observations: {e}")
 
 
-def send_upcoming_sale_notification(smtp_server, smtp_port, username, password, recipient, products):
+def create_notifiers(settings):
     """
-    Send email notification about upcoming scheduled sales
+    Create the notification channels configured in settings
+
+    Email is skipped in debug mode or when SMTP is not configured; webhook
+    and file channels are used whenever they are configured.
 
     Args:
-        smtp_server: SMTP server address
-        smtp_port: SMTP server port
-        username: SMTP username
-        password: SMTP password
-        recipient: Recipient email address
-        products: List of upcoming sale products
-    """
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['From'] = username
-        msg['To'] = recipient
-        msg['Subject'] = f'POP MART - {len(products)}件の再販が予定されています！'
-
-        # Create text version
-        text_lines = [
-            'POP MARTで商品の再販が予定されています。',
-            f'\nチェック日時: {get_jst_now().strftime("%Y-%m-%d %H:%M:%S")} (JST)',
-            f'\n再販予定商品数: {len(products)}件\n'
-        ]
+        settings: Settings from load_settings()
 
-        for i, product in enumerate(products, 1):
-            text_lines.append(f"\n{i}. {product['title']}")
-            text_lines.append(f"   販売開始: {product['upTime_str']} (JST)")
-            text_lines.append(f"   URL: {product['url']}")
+    Returns:
+        NotifierGroup: Channels notified in parallel (possibly empty)
+    """
+    notifiers = []
 
-        text = '\n'.join(text_lines)
+    if not settings['debug'] and email_configured(settings):
+        notifiers.append(SMTPNotifier(
+            settings['smtp_server'],
+            settings['smtp_port'],
+            settings['smtp_username'],
+            settings['smtp_password'],
+            settings['recipient_email'] or '',
+            rate_limiter=RateLimiter(settings['email_rate_limit']) if settings['email_rate_limit'] > 0 else None,
+            subscriptions=settings['subscriptions']
+        ))
 
-        # Create HTML version
-        html_lines = [
-            '<html><body>',
-            '<h2>POP MART - 商品の再販が予定されています！</h2>',
-            f'<p><strong>チェック日時:</strong> {get_jst_now().strftime("%Y-%m-%d %H:%M:%S")} (JST)</p>',
-            f'<p><strong>再販予定商品数:</strong> {len(products)}件</p>',
-            '<hr>'
-        ]
+    for i, url in enumerate(settings['webhook_urls'], 1):
+        notifiers.append(WebhookNotifier(url, name='webhook' if i == 1 else f'webhook{i}'))
 
-        for i, product in enumerate(products, 1):
-            html_lines.append(f'<h3>{i}. {product["title"]}</h3>')
-            html_lines.append(f'<p><strong>⏰ 販売開始:</strong> {product["upTime_str"]} (JST)</p>')
-            html_lines.append(f'<p><a href="{product["url"]}" style="background-color: #FF6B35; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">商品ページを見る</a></p>')
-            html_lines.append('<hr>')
+    if settings['notify_file']:
+        notifiers.append(FileNotifier(settings['notify_file']))
 
-        html_lines.append('</body></html>')
-        html = '\n'.join(html_lines)
+    return NotifierGroup(notifiers)
 
-        part1 = MIMEText(text, 'plain', 'utf-8')
-        part2 = MIMEText(html, 'html', 'utf-8')
 
-        msg.attach(part1)
-        msg.attach(part2)
+def create_dispatcher(notifiers):
+    """
+    Create the background notification dispatcher delivering to all channels
 
-        # Send email with retry logic
-        max_retries = 3
-        retry_delay = 5  # seconds
+    A job carries the channels still owed the notification (and, for email,
+    the recipients still owed it), so a retry after a partial failure only
+    re-sends to the channels and addresses that failed.
 
-        print(f"Attempting to send email via {smtp_server}:{smtp_port}")
+    Args:
+        notifiers: NotifierGroup from create_notifiers()
 
-        for attempt in range(max_retries):
+    Returns:
+        NotificationDispatcher: Not yet started
+    """
+    def handler(kind):
+        def deliver(payload):
+            # Jobs spilled before channels were tracked carry the bare product list
+            if isinstance(payload, list):
+                payload = {'products': payload, 'channels': None}
             try:
-                # Use SMTP_SSL for port 465, SMTP with STARTTLS for port 587
-                if smtp_port == 465:
-                    print(f"Using SMTP_SSL (port {smtp_port})")
-                    server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
-                else:
-                    print(f"Using SMTP with STARTTLS (port {smtp_port})")
-                    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
-                    server.ehlo()
-                    server.starttls()
-                    server.ehlo()
-
-                server.login(username, password)
-                server.send_message(msg)
-                server.quit()
-
-                print(f"Email notification sent successfully for upcoming sales ({len(products)} products)")
-                break  # Success, exit retry loop
-
-            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError, OSError) as e:
-                if attempt < max_retries - 1:
-                    print(f"SMTP connection error (attempt {attempt + 1}/{max_retries}): {e}")
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"Failed to send email after {max_retries} attempts: {e}")
-                    raise
-            except Exception as e:
-                # For other exceptions, don't retry
-                print(f"Error sending email: {e}")
-                raise
+                notifiers.notify(kind, payload['products'], payload['channels'], payload.get('recipients'))
+            except DeliveryError as e:
+                raise PartialDeliveryError(str(e), {
+                    'products': payload['products'],
+                    'channels': e.failed,
+                    'recipients': e.recipients,
+                })
+        return deliver
 
-    except Exception as e:
-        print(f"Error in email notification function: {e}")
-        raise
+    def drop_started_sales(payload):
+        # A sale announcement saved by an earlier run is stale once its sale has started
+        if isinstance(payload, list):
+            payload = {'products': payload, 'channels': None}
+        now = time.time()
+        products = [p for p in payload['products'] if p.get('upTime', 0) > now]
+        return dict(payload, products=products) if products else None
+
+    return NotificationDispatcher(
+        {'upcoming': handler('upcoming'), 'in_stock': handler('in_stock')},
+        spill_file=os.environ.get('NOTIFICATION_QUEUE_FILE', DEFAULT_SPILL_FILE),
+        refresh={'upcoming': drop_started_sales}
+    )
 
 
-def send_email_notification(smtp_server, smtp_port, username, password, recipient, products):
+def load_state(settings):
+    """
+    Load notification history for all configured collections
+
+    Returns:
+        dict: {'engine': DiffEngine, 'coalescer': NotificationCoalescer,
+               'legacy_stock': {...}, 'legacy_uptimes': {...}}
+    """
+    # Histories are namespaced per collection; a pre-namespace file belongs to the first one
+    first_collection_id = settings['collections'][0]['id']
+    fingerprints, notified = load_previous_products()
+    engine = DiffEngine(fingerprints)
+    coalescer = NotificationCoalescer(
+        window=settings['notify_window'], cooldown=settings['notify_cooldown'], notified=notified
+    )
+
+    # Stop tracking collections that were removed from the configuration
+    configured = {str(c['id']) for c in settings['collections']}
+    engine.forget([k for k in engine.fingerprints if k not in configured])
+
+    # Pre-fingerprint history only matters for the first run after upgrading
+    if engine.fingerprints:
+        return {'engine': engine, 'coalescer': coalescer, 'legacy_stock': {}, 'legacy_uptimes': {}}
+
+    return {
+        'engine': engine,
+        'coalescer': coalescer,
+        'legacy_stock': load_previous_stock(default_collection_id=first_collection_id),
+        'legacy_uptimes': load_previous_uptimes(default_collection_id=first_collection_id),
+    }
+
+
+def run_check(settings, state, collection_ids=None, force_flush=False):
     """
-    Send email notification about in-stock products
+    Fetch, diff and notify once for the configured collections
+
+    state is updated in place and written to the history file only when a
+    fingerprint changed, so a resident daemon does no disk I/O on quiet ticks.
 
     Args:
-        smtp_server: SMTP server address
-        smtp_port: SMTP server port
-        username: SMTP username
-        password: SMTP password
-        recipient: Recipient email address
-        products: List of in-stock products
+        settings: Settings from load_settings()
+        state: State from load_state(), carried across checks
+        collection_ids: Only check these collections (default: all); the
+            fingerprints of the others are left untouched
+        force_flush: Send pending notifications even if their coalescing
+            window has not elapsed (used by one-shot runs)
+
+    Returns:
+        dict: {'upcoming': {collection_id: {product_id: upTime}},
+               'events': [ChangeEvent, ...], 'failed': [collection_id, ...]}
     """
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['From'] = username
-        msg['To'] = recipient
-        msg['Subject'] = f'POP MART - {len(products)}件の商品が入荷しました！'
-
-        # Create text version
-        text_lines = [
-            'POP MARTで商品が入荷しました。',
-            f'\nチェック日時: {get_jst_now().strftime("%Y-%m-%d %H:%M:%S")} (JST)',
-            f'\n入荷商品数: {len(products)}件\n'
-        ]
+    collections = settings['collections']
+    if collection_ids is not None:
+        collections = [c for c in collections if c['id'] in collection_ids]
+    debug_mode = settings['debug']
+    page_cache = settings['page_cache']
+    engine = state['engine']
+
+    print(f"Checking POP MART stock (Collection ID: {', '.join(str(c['id']) for c in collections)})")
+    for config in collections:
+        if config['keyword']:
+            print(f"Filtering collection {config['id']} by keyword: {config['keyword']}")
+    print(f"Timestamp: {get_jst_now().strftime('%Y-%m-%d %H:%M:%S')} (JST)")
+    if debug_mode:
+        print("DEBUG MODE: ON")
 
-        for i, product in enumerate(products, 1):
-            text_lines.append(f"\n{i}. {product['title']}")
-            for sku in product['skus']:
-                text_lines.append(f"   価格: {sku['price']:,} {sku['currency']} - 在庫あり")
-            text_lines.append(f"   URL: {product['url']}")
-
-        text = '\n'.join(text_lines)
-
-        # Create HTML version
-        html_lines = [
-            '<html><body>',
-            '<h2>POP MART - 商品が入荷しました！</h2>',
-            f'<p><strong>チェック日時:</strong> {get_jst_now().strftime("%Y-%m-%d %H:%M:%S")} (JST)</p>',
-            f'<p><strong>入荷商品数:</strong> {len(products)}件</p>',
-            '<hr>'
-        ]
+    # Fetch every collection once, concurrently; the diff scans a single snapshot
+    if page_cache:
+        page_cache.hits = page_cache.misses = 0
+    snapshots = fetch_collections(
+        [c['id'] for c in collections], concurrency=settings['fetch_concurrency'], cache=page_cache
+    )
+    if page_cache:
+        print(f"Page cache: {page_cache.hits} not modified, {page_cache.misses} downloaded")
+
+    if settings['store']:
+        record_observations(settings['store'], [s for s in snapshots.values() if not isinstance(s, Exception)])
+
+    upcoming = {}
+    events = []
+    new_upcoming_products = []
+    new_products = []
+    failed = []
+
+    for config in collections:
+        collection_key = str(config['id'])
+        snapshot = snapshots[config['id']]
+
+        if isinstance(snapshot, Exception):
+            # Fingerprints are kept, so its products are not re-notified next run
+            print(f"\nError checking collection {config['id']}: {snapshot}")
+            failed.append(config['id'])
+            continue
+
+        print(f"\n##### Collection {config['id']}: {snapshot.name} #####")
+        print(f"Fetched {len(snapshot)} product(s) from {snapshot.pages} page(s)")
+
+        result = scan_collection(
+            config,
+            snapshot,
+            engine,
+            legacy_product_ids=state['legacy_stock'].pop(collection_key, None),
+            legacy_uptimes=state['legacy_uptimes'].pop(collection_key, None),
+            debug=debug_mode,
+            subscribed=bool(settings['subscriptions'] and settings['subscriptions'].covers(config['id']))
+        )
+
+        upcoming[config['id']] = result['upcoming']
+        events.extend(result['events'])
+        new_upcoming_products.extend(result['new_upcoming'])
+        new_products.extend(result['new_in_stock'])
+
+    # One consolidated notification per kind across all collections, collected over
+    # the coalescing window; delivery happens on the dispatcher's worker thread
+    coalescer = state['coalescer']
+    print("\n=== Notifications ===")
+    if new_upcoming_products:
+        accepted = coalescer.add('upcoming', new_upcoming_products)
+        print(f"✓ {len(new_upcoming_products)} new/updated upcoming sale(s) in total, {accepted} to notify")
+
+    if new_products:
+        accepted = coalescer.add('in_stock', new_products)
+        print(f"✓ {len(new_products)} new/restocked product(s) in total, {accepted} to notify")
+
+    if not new_upcoming_products and not new_products:
+        print("✓ Nothing new to notify")
+
+    coalescer.flush(force=force_flush)
+    until_flush = coalescer.seconds_until_flush()
+    if until_flush is not None:
+        print(f"Collecting notifications for {until_flush:.0f}s more before sending")
+
+    # Publish the fresh snapshots to open dashboards
+    if state.get('dashboard'):
+        state['dashboard'].update([s for s in snapshots.values() if not isinstance(s, Exception)], events)
+
+    # Save fingerprints and cooldowns only when something changed
+    if engine.dirty or coalescer.dirty:
+        save_current_products(engine.fingerprints, coalescer.notified)
+        engine.dirty = coalescer.dirty = False
+
+    return {
+        'upcoming': upcoming,
+        'events': events,
+        'failed': failed,
+    }
+
+
+def run_daemon(settings, state, scheduler, drop_timers):
+    """
+    Stay resident and check on the adaptive scheduler until interrupted
 
-        for i, product in enumerate(products, 1):
-            html_lines.append(f'<h3>{i}. {product["title"]}</h3>')
-            html_lines.append('<ul>')
-            for sku in product['skus']:
-                html_lines.append(f'<li><strong>価格:</strong> {sku["price"]:,} {sku["currency"]} - 在庫あり</li>')
-            html_lines.append('</ul>')
-            html_lines.append(f'<p><a href="{product["url"]}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">商品ページを見る</a></p>')
-            html_lines.append('<hr>')
+    The HTTP session, page cache and notification history are kept in memory
+    across checks. Every upcoming upTime registers a drop timer; while a drop's
+    burst window is open, only its collection is checked, at the burst
+    interval. Errors in one check are logged and the loop continues.
 
-        html_lines.append('</body></html>')
-        html = '\n'.join(html_lines)
+    SIGTERM (e.g. from systemd or docker stop) stops the daemon like Ctrl+C,
+    so pending digests and queued notifications are flushed or spilled.
 
-        part1 = MIMEText(text, 'plain', 'utf-8')
-        part2 = MIMEText(html, 'html', 'utf-8')
+    Args:
+        settings: Settings from load_settings()
+        state: State from load_state()
+        scheduler: AdaptiveScheduler deciding the delay between full checks
+        drop_timers: DropTimers deciding when and where to burst
+    """
+    print(f"Daemon mode: base interval {scheduler.base_interval:.0f}s, "
+          f"min interval {scheduler.min_interval:.0f}s, "
+          f"burst every {drop_timers.burst_interval:.0f}s from "
+          f"T-{drop_timers.burst_lead:.0f}s to T+{drop_timers.burst_tail:.0f}s")
 
-        msg.attach(part1)
-        msg.attach(part2)
+    def stop(signum, frame):
+        # A second SIGTERM must not interrupt the shutdown below
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise KeyboardInterrupt
 
-        # Send email with retry logic
-        max_retries = 3
-        retry_delay = 5  # seconds
+    signal.signal(signal.SIGTERM, stop)
 
-        print(f"Attempting to send email via {smtp_server}:{smtp_port}")
-        print(f"Username: {username}")
-        print(f"Password length: {len(password)} characters")
+    try:
+        while True:
+            bursting = drop_timers.active_collections()
 
-        for attempt in range(max_retries):
             try:
-                # Use SMTP_SSL for port 465, SMTP with STARTTLS for port 587
-                if smtp_port == 465:
-                    print(f"Using SMTP_SSL (port {smtp_port})")
-                    server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
-                else:
-                    print(f"Using SMTP with STARTTLS (port {smtp_port})")
-                    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
-                    server.ehlo()
-                    server.starttls()
-                    server.ehlo()
-
-                server.login(username, password)
-                server.send_message(msg)
-                server.quit()
-
-                print(f"Email notification sent successfully ({len(products)} products)")
-                break  # Success, exit retry loop
-
-            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError, OSError) as e:
-                if attempt < max_retries - 1:
-                    print(f"SMTP connection error (attempt {attempt + 1}/{max_retries}): {e}")
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
+                if bursting:
+                    for collection_id in sorted(bursting):
+                        drops = ', '.join(
+                            datetime.fromtimestamp(t, JST).strftime('%H:%M:%S')
+                            for t in drop_timers.drops_for(collection_id)
+                        )
+                        print(f"⚡ Burst check for collection {collection_id} (drop at {drops} JST)")
+                    result = run_check(settings, state, collection_ids=bursting)
                 else:
-                    print(f"Failed to send email after {max_retries} attempts: {e}")
-                    raise
+                    result = run_check(settings, state)
+
+                for collection_id, uptimes in result['upcoming'].items():
+                    scheduler.track(uptimes.values())
+                    for product_id, uptime in uptimes.items():
+                        drop_timers.register(collection_id, product_id, uptime)
+                if result['failed']:
+                    print(f"Warning: {len(result['failed'])} collection(s) could not be checked")
             except Exception as e:
-                # For other exceptions, don't retry
-                print(f"Error sending email: {e}")
-                raise
+                print(f"Error during check: {e}")
 
-    except Exception as e:
-        print(f"Error in email notification function: {e}")
-        raise
+            if bursting:
+                delay = drop_timers.burst_interval
+            else:
+                delay = scheduler.next_interval()
+                # Wake up in time for the next drop's burst window and pending digest
+                for until in (drop_timers.seconds_until_next_burst(), state['coalescer'].seconds_until_flush()):
+                    if until is not None:
+                        delay = min(delay, until)
+
+            next_check = get_jst_now() + timedelta(seconds=delay)
+            print(f"\nNext check in {delay:.0f}s ({next_check.strftime('%H:%M:%S')} JST)\n")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        print("\nDaemon stopped")
+    finally:
+        # Digests still collecting are sent (or spilled) rather than lost
+        if state['coalescer'].flush(force=True):
+            save_current_products(state['engine'].fingerprints, state['coalescer'].notified)
+        if state.get('dispatcher'):
+            state['dispatcher'].shutdown(timeout=DAEMON_SHUTDOWN_TIMEOUT)
+            state['notifiers'].close()
+        if state.get('dashboard_server'):
+            state['dashboard_server'].shutdown()
+        get_default_client().close()
+        close_smtp_senders()
 
 
 def main():
     """Main function"""
-    # Configuration
-    collection_id_str = os.environ.get('COLLECTION_ID', '223')
-    collection_id = int(collection_id_str) if collection_id_str else 223  # 223 = THE MONSTERS
-    keyword = os.environ.get('KEYWORD', '')  # Optional: filter by keyword (e.g., "LABUBU")
-
-    # Check for debug mode
-    debug_mode = os.environ.get('DEBUG_MODE', 'false').lower() == 'true'
+    import argparse
+
+    parser = argparse.ArgumentParser(description='POP MART Stock Checker')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Stay resident and poll on an adaptive schedule instead of checking once')
+    parser.add_argument('--interval', type=float, default=DEFAULT_BASE_INTERVAL,
+                        help=f'Daemon idle polling interval in seconds (default: {DEFAULT_BASE_INTERVAL})')
+    parser.add_argument('--min-interval', type=float, default=DEFAULT_MIN_INTERVAL,
+                        help=f'Daemon polling interval around a drop in seconds (default: {DEFAULT_MIN_INTERVAL})')
+    parser.add_argument('--burst-interval', type=float, default=DEFAULT_BURST_INTERVAL,
+                        help=f'Daemon check interval during a drop burst in seconds (default: {DEFAULT_BURST_INTERVAL})')
+    parser.add_argument('--burst-lead', type=float, default=DEFAULT_BURST_LEAD,
+                        help=f'Seconds before an upTime the burst starts (default: {DEFAULT_BURST_LEAD})')
+    parser.add_argument('--burst-tail', type=float, default=DEFAULT_BURST_TAIL,
+                        help=f'Seconds after an upTime the burst ends (default: {DEFAULT_BURST_TAIL})')
+    parser.add_argument('--dashboard-port', type=int, default=None,
+                        help='Serve a live dashboard on this port (daemon mode only)')
+    parser.add_argument('--dashboard-host', default=DEFAULT_DASHBOARD_HOST,
+                        help=f'Address the dashboard listens on (default: {DEFAULT_DASHBOARD_HOST})')
+
+    args = parser.parse_args()
+    if args.dashboard_port is not None and not args.daemon:
+        parser.error('--dashboard-port requires --daemon')
+
+    settings = load_settings()
 
-    # Get email configuration from environment variables
-    smtp_server = os.environ.get('SMTP_SERVER')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_username = os.environ.get('SMTP_USERNAME')
-    smtp_password = os.environ.get('SMTP_PASSWORD')
-    recipient_email = os.environ.get('RECIPIENT_EMAIL')
-
-    # In debug mode, email configuration is optional
-    if not debug_mode and not all([smtp_server, smtp_username, smtp_password, recipient_email]):
-        print("Error: Missing email configuration. Please set environment variables:")
-        print("  SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, RECIPIENT_EMAIL")
+    try:
+        state = load_state(settings)
+    except StateError as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
-    print(f"Checking POP MART stock (Collection ID: {collection_id})")
-    if keyword:
-        print(f"Filtering by keyword: {keyword}")
-    print(f"Timestamp: {get_jst_now().strftime('%Y-%m-%d %H:%M:%S')} (JST)")
-    if debug_mode:
-        print("DEBUG MODE: ON")
+    # The dashboard port is bound before any worker thread starts, so a busy port exits cleanly
+    if args.dashboard_port is not None:
+        state['dashboard'] = DashboardState()
+        try:
+            state['dashboard_server'] = DashboardServer(state['dashboard'], args.dashboard_host, args.dashboard_port)
+        except OSError as e:
+            print(f"Error: Could not start the dashboard on {args.dashboard_host}:{args.dashboard_port}: {e}")
+            sys.exit(1)
+        state['dashboard_server'].start()
+
+    # In debug mode email is skipped; without any channel no dispatcher is started
+    notifiers = create_notifiers(settings)
+    if notifiers.names:
+        print(f"Notification channels: {', '.join(notifiers.names)}")
+        state['notifiers'] = notifiers
+        state['dispatcher'] = create_dispatcher(notifiers)
+        state['dispatcher'].start()
+        state['coalescer'].dispatcher = state['dispatcher']
+
+    if args.daemon:
+        run_daemon(
+            settings,
+            state,
+            AdaptiveScheduler(base_interval=args.interval, min_interval=args.min_interval),
+            DropTimers(burst_lead=args.burst_lead, burst_tail=args.burst_tail, burst_interval=args.burst_interval)
+        )
+        return
 
-    # Check for upcoming sales (products with future upTime)
-    print("\n=== Checking for upcoming sales ===")
-    _, upcoming_products = check_upcoming_sales(collection_id=collection_id, keyword=keyword, debug=debug_mode)
-
-    if upcoming_products:
-        # Load previous upTime data
-        previous_uptimes = load_previous_uptimes()
-
-        # Create current upTime tracking: {product_id: upTime}
-        current_uptimes = {p['id']: p['upTime'] for p in upcoming_products}
-
-        # Find newly scheduled products or products with changed upTime
-        new_upcoming_products = []
-        for product in upcoming_products:
-            product_id = product['id']
-            current_uptime = product['upTime']
-
-            # Check if this is a new product or if upTime has changed
-            if product_id not in previous_uptimes or previous_uptimes.get(product_id) != current_uptime:
-                new_upcoming_products.append(product)
-
-        print(f"✓ Found {len(upcoming_products)} upcoming sale(s)!")
-        if new_upcoming_products:
-            print(f"✓ {len(new_upcoming_products)} new/updated upcoming sale(s) detected!")
-            if not debug_mode:
-                send_upcoming_sale_notification(
-                    smtp_server,
-                    smtp_port,
-                    smtp_username,
-                    smtp_password,
-                    recipient_email,
-                    new_upcoming_products
-                )
-            else:
-                print("(Debug mode: email not sent)")
-                for p in new_upcoming_products:
-                    if p['id'] in previous_uptimes:
-                        print(f"  - {p['title']}: upTime changed from {previous_uptimes[p['id']]} to {p['upTime']}")
-                    else:
-                        print(f"  - {p['title']}: new upcoming sale")
-        else:
-            print("✓ No new/updated upcoming sales (all already notified)")
-
-        # Save current upTime status: {product_id: upTime, ...}
-        current_uptimes['timestamp'] = get_jst_now().isoformat()
-        save_current_uptimes(current_uptimes)
-    else:
-        print("✗ No upcoming sales detected")
-        # Clear upTime history when no upcoming sales
-        save_current_uptimes({'timestamp': get_jst_now().isoformat()})
-
-    # Check for in-stock products
-    print("\n=== Checking for in-stock products ===")
-    in_stock_products = check_stock(collection_id=collection_id, keyword=keyword, debug=debug_mode)
-
-    if in_stock_products:
-        # Load previous stock status
-        previous_stock = load_previous_stock()
-        previous_product_ids = set(previous_stock.get('product_ids', []))
-
-        # Get current product IDs
-        current_product_ids = {p['id'] for p in in_stock_products}
-
-        # Find newly added products (not in previous stock)
-        new_product_ids = current_product_ids - previous_product_ids
-        new_products = [p for p in in_stock_products if p['id'] in new_product_ids]
-
-        print(f"✓ Found {len(in_stock_products)} product(s) in stock!")
-        if new_products:
-            print(f"✓ {len(new_products)} new product(s) detected!")
-            if not debug_mode:
-                send_email_notification(
-                    smtp_server,
-                    smtp_port,
-                    smtp_username,
-                    smtp_password,
-                    recipient_email,
-                    new_products
-                )
-            else:
-                print("(Debug mode: email not sent)")
-        else:
-            print("✓ No new products (all already notified)")
+    try:
+        result = run_check(settings, state, force_flush=True)
+    finally:
+        undelivered = 0
+        if state.get('dispatcher'):
+            undelivered = state['dispatcher'].shutdown()
+            state['notifiers'].close()
+        close_smtp_senders()
+
+    if result['failed']:
+        failed = result['failed']
+        print(f"\nError: {len(failed)} collection(s) could not be checked: {', '.join(map(str, failed))}")
+        sys.exit(1)
 
-        # Save current stock status
-        save_current_stock(current_product_ids)
-    else:
-        print("✗ No products in stock")
-        # Clear stock history when no products in stock
-        save_current_stock(set())
+    if undelivered:
+        print(f"\nError: {undelivered} notification(s) could not be delivered; they will be retried next run")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
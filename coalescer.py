@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Notification Coalescer Module
+Batches notifications over a time window and suppresses repeats within a cooldown
+"""
+
+import time
+from typing import Dict, List, Optional
+
+# Seconds products are collected before one notification is sent (0 = every check)
+DEFAULT_WINDOW = 0
+# Seconds during which the same product is not announced again for the same reason
+DEFAULT_COOLDOWN = 1800
+
+
+def product_key(kind: str, product: dict) -> str:
+    """
+    Cooldown key of a product in a notification.
+
+    Upcoming sales are keyed by their upTime as well, so a moved sale date is
+    announced even within the cooldown.
+    """
+    key = f"{kind}:{product.get('collection_id')}:{product['id']}"
+    if kind == 'upcoming':
+        key += f":{product.get('upTime')}"
+    return key
+
+
+class NotificationCoalescer:
+    """
+    Sits between the checker and the notification dispatcher.
+
+    Products are collected per notification kind from the first add() until
+    the window has elapsed, then handed to the dispatcher as one digest.
+    A product announced within the cooldown is dropped, so stock flickering
+    in and out across checks produces one notification, not one per tick.
+    """
+
+    def __init__(
+        self,
+        dispatcher=None,
+        window: float = DEFAULT_WINDOW,
+        cooldown: float = DEFAULT_COOLDOWN,
+        notified: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            dispatcher: NotificationDispatcher to enqueue digests on (None = log only)
+            window: Seconds to collect products before sending (default: 0)
+            cooldown: Seconds before a product is announced again (default: 1800)
+            notified: Saved cooldown state, {product_key: UNIX timestamp}
+        """
+        self.dispatcher = dispatcher
+        self.window = window
+        self.cooldown = cooldown
+        self.notified = dict(notified or {})
+        self.pending: Dict[str, dict] = {}
+        # Set whenever the cooldown state changes; cleared by the caller after saving
+        self.dirty = False
+
+    def _cooling(self, key: str, now: float) -> bool:
+        notified_at = self.notified.get(key)
+        return notified_at is not None and now - notified_at < self.cooldown
+
+    def add(self, kind: str, products: List[dict], now: Optional[float] = None) -> int:
+        """
+        Collect products for the next notification of a kind.
+
+        Args:
+            kind: Notification kind ('in_stock' or 'upcoming')
+            products: Product.summary() dicts
+            now: Current UNIX timestamp (default: now)
+
+        Returns:
+            int: Number of products accepted (not in cooldown)
+        """
+        now = time.time() if now is None else now
+        accepted = skipped = 0
+
+        for product in products:
+            key = product_key(kind, product)
+            if self._cooling(key, now):
+                skipped += 1
+                continue
+
+            batch = self.pending.setdefault(kind, {'opened_at': now, 'products': {}})
+            # The latest summary of a product replaces an earlier one in the same window
+            batch['products'][key] = product
+            accepted += 1
+
+        if skipped:
+            print(f"  {skipped} product(s) skipped: already announced within the last {self.cooldown / 60:.0f} min")
+        return accepted
+
+    def seconds_until_flush(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest pending digest is due, or None if nothing is pending"""
+        if not self.pending:
+            return None
+        now = time.time() if now is None else now
+        opened_at = min(batch['opened_at'] for batch in self.pending.values())
+        return max(0.0, opened_at + self.window - now)
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> int:
+        """
+        Send the digests whose window has elapsed.
+
+        Args:
+            now: Current UNIX timestamp (default: now)
+            force: Send every pending digest regardless of its window
+
+        Returns:
+            int: Number of digests sent
+        """
+        now = time.time() if now is None else now
+        sent = 0
+
+        for kind in list(self.pending):
+            batch = self.pending[kind]
+            if not force and now - batch['opened_at'] < self.window:
+                continue
+
+            del self.pending[kind]
+            products = list(batch['products'].values())
+            if self.dispatcher:
+                self.dispatcher.enqueue(kind, {'products': products, 'channels': None})
+            else:
+                print(f"(Debug mode: '{kind}' notification for {len(products)} product(s) not sent)")
+
+            for key in batch['products']:
+                self.notified[key] = now
+            self.dirty = True
+            sent += 1
+
+        # Forget cooldowns that have expired
+        expired = [key for key, notified_at in self.notified.items() if now - notified_at >= self.cooldown]
+        for key in expired:
+            del self.notified[key]
+        if expired:
+            self.dirty = True
+
+        return sent
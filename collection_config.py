@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Collection Config Module
+Parses the COLLECTION_ID setting shared by the checker and the listing tool
+"""
+
+import json
+
+
+def load_collection_configs(value, default_keyword=''):
+    """
+    Parse the COLLECTION_ID setting into per-collection configs
+
+    Accepts a single ID ("223"), a comma-separated list with optional
+    per-collection keywords ("223:LABUBU,241"), or the path of a JSON config
+    file ("collections.json") holding a list such as
+    [{"id": 223, "keyword": "LABUBU"}, {"id": 241}].
+
+    Args:
+        value: COLLECTION_ID value (empty means 223 = THE MONSTERS)
+        default_keyword: Keyword for collections that do not set their own
+
+    Returns:
+        list: [{'id': int, 'keyword': str}, ...] in configured order
+
+    Raises:
+        ValueError: If the value or config file is malformed or repeats an ID
+    """
+    value = (value or '').strip()
+
+    if value.endswith('.json'):
+        try:
+            with open(value, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"could not read {value}: {e}")
+        if isinstance(entries, dict):
+            entries = entries.get('collections', [])
+    else:
+        entries = []
+        for item in (value or '223').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            collection_id, _, keyword = item.partition(':')
+            entries.append({'id': collection_id.strip(), 'keyword': keyword.strip()})
+
+    configs = []
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or 'id' not in entry:
+            raise ValueError(f"invalid collection entry: {entry!r}")
+        try:
+            collection_id = int(entry['id'])
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid collection ID: {entry['id']!r}")
+        if collection_id in seen:
+            raise ValueError(f"collection {collection_id} is listed more than once")
+        seen.add(collection_id)
+        configs.append({'id': collection_id, 'keyword': entry.get('keyword') or default_keyword})
+
+    if not configs:
+        raise ValueError("no collections configured")
+
+    return configs
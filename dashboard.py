@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Dashboard Module
+Serves the stock report, a JSON API and live updates from the checker's in-memory state
+"""
+
+import json
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from generate_html_report import build_data_island, iter_virtual_report
+
+JST = timezone(timedelta(hours=9))
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Change events kept for /api/events
+DEFAULT_EVENT_HISTORY = 1000
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15
+# Updates buffered per browser before it is considered stalled and dropped
+SSE_QUEUE_SIZE = 32
+
+# Added to the virtual-scrolling report: reload the data whenever the checker publishes an update
+LIVE_SCRIPT = """    <script>
+        function updateCounts(data) {
+            const inStock = data.filters['in-stock'].length;
+            const outOfStock = data.filters['out-of-stock'].length;
+            const counts = [data.ids.length, inStock, outOfStock, data.filters['new'].length, data.filters['hot'].length];
+            document.querySelectorAll('.filter-tab').forEach((tab, i) => {
+                tab.textContent = tab.textContent.replace(/\\(\\d+\\)/, '(' + counts[i] + ')');
+            });
+            document.querySelectorAll('.stat-card .number').forEach((number, i) => {
+                number.textContent = [data.ids.length, inStock, outOfStock][i];
+            });
+            document.querySelectorAll('.header .subtitle')[1].textContent = '更新日時: ' + data.timestamp;
+        }
+
+        const source = new EventSource('/events');
+        source.addEventListener('update', () => {
+            fetch('/api/products')
+                .then(response => response.json())
+                .then(data => {
+                    updateCounts(data);
+                    setData(data);
+                });
+        });
+    </script>
+"""
+
+
+def event_to_dict(seq: int, event) -> dict:
+    """
+    JSON form of a ChangeEvent
+
+    Args:
+        seq: Sequence number of the event
+        event: ChangeEvent
+
+    Returns:
+        dict: seq, kind, collection_id, product_id, sku_id, before, after, title and url
+    """
+    return {
+        'seq': seq,
+        'kind': event.kind,
+        'collection_id': event.collection_id,
+        'product_id': event.product_id,
+        'sku_id': event.sku_id,
+        'before': event.before,
+        'after': event.after,
+        'title': event.product.get('title') if event.product else None,
+        'url': event.product.get('url') if event.product else None,
+    }
+
+
+class DashboardState:
+    """
+    Latest products and recent change events, shared by the checker and the server.
+
+    The checker calls update() after every check; the rendered report and
+    the product JSON are built at most once per update, however many
+    browsers ask for them.
+    """
+
+    def __init__(self, max_events: int = DEFAULT_EVENT_HISTORY):
+        """
+        Args:
+            max_events: Change events kept for /api/events (default: 1000)
+        """
+        self._lock = threading.Lock()
+        self._snapshots: Dict[int, object] = {}
+        self._events = deque(maxlen=max_events)
+        self._next_seq = 1
+        self._subscribers: List[queue.Queue] = []
+        self._cache: Dict[str, bytes] = {}
+        self.version = 0
+        self.updated_at: Optional[datetime] = None
+
+    def update(self, snapshots: Iterable, events: Iterable = ()):
+        """
+        Replace the products of the given collections and record new events.
+
+        Collections that were not fetched keep their previous snapshot.
+
+        Args:
+            snapshots: CollectionSnapshot objects fetched by this check
+            events: ChangeEvent objects detected by this check
+        """
+        with self._lock:
+            for snapshot in snapshots:
+                self._snapshots[snapshot.collection_id] = snapshot
+            new_events = []
+            for event in events:
+                new_events.append(event_to_dict(self._next_seq, event))
+                self._next_seq += 1
+            self._events.extend(new_events)
+            self._cache.clear()
+            self.version += 1
+            self.updated_at = datetime.now(JST)
+            message = {'version': self.version, 'events': new_events}
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A stalled browser is dropped; it reconnects and reloads
+                self.unsubscribe(subscriber)
+
+    def _meta(self) -> tuple:
+        # (all_products.json style metadata, every Product); called with the lock held
+        snapshots = list(self._snapshots.values())
+        products = [p for s in snapshots for p in s.products]
+        in_stock = sum(1 for p in products if p.in_stock)
+        return {
+            'timestamp': self.updated_at.strftime('%Y-%m-%d %H:%M:%S JST') if self.updated_at else '',
+            'collection_id': ', '.join(str(s.collection_id) for s in snapshots),
+            'total': len(products),
+            'in_stock_count': in_stock,
+            'out_of_stock_count': len(products) - in_stock,
+        }, products
+
+    def _cached(self, key: str, build) -> bytes:
+        with self._lock:
+            body = self._cache.get(key)
+            if body is None:
+                body = self._cache[key] = build()
+            return body
+
+    def report_html(self) -> bytes:
+        """The live report page (virtual-scrolling report plus the update script)"""
+        def build():
+            meta, products = self._meta()
+            return ''.join(iter_virtual_report(meta, products, LIVE_SCRIPT)).encode('utf-8')
+        return self._cached('report', build)
+
+    def products_json(self) -> bytes:
+        """Every product in the data island format, plus the report metadata"""
+        def build():
+            meta, products = self._meta()
+            data = dict(build_data_island(products), **meta, version=self.version)
+            return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return self._cached('products', build)
+
+    def events_since(self, seq: int = 0) -> List[dict]:
+        """Recorded events with a sequence number above seq"""
+        with self._lock:
+            return [event for event in self._events if event['seq'] > seq]
+
+    def status(self) -> dict:
+        """Version, update time and size of the current state"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'updated_at': self.updated_at.isoformat(timespec='seconds') if self.updated_at else None,
+                'collections': sorted(self._snapshots),
+                'products': sum(len(s.products) for s in self._snapshots.values()),
+                'last_event': self._next_seq - 1,
+                'subscribers': len(self._subscribers),
+            }
+
+    def subscribe(self) -> queue.Queue:
+        """Register an event stream; updates are put on the returned queue"""
+        subscriber = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        """Remove an event stream"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def close_streams(self):
+        """End every open event stream"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        /             Live report
+        /api/products Products (JSON)
+        /api/events   Change events, ?since=<seq> for newer ones only (JSON)
+        /api/status   State summary (JSON)
+        /events       Server-Sent Events stream ('update' after every check)
+    """
+
+    state: DashboardState = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+
+        if url.path in ('/', '/index.html'):
+            self._send(200, 'text/html; charset=utf-8', self.state.report_html())
+        elif url.path == '/api/products':
+            self._send(200, 'application/json; charset=utf-8', self.state.products_json())
+        elif url.path == '/api/events':
+            try:
+                since = int(parse_qs(url.query).get('since', ['0'])[0])
+            except ValueError:
+                self._send_json(400, {'error': 'since must be an integer'})
+                return
+            self._send_json(200, {'events': self.state.events_since(since)})
+        elif url.path == '/api/status':
+            self._send_json(200, self.state.status())
+        elif url.path == '/events':
+            self._stream_events()
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data):
+        self._send(status, 'application/json; charset=utf-8',
+                   json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _stream_events(self):
+        subscriber = self.state.subscribe()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            self.wfile.write(f"retry: 3000\nevent: hello\ndata: {json.dumps({'version': self.state.version})}\n\n"
+                             .encode('utf-8'))
+            self.wfile.flush()
+            while True:
+                try:
+                    message = subscriber.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b': keep-alive\n\n')
+                    self.wfile.flush()
+                    continue
+                if message is None:
+                    break
+                data = json.dumps(message, ensure_ascii=False)
+                self.wfile.write(f"id: {message['version']}\nevent: update\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.state.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        # Requests are not logged; the checker's output stays readable
+        pass
+
+
+class DashboardServer:
+    """
+    HTTP server for the dashboard, running on background threads.
+
+    Each request (including every open event stream) gets its own thread,
+    so the checker never waits on a browser.
+    """
+
+    def __init__(self, state: DashboardState, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """
+        Args:
+            state: DashboardState to serve
+            host: Address to listen on (default: 127.0.0.1)
+            port: Port to listen on (default: 8765, 0 = any free port)
+        """
+        self.state = state
+        handler = type('Handler', (DashboardHandler,), {'state': state})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Start serving on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='dashboard', daemon=True)
+        self._thread.start()
+        print(f"Dashboard: {self.url}")
+
+    def shutdown(self, timeout: float = 5.0):
+        """Close every event stream and stop the server"""
+        self.state.close_streams()
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Product Diff Engine Module
+Compares collection scans against compact per-product fingerprints and emits typed change events
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from models import Product
+
+# Change event kinds
+NEW = 'new'
+RESTOCKED = 'restocked'
+SOLD_OUT = 'sold_out'
+PRICE_CHANGED = 'price_changed'
+QUANTITY_CHANGED = 'quantity_changed'
+UPTIME_MOVED = 'uptime_moved'
+
+
+def title_hash(title: str) -> str:
+    """Short stable hash of a product title"""
+    return hashlib.blake2b(title.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def fingerprint(product: Product) -> dict:
+    """
+    Build the compact fingerprint stored for a product.
+
+    Args:
+        product: Product from the collection API
+
+    Returns:
+        dict: {'t': title hash, 'u': upTime, 's': {sku_id: [price, onlineStock]}}
+            (JSON-serializable, compared with ==)
+    """
+    skus = {}
+    for index, sku in enumerate(product.skus):
+        sku_id = str(index if sku.id is None else sku.id)
+        skus[sku_id] = [sku.price, sku.stock]
+
+    return {
+        't': title_hash(product.title),
+        'u': product.up_time,
+        's': skus,
+    }
+
+
+def total_stock(fp: dict) -> int:
+    """Total online stock across all SKUs of a fingerprint"""
+    return sum(stock for _, stock in fp['s'].values())
+
+
+class ChangeEvent:
+    """
+    One typed change to a product or SKU.
+
+    Attributes:
+        kind: One of NEW, RESTOCKED, SOLD_OUT, PRICE_CHANGED, QUANTITY_CHANGED, UPTIME_MOVED
+        collection_id: Collection the product belongs to
+        product_id: Product ID
+        sku_id: SKU ID for SKU-level events, None for product-level ones
+        before: Previous value (stock, price or upTime), None for NEW
+        after: Current value
+        product: Product.summary() of the product at the time of the scan
+    """
+
+    __slots__ = ('kind', 'collection_id', 'product_id', 'sku_id', 'before', 'after', 'product')
+
+    def __init__(self, kind, collection_id, product_id, product, sku_id=None, before=None, after=None):
+        self.kind = kind
+        self.collection_id = collection_id
+        self.product_id = product_id
+        self.sku_id = sku_id
+        self.before = before
+        self.after = after
+        self.product = product
+
+    def __repr__(self):
+        sku = f", sku={self.sku_id!r}" if self.sku_id is not None else ''
+        return (f"ChangeEvent({self.kind}, product={self.product_id!r}{sku}, "
+                f"{self.before!r} -> {self.after!r})")
+
+
+class DiffEngine:
+    """
+    Keeps one fingerprint per product and diffs new scans against them.
+
+    Every scanned product is fingerprinted, but products whose fingerprint is
+    unchanged are skipped with a single comparison; event construction, and
+    the summary built for notifications, only happen for changed products.
+    """
+
+    def __init__(self, fingerprints: Optional[Dict[str, Dict[str, dict]]] = None):
+        """
+        Args:
+            fingerprints: Saved state, {collection_id (str): {product_id: fingerprint}}
+        """
+        self.fingerprints = fingerprints or {}
+        # Set whenever stored fingerprints change; cleared by the caller after saving
+        self.dirty = False
+
+    def has_state(self, collection_id) -> bool:
+        """True if the collection has been scanned before"""
+        return str(collection_id) in self.fingerprints
+
+    def diff(self, collection_id, products: Iterable[Product]) -> List[ChangeEvent]:
+        """
+        Diff a scan of a collection against its stored fingerprints.
+
+        The collection's stored fingerprints are replaced by the scan; products
+        that disappeared from the scan are forgotten.
+
+        Args:
+            collection_id: Collection ID
+            products: Products from the collection API
+
+        Returns:
+            list: ChangeEvent objects, in product order
+        """
+        previous = self.fingerprints.get(str(collection_id))
+        changed = previous is None
+        previous = previous or {}
+        current = {}
+        events = []
+
+        for product in products:
+            product_id = str(product.id)
+            fp = fingerprint(product)
+            current[product_id] = fp
+
+            old = previous.get(product_id)
+            if old == fp:
+                continue
+
+            changed = True
+            summary = product.summary(collection_id)
+
+            if old is None:
+                events.append(ChangeEvent(NEW, collection_id, product_id, summary, after=total_stock(fp)))
+                continue
+
+            if old['u'] != fp['u']:
+                events.append(ChangeEvent(UPTIME_MOVED, collection_id, product_id, summary,
+                                          before=old['u'], after=fp['u']))
+
+            for sku_id, (price, stock) in fp['s'].items():
+                old_price, old_stock = old['s'].get(sku_id, (price, 0))
+
+                if old_stock <= 0 < stock:
+                    kind = RESTOCKED
+                elif stock <= 0 < old_stock:
+                    kind = SOLD_OUT
+                elif stock != old_stock:
+                    kind = QUANTITY_CHANGED
+                else:
+                    kind = None
+                if kind:
+                    events.append(ChangeEvent(kind, collection_id, product_id, summary,
+                                              sku_id=sku_id, before=old_stock, after=stock))
+
+                if price != old_price:
+                    events.append(ChangeEvent(PRICE_CHANGED, collection_id, product_id, summary,
+                                              sku_id=sku_id, before=old_price, after=price))
+
+            # SKUs that vanished from the listing count as sold out
+            for sku_id, (_, old_stock) in old['s'].items():
+                if sku_id not in fp['s'] and old_stock > 0:
+                    events.append(ChangeEvent(SOLD_OUT, collection_id, product_id, summary,
+                                              sku_id=sku_id, before=old_stock, after=0))
+
+        self.fingerprints[str(collection_id)] = current
+        if changed or len(current) != len(previous):
+            self.dirty = True
+        return events
+
+    def forget(self, collection_ids: Iterable):
+        """Drop stored fingerprints for collections no longer monitored"""
+        for collection_id in collection_ids:
+            if self.fingerprints.pop(str(collection_id), None) is not None:
+                self.dirty = True
+
+
+def in_stock_alerts(events: Iterable[ChangeEvent]) -> List[dict]:
+    """
+    Products to announce as in stock: new products with stock, and restocks.
+
+    Returns:
+        list: Product.summary() dicts, one per product, in event order
+    """
+    products = {}
+    for event in events:
+        if event.kind == RESTOCKED or (event.kind == NEW and event.product['total_stock'] > 0):
+            products.setdefault((event.collection_id, event.product_id), event.product)
+    return list(products.values())
+
+
+def upcoming_alerts(events: Iterable[ChangeEvent], now: int) -> List[dict]:
+    """
+    Products to announce as upcoming sales: new products with a future upTime,
+    and products whose upTime moved to a (different) future time.
+
+    Args:
+        events: Change events from DiffEngine.diff()
+        now: Current UNIX timestamp
+
+    Returns:
+        list: Product.summary() dicts, one per product, in event order
+    """
+    products = {}
+    for event in events:
+        if event.kind in (NEW, UPTIME_MOVED) and event.product['upTime'] > now:
+            products.setdefault((event.collection_id, event.product_id), event.product)
+    return list(products.values())
@@ -1,14 +1,281 @@
 #!/usr/bin/env python3
 """
 Shared Email Utility Module
-Provides robust SMTP email sending with retry logic
+Provides robust SMTP email sending with retry logic and reusable SMTP sessions
 """
 
+import random
+import threading
 import time
 import smtplib
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Tuple
+
+# Errors after which the connection is rebuilt and the send retried
+RETRYABLE_SMTP_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError, OSError)
+
+
+def is_retryable_smtp_error(error: BaseException) -> bool:
+    """
+    True for connection-level failures worth reconnecting for.
+
+    smtplib.SMTPException subclasses OSError, so protocol errors such as
+    SMTPAuthenticationError are excluded explicitly: retrying them cannot help.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, RETRYABLE_SMTP_ERRORS) and not isinstance(error, smtplib.SMTPException)
+
+
+def is_permanent_recipient_error(error: BaseException) -> bool:
+    """
+    True if the server permanently (5xx) refused one message's recipient or content.
+
+    Resending that message cannot succeed, so it should be dropped rather
+    than retried. Temporary (4xx) refusals are not permanent.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPDataError) and error.smtp_code >= 500
+
+
+def _is_session_error(error: BaseException) -> bool:
+    # Failures of the session rather than of one message: every later message would fail too
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused, smtplib.SMTPHeloError,
+                          smtplib.SMTPNotSupportedError)):
+        return True
+    return is_retryable_smtp_error(error)
+
+
+class SMTPSender:
+    """
+    Reusable authenticated SMTP session.
+
+    The connection (SMTP_SSL for port 465, STARTTLS otherwise) is opened and
+    authenticated on first use and kept alive across messages. A connection
+    that has been idle for a while is probed with NOOP before use, and a
+    dropped connection is rebuilt transparently, retrying with exponential
+    backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        smtp_server: str,
+        smtp_port: int,
+        username: str,
+        password: str,
+        timeout: int = 30,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        idle_check: float = 60.0
+    ):
+        """
+        Args:
+            smtp_server: SMTP server hostname
+            smtp_port: SMTP server port
+            username: SMTP username
+            password: SMTP password
+            timeout: SMTP connection timeout in seconds (default: 30)
+            max_retries: Maximum number of attempts per message (default: 3)
+            retry_delay: Delay before the first retry in seconds, doubled each retry (default: 1)
+            idle_check: Probe the connection with NOOP after this many idle seconds (default: 60)
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_check = idle_check
+        self.server = None
+        self.last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Use SMTP_SSL for port 465, SMTP with STARTTLS for port 587
+        if self.smtp_port == 465:
+            print(f"Connecting via SMTP_SSL to {self.smtp_server}:{self.smtp_port}")
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        else:
+            print(f"Connecting via SMTP with STARTTLS to {self.smtp_server}:{self.smtp_port}")
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+
+        server.login(self.username, self.password)
+        self.server = server
+
+    def _drop(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+    def _ensure_connected(self):
+        if self.server is not None and time.time() - self.last_used > self.idle_check:
+            try:
+                self.server.noop()
+            except RETRYABLE_SMTP_ERRORS:
+                self._drop()
+        if self.server is None:
+            self._connect()
+
+    def send(self, msg: Message):
+        """
+        Send one message over the shared session.
+
+        Raises:
+            Exception: Re-raises the last error after all retry attempts fail,
+            or immediately for non-connection errors (e.g. authentication)
+        """
+        with self._lock:
+            for attempt in range(self.max_retries):
+                try:
+                    self._ensure_connected()
+                    self.server.send_message(msg)
+                    self.last_used = time.time()
+                    return
+                except Exception as e:
+                    # A refusal of one message (smtplib has already sent RSET) keeps the session
+                    if _is_session_error(e):
+                        self._drop()
+                    if not is_retryable_smtp_error(e):
+                        # For other exceptions, don't retry
+                        print(f"✗ Error sending email: {e}")
+                        raise
+                    if attempt < self.max_retries - 1:
+                        delay = self.retry_delay * (2 ** attempt)
+                        delay = random.uniform(delay / 2, delay)
+                        print(f"⚠ SMTP connection error (attempt {attempt + 1}/{self.max_retries}): {e}")
+                        print(f"  Retrying in {delay:.1f} seconds...")
+                        time.sleep(delay)
+                    else:
+                        print(f"✗ Failed to send email after {self.max_retries} attempts: {e}")
+                        raise
+
+    def send_many(self, messages: Iterable[Message]) -> List[Tuple[Message, Exception]]:
+        """
+        Send several messages over one session, each one independently.
+
+        A message that fails (e.g. a refused recipient) does not stop the
+        others. After a session-level failure (authentication, connection
+        lost after all retries) the remaining messages are failed with the
+        same error instead of being attempted one by one.
+
+        Returns:
+            list: (message, error) for every message that was not sent
+        """
+        failures = []
+        for msg in messages:
+            if failures and _is_session_error(failures[-1][1]):
+                failures.append((msg, failures[-1][1]))
+                continue
+            try:
+                self.send(msg)
+            except Exception as e:
+                failures.append((msg, e))
+        return failures
+
+    def close(self):
+        """Quit the SMTP session, if open"""
+        with self._lock:
+            self._drop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RateLimitExceeded(Exception):
+    """Sending now would exceed a recipient's rate limit by more than the allowed wait"""
+
+
+class RateLimiter:
+    """
+    Token bucket per recipient: at most `rate` messages per `per` seconds.
+
+    Tokens refill continuously, so a burst of up to `rate` messages goes
+    out immediately and further messages are spaced evenly.
+    """
+
+    def __init__(self, rate: int, per: float = 3600.0):
+        """
+        Args:
+            rate: Messages allowed per period for each recipient
+            per: Period in seconds (default: 3600)
+        """
+        self.rate = rate
+        self.per = per
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (float(self.rate), now))
+        return min(float(self.rate), tokens + (now - updated) * self.rate / self.per)
+
+    def reserve(self, recipient: str, max_wait: float = 0.0) -> float:
+        """
+        Reserve one message for a recipient.
+
+        Each recipient is limited on its own, so one throttled address never
+        delays or blocks another.
+
+        Args:
+            recipient: Recipient address
+            max_wait: Longest acceptable wait in seconds
+
+        Returns:
+            float: Seconds the caller must wait before sending to this recipient (0 if none)
+
+        Raises:
+            RateLimitExceeded: If the wait would exceed max_wait (nothing is reserved)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(recipient, now)
+            wait = (1 - tokens) * self.per / self.rate if tokens < 1 else 0.0
+            if wait > max_wait:
+                raise RateLimitExceeded(f"rate limit of {self.rate} per {self.per:.0f}s reached for {recipient} "
+                                        f"(next send in {wait:.0f}s)")
+            self._buckets[recipient] = (tokens - 1, now)
+        return wait
+
+
+_senders: Dict[Tuple[str, int, str], SMTPSender] = {}
+_senders_lock = threading.Lock()
+
+
+def get_smtp_sender(smtp_server: str, smtp_port: int, username: str, password: str) -> SMTPSender:
+    """
+    Return the pooled SMTPSender for a server/account, creating it on first use.
+
+    The same authenticated session is reused for every message in a run (or
+    for the lifetime of a daemon) until close_smtp_senders() is called.
+    """
+    key = (smtp_server, int(smtp_port), username)
+    with _senders_lock:
+        sender = _senders.get(key)
+        if sender is None or sender.password != password:
+            sender = SMTPSender(smtp_server, int(smtp_port), username, password)
+            _senders[key] = sender
+        return sender
+
+
+def close_smtp_senders():
+    """Quit every pooled SMTP session"""
+    with _senders_lock:
+        senders = list(_senders.values())
+        _senders.clear()
+    for sender in senders:
+        sender.close()
 
 
 def send_email_with_retry(
@@ -39,7 +306,7 @@ def send_email_with_retry(
         text_content: Plain text content
         html_content: HTML content (optional)
         max_retries: Maximum number of retry attempts (default: 3)
-        retry_delay: Delay between retries in seconds (default: 5)
+        retry_delay: Delay before the first retry in seconds, doubled each retry (default: 5)
         timeout: SMTP connection timeout in seconds (default: 30)
 
     Returns:
@@ -63,31 +330,15 @@ def send_email_with_retry(
         part2 = MIMEText(html_content, 'html', 'utf-8')
         msg.attach(part2)
 
-    # Retry loop
-    for attempt in range(max_retries):
-        try:
-            with smtplib.SMTP(smtp_server, smtp_port, timeout=timeout) as server:
-                server.starttls()
-                server.login(username, password)
-                server.send_message(msg)
-
-            print(f"✓ Email sent successfully to {to_email}")
-            return True
-
-        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, TimeoutError) as e:
-            if attempt < max_retries - 1:
-                print(f"⚠ SMTP connection error (attempt {attempt + 1}/{max_retries}): {e}")
-                print(f"  Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                print(f"✗ Failed to send email after {max_retries} attempts: {e}")
-                raise
-        except Exception as e:
-            # For other exceptions, don't retry
-            print(f"✗ Error sending email: {e}")
-            raise
-
-    return False
+    sender = SMTPSender(
+        smtp_server, smtp_port, username, password,
+        timeout=timeout, max_retries=max_retries, retry_delay=retry_delay
+    )
+    with sender:
+        sender.send(msg)
+
+    print(f"✓ Email sent successfully to {to_email}")
+    return True
 
 
 def send_email_simple(
@@ -4,47 +4,25 @@ POP MART 在庫レポート HTML生成ツール
 all_products.json から視覚的なHTMLレポートを生成します
 """
 
+import hashlib
+import html
 import json
 import os
+import string
 from datetime import datetime, timezone, timedelta
 
-JST = timezone(timedelta(hours=9))
-
-
-def generate_html_report(json_file='all_products.json', output_file='stock_report.html'):
-    """
-    JSONデータからHTMLレポートを生成
-
-    Args:
-        json_file: 入力JSONファイル
-        output_file: 出力HTMLファイル
-    """
+from models import PRODUCT_URL, Product
+from observation_store import ObservationStore
+from snapshot_file import load_report
+from stock_analytics import StockAnalytics, format_duration
 
-    # JSONデータを読み込み
-    if not os.path.exists(json_file):
-        print(f"❌ {json_file} が見つかりません")
-        return
-
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    timestamp = data.get('timestamp', '')
-    collection_id = data.get('collection_id', '')
-    total = data.get('total', 0)
-    in_stock_count = data.get('in_stock_count', 0)
-    out_of_stock_count = data.get('out_of_stock_count', 0)
-    products = data.get('products', [])
-
-    # 在庫ありと売り切れを分類
-    in_stock_products = [p for p in products if p['total_stock'] > 0]
-    out_of_stock_products = [p for p in products if p['total_stock'] == 0]
+JST = timezone(timedelta(hours=9))
 
-    # 新着・人気商品を抽出
-    new_products = [p for p in products if p.get('is_new', False)]
-    hot_products = [p for p in products if p.get('is_hot', False)]
+# 出力ファイルの書き込みバッファサイズ
+WRITE_BUFFER_SIZE = 1 << 16
 
-    # HTML生成
-    html = f"""<!DOCTYPE html>
+# ページ先頭（スタイル・ヘッダー・統計・フィルタタブ）。str.format で一度だけ埋め込む
+HTML_HEAD = """<!DOCTYPE html>
 <html lang="ja">
 <head>
     <meta charset="UTF-8">
@@ -340,44 +318,18 @@ def generate_html_report(json_file='all_products.json', output_file='stock_repor
                 <button class="filter-tab active" onclick="filterProducts('all')">全て ({total})</button>
                 <button class="filter-tab" onclick="filterProducts('in-stock')">在庫あり ({in_stock_count})</button>
                 <button class="filter-tab" onclick="filterProducts('out-of-stock')">売り切れ ({out_of_stock_count})</button>
-                <button class="filter-tab" onclick="filterProducts('new')">新着 ({len(new_products)})</button>
-                <button class="filter-tab" onclick="filterProducts('hot')">人気 ({len(hot_products)})</button>
+                <button class="filter-tab" onclick="filterProducts('new')">新着 ({new_count})</button>
+                <button class="filter-tab" onclick="filterProducts('hot')">人気 ({hot_count})</button>
             </div>
 
             <div class="product-grid" id="productGrid">
 """
 
-    # 商品カードを生成
-    for product in products:
-        product_id = product['id']
-        title = product['title']
-        is_new = product.get('is_new', False)
-        is_hot = product.get('is_hot', False)
-        total_stock = product['total_stock']
-        url = product['url']
-
-        stock_class = 'in-stock' if total_stock > 0 else 'out-of-stock'
-        stock_status = f'{total_stock}個在庫あり' if total_stock > 0 else '売り切れ'
-        stock_status_class = 'available' if total_stock > 0 else 'unavailable'
-
-        # データ属性を設定
-        data_attrs = f'data-stock="{stock_class}"'
-        if is_new:
-            data_attrs += ' data-new="true"'
-        if is_hot:
-            data_attrs += ' data-hot="true"'
-
-        html += f"""
+# 商品カード。商品ごとに str.format で埋め込む
+CARD_TEMPLATE = """
                 <div class="product-card {stock_class}" {data_attrs}>
                     <div class="product-badges">
-"""
-
-        if is_new:
-            html += '                        <span class="badge new">🆕 NEW</span>\n'
-        if is_hot:
-            html += '                        <span class="badge hot">🔥 HOT</span>\n'
-
-        html += f"""                        <span class="badge {stock_class}">{stock_status}</span>
+{badges}                        <span class="badge {stock_class}">{stock_status}</span>
                     </div>
 
                     <div class="product-title">{title}</div>
@@ -391,10 +343,11 @@ def generate_html_report(json_file='all_products.json', output_file='stock_repor
                 </div>
 """
 
-    # フッターのタイムスタンプを追加
-    current_time = datetime.now(JST).strftime('%Y-%m-%d %H:%M:%S JST')
+BADGE_NEW = '                        <span class="badge new">🆕 NEW</span>\n'
+BADGE_HOT = '                        <span class="badge hot">🔥 HOT</span>\n'
 
-    html += f"""
+# ページ末尾（フッター・フィルタ用スクリプト）
+HTML_TAIL = """
             </div>
         </div>
 
@@ -448,14 +401,696 @@ def generate_html_report(json_file='all_products.json', output_file='stock_repor
 </html>
 """
 
-    # HTMLファイルに書き込み
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html)
+# 仮想スクロール版のカードの高さ（px）。全カードを同じ高さにして表示位置を計算する
+VIRTUAL_CARD_HEIGHT = 280
+VIRTUAL_ROW_GAP = 20
+
+# 仮想スクロール版: 通常版の先頭部分に、カードの高さ固定と検索ボックスを追加
+VIRTUAL_HEAD = HTML_HEAD.replace('    </style>', f"""
+        .product-grid.virtual .product-card {{{{
+            height: {VIRTUAL_CARD_HEIGHT}px;
+            overflow: hidden;
+        }}}}
+
+        .product-grid.virtual .product-title {{{{
+            height: 50px;
+            min-height: 0;
+            overflow: hidden;
+            display: -webkit-box;
+            -webkit-line-clamp: 2;
+            -webkit-box-orient: vertical;
+        }}}}
+
+        .search-box {{{{
+            width: 100%;
+            padding: 10px 20px;
+            border: 1px solid #dee2e6;
+            border-radius: 25px;
+            font-size: 1em;
+            margin-bottom: 10px;
+        }}}}
+
+        .result-count {{{{
+            color: #666;
+            font-size: 0.9em;
+        }}}}
+    </style>""").replace('            <div class="product-grid" id="productGrid">\n', """\
+            <input type="search" class="search-box" id="searchBox" placeholder="商品名で検索（例: LABUBU, ラブブ）" oninput="searchProducts(this.value)">
+            <div class="result-count" id="resultCount"></div>
+
+            <div class="product-grid virtual" id="productGrid">
+""")
+
+# 仮想スクロール版の末尾（フッターまで。データとスクリプトは別に書き込む）
+VIRTUAL_FOOTER = HTML_TAIL[:HTML_TAIL.index('    <script>')]
+
+# 仮想スクロール版のスクリプト。表示範囲のカードだけをDOMに生成する
+VIRTUAL_SCRIPT = """    <script>
+        let DATA = JSON.parse(document.getElementById('productData').textContent);
+        const ROW_HEIGHT = """ + str(VIRTUAL_CARD_HEIGHT + VIRTUAL_ROW_GAP) + """;
+        const GAP = """ + str(VIRTUAL_ROW_GAP) + """;
+        const MIN_CARD_WIDTH = 300;
+        const OVERSCAN = 2;
+
+        const grid = document.getElementById('productGrid');
+        const resultCount = document.getElementById('resultCount');
+
+        let currentFilter = 'all';
+        let query = '';
+        let view = null;          // 表示する商品の番号（null = 全商品）
+        let searchKeys = null;    // 正規化した商品名（初回検索時に作成）
+        let scheduled = false;
+
+        // 全角/半角・大文字/小文字・カタカナ/ひらがなを区別しない
+        function normalize(text) {
+            return text.normalize('NFKC').toLowerCase()
+                .replace(/[\\u30a1-\\u30f6]/g, c => String.fromCharCode(c.charCodeAt(0) - 0x60));
+        }
+
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})[c]);
+        }
+
+        function renderCard(i) {
+            const stock = DATA.stock[i];
+            const stockClass = stock > 0 ? 'in-stock' : 'out-of-stock';
+            const stockStatus = stock > 0 ? stock + '個在庫あり' : '売り切れ';
+            const id = escapeHtml(DATA.ids[i]);
+            return '<div class="product-card ' + stockClass + '"><div class="product-badges">' +
+                (DATA.flags[i] & 1 ? '<span class="badge new">🆕 NEW</span>' : '') +
+                (DATA.flags[i] & 2 ? '<span class="badge hot">🔥 HOT</span>' : '') +
+                '<span class="badge ' + stockClass + '">' + stockStatus + '</span></div>' +
+                '<div class="product-title">' + escapeHtml(DATA.titles[i]) + '</div>' +
+                '<div class="product-id">商品ID: ' + id + '</div>' +
+                '<div class="product-stock ' + (stock > 0 ? 'available' : 'unavailable') + '">' + stockStatus + '</div>' +
+                '<a href="' + DATA.url.replace('{id}', encodeURIComponent(DATA.ids[i])) + '" target="_blank" class="product-link">商品ページを見る →</a></div>';
+        }
+
+        function updateView() {
+            const base = currentFilter === 'all' ? null : DATA.filters[currentFilter];
+            const terms = normalize(query).split(/\\s+/).filter(Boolean);
+
+            if (terms.length) {
+                searchKeys = searchKeys || DATA.titles.map(normalize);
+                const source = base || DATA.ids.map((_, i) => i);
+                view = source.filter(i => terms.every(term => searchKeys[i].includes(term)));
+            } else {
+                view = base;
+            }
+
+            resultCount.textContent = (view ? view.length : DATA.ids.length) + '件';
+            render();
+        }
+
+        function render() {
+            scheduled = false;
+            const count = view ? view.length : DATA.ids.length;
+            const columns = Math.max(1, Math.floor((grid.clientWidth + GAP) / (MIN_CARD_WIDTH + GAP)));
+            const rows = Math.ceil(count / columns);
+
+            // ビューポートと重なる行だけを生成し、前後は余白で高さを確保する
+            const top = grid.getBoundingClientRect().top + window.scrollY;
+            const first = Math.min(rows, Math.max(0, Math.floor((window.scrollY - top) / ROW_HEIGHT) - OVERSCAN));
+            const last = Math.max(first, Math.min(rows, Math.ceil((window.scrollY + window.innerHeight - top) / ROW_HEIGHT) + OVERSCAN));
+
+            const cards = [];
+            for (let k = first * columns; k < Math.min(count, last * columns); k++) {
+                cards.push(renderCard(view ? view[k] : k));
+            }
+
+            grid.style.gridTemplateColumns = 'repeat(' + columns + ', 1fr)';
+            grid.style.paddingTop = (first * ROW_HEIGHT) + 'px';
+            grid.style.paddingBottom = ((rows - last) * ROW_HEIGHT) + 'px';
+            grid.innerHTML = cards.join('');
+        }
+
+        function scheduleRender() {
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(render);
+            }
+        }
+
+        function filterProducts(filter) {
+            // タブのアクティブ状態を更新
+            document.querySelectorAll('.filter-tab').forEach(tab => {
+                tab.classList.remove('active');
+            });
+            event.target.classList.add('active');
+
+            currentFilter = filter;
+            updateView();
+        }
+
+        function searchProducts(value) {
+            query = value;
+            updateView();
+        }
+
+        // 商品データを差し替える（ダッシュボードのライブ更新用）
+        function setData(data) {
+            DATA = data;
+            searchKeys = null;
+            updateView();
+        }
+
+        window.addEventListener('scroll', scheduleRender, {passive: true});
+        window.addEventListener('resize', scheduleRender);
+        updateView();
+    </script>
+"""
+
+HTML_END = """</body>
+</html>
+"""
+
+# 在庫履歴の分析を挿入する位置（フッターの直前）
+HISTORY_POSITION = HTML_TAIL.index('\n        <div class="footer">')
+# 在庫履歴の分析に表示する商品数
+HISTORY_LIMIT = 20
+# 在庫推移グラフ（SVG）の大きさ
+SPARKLINE_WIDTH = 120
+SPARKLINE_HEIGHT = 30
+
+# 在庫履歴の分析のスタイル（履歴がない場合はページに含めない）
+HISTORY_STYLE = """        <style>
+            .history-range {
+                color: #666;
+                margin-bottom: 20px;
+            }
+
+            .history h3 {
+                color: #333;
+                margin: 20px 0 10px;
+            }
+
+            .hour-chart {
+                display: flex;
+                align-items: flex-end;
+                gap: 4px;
+                height: 120px;
+                padding-bottom: 20px;
+                position: relative;
+            }
+
+            .hour-bar {
+                flex: 1;
+                background: #667eea;
+                border-radius: 3px 3px 0 0;
+                min-height: 2px;
+                position: relative;
+            }
+
+            .hour-bar span {
+                position: absolute;
+                bottom: -20px;
+                left: 50%;
+                transform: translateX(-50%);
+                font-size: 0.7em;
+                color: #666;
+            }
+
+            .history-table {
+                width: 100%;
+                border-collapse: collapse;
+                font-size: 0.9em;
+            }
+
+            .history-table th, .history-table td {
+                padding: 8px;
+                border-bottom: 1px solid #dee2e6;
+                text-align: left;
+            }
+
+            .history-table th {
+                background: #f8f9fa;
+                color: #666;
+            }
+
+            .history-table a {
+                color: #333;
+            }
+
+            .sparkline polyline {
+                fill: none;
+                stroke: #dc3545;
+                stroke-width: 1.5;
+            }
+        </style>
+"""
+
+# テンプレートが変わったらカード索引を無効にする
+TEMPLATE_VERSION = hashlib.sha1((CARD_TEMPLATE + BADGE_NEW + BADGE_HOT).encode('utf-8')).hexdigest()[:12]
+
+
+def compile_template(template):
+    """
+    str.format 形式のテンプレートを、固定部分と項目名の列に一度だけ分解
+
+    長いテンプレートを商品ごとに str.format で解析し直すより高速に展開できます。
+
+    Args:
+        template: {name} 形式の項目を含むテンプレート（書式指定なし）
+
+    Returns:
+        callable: 項目をキーワード引数で受け取り、展開した文字列を返す関数
+    """
+    parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+
+    def render(**fields):
+        out = []
+        for literal, field in parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(fields[field]))
+        return ''.join(out)
+
+    return render
+
+
+_render_card = compile_template(CARD_TEMPLATE)
+
+
+def render_card(product):
+    """
+    商品カード1枚分のHTMLを生成
+
+    Args:
+        product: Product
+
+    Returns:
+        str: カードのHTML
+    """
+    total_stock = product.total_stock
+    stock_class = 'in-stock' if total_stock > 0 else 'out-of-stock'
+    stock_status = f'{total_stock}個在庫あり' if total_stock > 0 else '売り切れ'
+
+    # データ属性を設定
+    data_attrs = f'data-stock="{stock_class}"'
+    if product.is_new:
+        data_attrs += ' data-new="true"'
+    if product.is_hot:
+        data_attrs += ' data-hot="true"'
+
+    return _render_card(
+        stock_class=stock_class,
+        data_attrs=data_attrs,
+        badges=(BADGE_NEW if product.is_new else '') + (BADGE_HOT if product.is_hot else ''),
+        stock_status=stock_status,
+        stock_status_class='available' if total_stock > 0 else 'unavailable',
+        title=product.title,
+        product_id=product.id,
+        url=product.url,
+    )
+
+
+def card_hash(entry):
+    """
+    カードに表示される項目のハッシュ（変更された商品の検出用）
+
+    Product を作らずに all_products.json の要素から直接計算するため、
+    変更のない商品は解析もカード生成も省略できます。
+
+    Args:
+        entry: all_products.json の 'products' の要素
+
+    Returns:
+        str: ハッシュ値（16進数）
+    """
+    # total_stock がない場合は sku_details から計算されるため、そちらを含める
+    stock = entry.get('total_stock', entry.get('sku_details'))
+    key = f"{entry.get('id')}\x1f{entry.get('title', '')}\x1f{entry.get('is_new')}{entry.get('is_hot')}\x1f{stock}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
 
+
+def load_card_index(cache_file, output_file):
+    """
+    前回のカード索引を読み込む
+
+    Args:
+        cache_file: カード索引ファイル
+        output_file: 前回出力したHTMLファイル
+
+    Returns:
+        dict: {'source': [...], 'cards': {商品ID: 'ハッシュ 開始位置 終了位置'}}（無効な場合は None）
+    """
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        size = os.path.getsize(output_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    # テンプレートが変わった場合や、レポートが別の処理で書き換えられた場合は使わない
+    if not isinstance(index, dict) or index.get('version') != TEMPLATE_VERSION \
+            or not isinstance(index.get('cards'), dict) or index.get('size') != size:
+        return None
+    return index
+
+
+def render_sparkline(points):
+    """
+    在庫推移（再入荷からの経過秒数, 在庫数）を小さなSVGの折れ線グラフに変換
+
+    Args:
+        points: StockAnalytics.depletion_curve の戻り値
+
+    Returns:
+        str: SVG（点が2つ未満の場合は空文字列）
+    """
+    if len(points) < 2:
+        return ''
+    duration = max(points[-1][0], 1)
+    peak = max(max(stock for _, stock in points), 1)
+    coords = ' '.join(
+        f'{elapsed * SPARKLINE_WIDTH / duration:.1f},{SPARKLINE_HEIGHT - stock * SPARKLINE_HEIGHT / peak:.1f}'
+        for elapsed, stock in points
+    )
+    return (f'<svg class="sparkline" width="{SPARKLINE_WIDTH}" height="{SPARKLINE_HEIGHT}" '
+            f'viewBox="0 0 {SPARKLINE_WIDTH} {SPARKLINE_HEIGHT}"><polyline points="{coords}"/></svg>')
+
+
+def render_history_section(db_file, limit=HISTORY_LIMIT):
+    """
+    観測データから在庫履歴の分析（再入荷の時間帯・売り切れまでの時間・在庫推移）のHTMLを生成
+
+    集計は StockAnalytics が SQLite 上で行うため、観測データが大量でも
+    全件を読み込みません。
+
+    Args:
+        db_file: 観測データベース（observations.db）
+        limit: 表に表示する商品数（売り切れまでの時間が短い順）
+
+    Returns:
+        str: セクションのHTML（観測データがない場合は空文字列）
+    """
+    store = ObservationStore(db_file)
+    try:
+        analytics = StockAnalytics(store)
+        first, last, observed = analytics.observed_range()
+        if first is None:
+            return ''
+        hours = analytics.restock_hours()
+        stats = analytics.product_stats(limit)
+        curves = {s['product_id']: analytics.depletion_curve(s['product_id']) for s in stats}
+    finally:
+        store.close()
+
+    def jst(timestamp):
+        return datetime.fromtimestamp(timestamp, JST).strftime('%Y-%m-%d %H:%M')
+
+    parts = [
+        '\n        <div class="section history">\n',
+        HISTORY_STYLE,
+        '            <h2 class="section-title">📈 在庫履歴の分析</h2>\n',
+        f'            <p class="history-range">観測期間: {jst(first)} 〜 {jst(last)} JST（{observed}商品、再入荷 {sum(hours)}回）</p>\n',
+    ]
+
+    if sum(hours):
+        peak = max(hours)
+        parts.append('            <h3>再入荷の時間帯（JST）</h3>\n            <div class="hour-chart">\n')
+        for hour, count in enumerate(hours):
+            label = f'<span>{hour}</span>' if hour % 3 == 0 else ''
+            parts.append(f'                <div class="hour-bar" style="height: {count * 100 / peak:.0f}%" '
+                         f'title="{hour}時台: {count}回">{label}</div>\n')
+        parts.append('            </div>\n')
+
+    if stats:
+        parts.append(
+            '            <h3>売り切れまでの時間が短い商品</h3>\n'
+            '            <table class="history-table">\n'
+            '                <tr><th>商品</th><th>再入荷</th><th>売り切れまで（平均）</th><th>最短</th>'
+            '<th>再入荷の間隔</th><th>多い時間帯</th><th>最終再入荷</th><th>直近の在庫推移</th></tr>\n'
+        )
+        for s in stats:
+            title = html.escape(s['title'] or f"商品ID: {s['product_id']}")
+            url = html.escape(PRODUCT_URL.format(product_id=s['product_id']))
+            hour = f"{s['typical_hour']}時台" if s['typical_hour'] is not None else '-'
+            parts.append(
+                f'                <tr><td><a href="{url}" target="_blank">{title}</a></td>'
+                f"<td>{s['restocks']}回</td><td>{format_duration(s['avg_sellout'])}</td>"
+                f"<td>{format_duration(s['fastest_sellout'])}</td><td>{format_duration(s['restock_interval'])}</td>"
+                f"<td>{hour}</td><td>{jst(s['last_restock'])}</td>"
+                f"<td>{render_sparkline(curves[s['product_id']])}</td></tr>\n"
+            )
+        parts.append('            </table>\n')
+    else:
+        parts.append('            <p class="history-range">観測期間中に再入荷した商品はありません</p>\n')
+
+    parts.append('        </div>\n')
+    return ''.join(parts)
+
+
+def render_tail(template, history_html=''):
+    """
+    ページ末尾を生成し、在庫履歴の分析があればフッターの直前に挿入
+
+    Args:
+        template: HTML_TAIL または VIRTUAL_FOOTER
+        history_html: render_history_section の戻り値（省略可）
+
+    Returns:
+        str: ページ末尾のHTML
+    """
+    tail = template.format(current_time=datetime.now(JST).strftime('%Y-%m-%d %H:%M:%S JST'))
+    return tail[:HISTORY_POSITION] + history_html + tail[HISTORY_POSITION:]
+
+
+def write_report(data, output_file, previous=None, history_html=''):
+    """
+    レポートをファイルへストリーミング出力
+
+    先頭部分を一度書き込み、商品カードをバッファ付きで順に書き込みます。
+    一時ファイルに書き込んでから置き換えるため、生成途中のレポートが
+    開かれることはありません。
+
+    Args:
+        data: all_products.json の内容
+        output_file: 出力HTMLファイル
+        previous: (前回のカード索引, 前回のHTML)。指定するとハッシュが一致する
+            カードは再生成せず前回のHTMLから切り出す（省略時は索引を作らない）
+        history_html: フッターの直前に挿入する在庫履歴の分析（省略可）
+
+    Returns:
+        tuple: (カード索引 {商品ID: 'ハッシュ 開始位置 終了位置'}（previous 省略時は None）,
+                生成したカード数)
+    """
+    entries = data.get('products', [])
+    incremental = previous is not None
+    old_cards, old_html = previous if incremental else ({}, '')
+    cards = {} if incremental else None
+    rendered = 0
+
+    head = HTML_HEAD.format(
+        collection_id=data.get('collection_id', ''),
+        timestamp=data.get('timestamp', ''),
+        total=data.get('total', 0),
+        in_stock_count=data.get('in_stock_count', 0),
+        out_of_stock_count=data.get('out_of_stock_count', 0),
+        new_count=sum(1 for p in entries if p.get('is_new')),
+        hot_count=sum(1 for p in entries if p.get('is_hot')),
+    )
+    position = len(head)
+
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(head)
+
+        if not incremental:
+            for entry in entries:
+                f.write(render_card(Product.from_report(entry)))
+            rendered = len(entries)
+        else:
+            # 変更のないカードは前回のHTMLから切り出す。前回も連続していたカードはまとめて書き込む
+            run_start = run_end = 0
+            for entry in entries:
+                product_id = str(entry.get('id'))
+                digest = card_hash(entry)
+                cached = old_cards.get(product_id, '').split(' ')
+                if cached[0] == digest:
+                    start, end = int(cached[1]), int(cached[2])
+                    if start != run_end:
+                        f.write(old_html[run_start:run_end])
+                        run_start = start
+                    run_end = end
+                    length = end - start
+                else:
+                    f.write(old_html[run_start:run_end])
+                    run_start = run_end = 0
+                    card = render_card(Product.from_report(entry))
+                    f.write(card)
+                    rendered += 1
+                    length = len(card)
+                cards[product_id] = f'{digest} {position} {position + length}'
+                position += length
+            f.write(old_html[run_start:run_end])
+
+        # フッターのタイムスタンプを追加
+        f.write(render_tail(HTML_TAIL, history_html))
+
+    os.replace(tmp_file, output_file)
+    return cards, rendered
+
+
+def build_data_island(products):
+    """
+    仮想スクロール版に埋め込む商品データ（列形式）を作成
+
+    Args:
+        products: Product のリスト
+
+    Returns:
+        dict: {'url', 'ids', 'titles', 'stock', 'flags'（1=新着, 2=人気）,
+               'filters': {フィルタ名: 該当する商品の番号のリスト}}
+    """
+    filters = {'in-stock': [], 'out-of-stock': [], 'new': [], 'hot': []}
+    for i, product in enumerate(products):
+        filters['in-stock' if product.in_stock else 'out-of-stock'].append(i)
+        if product.is_new:
+            filters['new'].append(i)
+        if product.is_hot:
+            filters['hot'].append(i)
+
+    return {
+        'url': PRODUCT_URL.format(product_id='{id}'),
+        'ids': [p.id for p in products],
+        'titles': [p.title for p in products],
+        'stock': [p.total_stock for p in products],
+        'flags': [(1 if p.is_new else 0) | (2 if p.is_hot else 0) for p in products],
+        'filters': filters,
+    }
+
+
+def iter_virtual_report(data, products, extra_script='', history_html=''):
+    """
+    仮想スクロール版のレポートを先頭から順に生成
+
+    Args:
+        data: all_products.json 形式のメタ情報（timestamp, collection_id, total, in_stock_count, out_of_stock_count）
+        products: Product のリスト
+        extra_script: </body> の直前に追加するスクリプト（ダッシュボード用、省略可）
+        history_html: フッターの直前に挿入する在庫履歴の分析（省略可）
+
+    Yields:
+        str: HTMLの断片
+    """
+    island = build_data_island(products)
+    yield VIRTUAL_HEAD.format(
+        collection_id=data.get('collection_id', ''),
+        timestamp=data.get('timestamp', ''),
+        total=data.get('total', 0),
+        in_stock_count=data.get('in_stock_count', 0),
+        out_of_stock_count=data.get('out_of_stock_count', 0),
+        new_count=len(island['filters']['new']),
+        hot_count=len(island['filters']['hot']),
+    )
+    yield render_tail(VIRTUAL_FOOTER, history_html)
+    # </script> などでデータが途切れないよう '<' をエスケープ
+    yield '    <script type="application/json" id="productData">'
+    yield json.dumps(island, ensure_ascii=False, separators=(',', ':')).replace('<', '\\u003c')
+    yield '</script>\n'
+    yield VIRTUAL_SCRIPT
+    yield extra_script
+    yield HTML_END
+
+
+def write_virtual_report(data, output_file, history_html=''):
+    """
+    仮想スクロール版のレポートを出力
+
+    商品はカードとしてではなくJSONデータとして埋め込み、ブラウザ側で
+    画面に見えている範囲のカードだけを生成します。フィルタは事前に作成した
+    商品番号のリストを使うため、商品数が多くても表示・絞り込みが軽くなります。
+
+    Args:
+        data: all_products.json の内容
+        output_file: 出力HTMLファイル
+        history_html: フッターの直前に挿入する在庫履歴の分析（省略可）
+    """
+    products = [Product.from_report(p) for p in data.get('products', [])]
+
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        for part in iter_virtual_report(data, products, history_html=history_html):
+            f.write(part)
+
+    os.replace(tmp_file, output_file)
+
+
+def generate_html_report(json_file='all_products.json', output_file='stock_report.html', incremental=False,
+                         cache_file=None, virtual=False, history=None):
+    """
+    JSONデータからHTMLレポートを生成
+
+    Args:
+        json_file: 入力JSONファイル（バイナリスナップショットも可）
+        output_file: 出力HTMLファイル
+        incremental: Trueの場合、前回から変更された商品のカードのみ再生成する
+            （入力JSONが変更されていなければ何もしない）
+        cache_file: カード索引ファイル（デフォルト: 出力ファイル名 + '.cards.json'）
+        virtual: Trueの場合、商品をJSONデータとして埋め込む仮想スクロール版を出力する
+            （カードをHTMLに含めないため incremental は使わない）
+        history: 観測データベース（observations.db）。指定するとフッターの直前に
+            在庫履歴の分析（再入荷の時間帯・売り切れまでの時間・在庫推移）を追加する
+    """
+
+    # JSONデータを読み込み
+    if not os.path.exists(json_file):
+        print(f"❌ {json_file} が見つかりません")
+        return
+
+    cache_file = cache_file or output_file + '.cards.json'
+    stat = os.stat(json_file)
+    source = [os.path.abspath(json_file), stat.st_mtime_ns, stat.st_size]
+    if history:
+        # 観測データが追記された場合も再生成する（WALモードのため -wal ファイルも確認）
+        for path in (history, history + '-wal'):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                source += [path, stat.st_mtime_ns, stat.st_size]
+    previous = None
+    incremental = incremental and not virtual
+
+    if incremental:
+        index = load_card_index(cache_file, output_file)
+        if index and index.get('source') == source:
+            print(f"✅ {json_file} は前回から変更されていません: {output_file}")
+            return
+        previous = ({}, '')
+        if index:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                previous = (index['cards'], f.read())
+
+    # all_products.json またはバイナリスナップショット（all_products.snap）
+    data = load_report(json_file)
+
+    history_html = ''
+    if history:
+        if os.path.exists(history):
+            history_html = render_history_section(history)
+        else:
+            print(f"⚠️  {history} が見つかりません（在庫履歴の分析は省略します）")
+
+    cards = None
+    if virtual:
+        write_virtual_report(data, output_file, history_html)
+    else:
+        cards, rendered = write_report(data, output_file, previous, history_html)
+
+    if incremental:
+        # 索引は再生成できるので fsync はしない（壊れていれば全カードを生成し直す）
+        index = {'version': TEMPLATE_VERSION, 'source': source, 'size': os.path.getsize(output_file), 'cards': cards}
+        with open(cache_file + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(index, separators=(',', ':')))
+        os.replace(cache_file + '.tmp', cache_file)
+
+    total = data.get('total', 0)
     print(f"✅ HTMLレポートを生成しました: {output_file}")
+    if incremental:
+        print(f"♻️  再生成したカード: {rendered}件（{len(cards) - rendered}件は前回から変更なし）")
     print(f"📊 総商品数: {total}件")
-    print(f"✅ 在庫あり: {in_stock_count}件")
-    print(f"❌ 売り切れ: {out_of_stock_count}件")
+    print(f"✅ 在庫あり: {data.get('in_stock_count', 0)}件")
+    print(f"❌ 売り切れ: {data.get('out_of_stock_count', 0)}件")
     print(f"\n💡 ブラウザで開いてください:")
     print(f"   open {output_file}")
 
@@ -465,12 +1100,20 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description='POP MART 在庫レポート HTML生成')
-    parser.add_argument('--input', default='all_products.json', help='入力JSONファイル')
+    parser.add_argument('--input', default='all_products.json',
+                        help='入力JSONファイル（list_all_products.py --snapshot のスナップショットも可）')
     parser.add_argument('--output', default='stock_report.html', help='出力HTMLファイル')
+    parser.add_argument('--virtual', action='store_true',
+                        help='商品をJSONデータとして埋め込み、表示範囲のみ描画する仮想スクロール版を出力（大量の商品向け）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='前回から変更された商品のカードのみ再生成（索引: 出力ファイル名.cards.json）')
+    parser.add_argument('--history', type=str,
+                        help='観測データのSQLiteファイルから在庫履歴の分析を追加（例: observations.db）')
 
     args = parser.parse_args()
 
-    generate_html_report(args.input, args.output)
+    generate_html_report(args.input, args.output, incremental=args.incremental, virtual=args.virtual,
+                         history=args.history)
 
 
 if __name__ == '__main__':
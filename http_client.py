@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Client Module
+Provides a pooled keep-alive session for the POP MART CDN with retry logic
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
+    'Accept': '*/*',
+    'Referer': 'https://www.popmart.com/',
+}
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP-date
+
+    Returns:
+        float: Seconds to wait (never negative), or None if absent/unparseable
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """
+    requests.Session wrapper with connection pooling and bounded retries.
+
+    Connection errors, timeouts and RETRY_STATUSES responses are retried with
+    exponential backoff and jitter. A Retry-After header, when present,
+    overrides the computed delay (capped at backoff_max).
+    """
+
+    def __init__(
+        self,
+        headers: Optional[dict] = None,
+        timeout: int = 30,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_size: int = 16
+    ):
+        """
+        Args:
+            headers: Default request headers (default: DEFAULT_HEADERS)
+            timeout: Default request timeout in seconds (default: 30)
+            max_retries: Retries after the first attempt (default: 3)
+            backoff_base: Delay before the first retry in seconds (default: 0.5)
+            backoff_max: Upper bound for any single delay in seconds (default: 30)
+            pool_size: Keep-alive connections kept per host (default: 16)
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS if headers is None else headers)
+
+        # Retries are handled in get() so Retry-After and jitter apply uniformly
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given retry attempt (0-based)"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def request(self, method: str, url: str, timeout: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying transient failures.
+
+        Args:
+            method: HTTP method (e.g. 'GET', 'POST')
+            url: Request URL
+            timeout: Request timeout in seconds (default: the client's timeout)
+            **kwargs: Passed through to requests.Session.request
+
+        Returns:
+            requests.Response: The final response (possibly a retryable status
+            once retries are exhausted; callers still use raise_for_status)
+
+        Raises:
+            requests.exceptions.RequestException: Connection error or timeout
+            after all retry attempts fail
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"⚠ HTTP connection error (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                delay = self.backoff_delay(attempt) if retry_after is None else min(retry_after, self.backoff_max)
+                response.close()
+                print(f"⚠ HTTP {response.status_code} for {url} (attempt {attempt + 1}/{self.max_retries + 1})")
+
+            print(f"  Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+        # Unreachable: the final attempt either returns or raises
+        raise RuntimeError("retry loop exited unexpectedly")
+
+    def get(self, url: str, timeout: Optional[int] = None, **kwargs) -> requests.Response:
+        """GET a URL, retrying transient failures (see request())"""
+        return self.request('GET', url, timeout=timeout, **kwargs)
+
+    def post(self, url: str, timeout: Optional[int] = None, **kwargs) -> requests.Response:
+        """POST to a URL, retrying transient failures (see request())"""
+        return self.request('POST', url, timeout=timeout, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+_default_client: Optional[HttpClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> HttpClient:
+    """Return the process-wide shared HttpClient, creating it on first use"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
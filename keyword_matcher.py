@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Keyword Matcher Module
+Compiles KEYWORD queries once and matches them against normalized product titles
+"""
+
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Katakana (ァ..ヶ) is folded onto hiragana (ぁ..ゖ)
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+# Romaji syllables, longest first when matched; 'l' is read as 'r' (LABUBU = らぶぶ)
+_ROMAJI = {
+    'a': 'あ', 'i': 'い', 'u': 'う', 'e': 'え', 'o': 'お',
+    'ka': 'か', 'ki': 'き', 'ku': 'く', 'ke': 'け', 'ko': 'こ',
+    'sa': 'さ', 'shi': 'し', 'si': 'し', 'su': 'す', 'se': 'せ', 'so': 'そ',
+    'ta': 'た', 'chi': 'ち', 'ti': 'ち', 'tsu': 'つ', 'tu': 'つ', 'te': 'て', 'to': 'と',
+    'na': 'な', 'ni': 'に', 'nu': 'ぬ', 'ne': 'ね', 'no': 'の',
+    'ha': 'は', 'hi': 'ひ', 'fu': 'ふ', 'hu': 'ふ', 'he': 'へ', 'ho': 'ほ',
+    'ma': 'ま', 'mi': 'み', 'mu': 'む', 'me': 'め', 'mo': 'も',
+    'ya': 'や', 'yu': 'ゆ', 'yo': 'よ',
+    'ra': 'ら', 'ri': 'り', 'ru': 'る', 're': 'れ', 'ro': 'ろ',
+    'wa': 'わ', 'wo': 'を',
+    'ga': 'が', 'gi': 'ぎ', 'gu': 'ぐ', 'ge': 'げ', 'go': 'ご',
+    'za': 'ざ', 'ji': 'じ', 'zi': 'じ', 'zu': 'ず', 'ze': 'ぜ', 'zo': 'ぞ',
+    'da': 'だ', 'di': 'ぢ', 'du': 'づ', 'de': 'で', 'do': 'ど',
+    'ba': 'ば', 'bi': 'び', 'bu': 'ぶ', 'be': 'べ', 'bo': 'ぼ',
+    'pa': 'ぱ', 'pi': 'ぴ', 'pu': 'ぷ', 'pe': 'ぺ', 'po': 'ぽ',
+    'fa': 'ふぁ', 'fi': 'ふぃ', 'fe': 'ふぇ', 'fo': 'ふぉ',
+    'va': 'ゔぁ', 'vi': 'ゔぃ', 'vu': 'ゔ', 've': 'ゔぇ', 'vo': 'ゔぉ',
+    'sha': 'しゃ', 'shu': 'しゅ', 'sho': 'しょ',
+    'cha': 'ちゃ', 'chu': 'ちゅ', 'cho': 'ちょ',
+    'ja': 'じゃ', 'ju': 'じゅ', 'jo': 'じょ',
+    'n': 'ん',
+}
+for _consonant, _kana in (('k', 'き'), ('g', 'ぎ'), ('n', 'に'), ('h', 'ひ'), ('m', 'み'),
+                          ('r', 'り'), ('b', 'び'), ('p', 'ぴ')):
+    for _vowel, _small in (('a', 'ゃ'), ('u', 'ゅ'), ('o', 'ょ')):
+        _ROMAJI[_consonant + 'y' + _vowel] = _kana + _small
+_ROMAJI.update({key.replace('r', 'l'): kana for key, kana in list(_ROMAJI.items()) if 'r' in key})
+
+_ROMAJI_MAX = max(len(key) for key in _ROMAJI)
+# Shorter Latin words (e.g. "NE", "AI") are too ambiguous to be read as romaji
+ROMAJI_MIN_LENGTH = 3
+_LATIN_RUN = re.compile(r'[a-z]{%d,}' % ROMAJI_MIN_LENGTH)
+_TOKEN = re.compile(r'"[^"]*"|\S+')
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize text for matching.
+
+    NFKC folds full-width ASCII and half-width katakana ("ﾗﾌﾞﾌﾞ" -> "ラブブ"),
+    casefold() ignores case, and katakana is folded onto hiragana.
+    """
+    return unicodedata.normalize('NFKC', text).casefold().translate(_KATAKANA_TO_HIRAGANA)
+
+
+def romaji_to_hiragana(text: str) -> Optional[str]:
+    """
+    Transliterate a lowercase romaji word to hiragana.
+
+    Returns:
+        str: Hiragana reading, or None if the word is not valid romaji
+    """
+    out = []
+    i = 0
+    while i < len(text):
+        # Doubled consonant: small tsu (e.g. "kko" -> "っこ")
+        if i + 1 < len(text) and text[i] == text[i + 1] and text[i] not in 'aiueon':
+            out.append('っ')
+            i += 1
+            continue
+        for length in range(min(_ROMAJI_MAX, len(text) - i), 0, -1):
+            kana = _ROMAJI.get(text[i:i + length])
+            # A lone 'n' before a vowel or 'y' starts the next syllable instead
+            if kana == 'ん' and i + 1 < len(text) and text[i + 1] in 'aiueoy':
+                continue
+            if kana:
+                out.append(kana)
+                i += length
+                break
+        else:
+            return None
+    return ''.join(out)
+
+
+def search_key(title: str) -> str:
+    """
+    Normalized form of a title that keywords are matched against.
+
+    Latin words that read as romaji are appended in hiragana, so a kana
+    keyword also finds a title written in Latin letters.
+    """
+    key = normalize(title)
+    readings = [romaji_to_hiragana(word) for word in _LATIN_RUN.findall(key)]
+    readings = [reading for reading in readings if reading]
+    return key + '\n' + ' '.join(readings) if readings else key
+
+
+def term_variants(term: str) -> Tuple[str, ...]:
+    """Normalized forms of a keyword term: as written, plus its hiragana reading if it is romaji"""
+    term = normalize(term)
+    is_word = term.isascii() and term.isalpha() and len(term) >= ROMAJI_MIN_LENGTH
+    reading = romaji_to_hiragana(term) if is_word else None
+    return (term, reading) if reading and reading != term else (term,)
+
+
+class TitleCache:
+    """
+    Search keys of product titles, cached per product ID.
+
+    A cached key is reused as long as the product's title is unchanged, so
+    titles are normalized once per product rather than once per scan.
+    """
+
+    def __init__(self):
+        self._keys: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def key(self, product_id, title: str) -> str:
+        """Search key of a title, computed on first use for each product ID"""
+        product_id = str(product_id)
+        cached = self._keys.get(product_id)
+        if cached is not None and cached[0] == title:
+            return cached[1]
+
+        key = search_key(title)
+        with self._lock:
+            self._keys[product_id] = (title, key)
+        return key
+
+    def __len__(self):
+        return len(self._keys)
+
+
+# Shared by every matcher unless one is given explicitly
+DEFAULT_TITLE_CACHE = TitleCache()
+
+
+def _is_operator(token: str) -> bool:
+    """True if a query token uses the query syntax (OR, AND, NOT, '-' or quotes)"""
+    return token in ('|', 'OR', 'AND', 'NOT') or token.startswith('"') or \
+        (token.startswith('-') and len(token) > 1)
+
+
+class KeywordMatcher:
+    """
+    Compiled keyword query.
+
+    Syntax: whitespace-separated terms must all match (AND); '|' or OR
+    separates alternatives; a leading '-' or NOT excludes a term; "double
+    quotes" keep a phrase with spaces together. A query without any of
+    these operators is matched as one phrase, as KEYWORD always was, so
+    'THE MONSTERS' and '"THE MONSTERS"' are the same. Matching ignores case,
+    full-width/half-width forms and hiragana/katakana, and romaji terms of
+    three or more letters also match their kana reading. An empty query
+    matches everything; a NOT with no term after it is an ordinary word.
+
+    Examples: 'LABUBU', 'ラブブ | ZIMOMO', 'LABUBU -キーホルダー', '"THE MONSTERS" NOT ぬいぐるみ'
+    """
+
+    def __init__(self, query: Optional[str], cache: Optional[TitleCache] = None):
+        """
+        Args:
+            query: Keyword query (see class docstring)
+            cache: TitleCache for normalized titles (default: shared cache)
+        """
+        self.query = (query or '').strip()
+        self.cache = cache or DEFAULT_TITLE_CACHE
+        # [(required, excluded)], each a list of term variant tuples; any clause may match
+        self.clauses: List[Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]] = []
+
+        tokens = _TOKEN.findall(self.query)
+        if len(tokens) > 1 and not any(_is_operator(token) for token in tokens):
+            self._add_clause([term_variants(self.query)], [])
+            return
+
+        required, excluded = [], []
+        negate = False
+        for token in tokens:
+            if token in ('|', 'OR'):
+                # A NOT with nothing after it in its clause is searched for literally
+                if negate:
+                    required.append(term_variants('NOT'))
+                    negate = False
+                self._add_clause(required, excluded)
+                required, excluded = [], []
+                continue
+            if token == 'AND':
+                continue
+            if token == 'NOT':
+                negate = True
+                continue
+            if token.startswith('-') and len(token) > 1:
+                negate, token = True, token[1:]
+            term = token.strip('"')
+            if term:
+                (excluded if negate else required).append(term_variants(term))
+            negate = False
+        if negate:
+            required.append(term_variants('NOT'))
+        self._add_clause(required, excluded)
+
+        # A query made only of operators (e.g. '|') is searched for literally, not as "match all"
+        if self.query and not self.clauses:
+            self._add_clause([term_variants(self.query)], [])
+
+    def _add_clause(self, required, excluded):
+        if required or excluded:
+            self.clauses.append((required, excluded))
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    def __repr__(self):
+        return f"KeywordMatcher({self.query!r})"
+
+    def matches_key(self, key: str) -> bool:
+        """True if a search_key() matches the query"""
+        if not self.clauses:
+            return True
+        for required, excluded in self.clauses:
+            if all(any(v in key for v in variants) for variants in required) and \
+                    not any(any(v in key for v in variants) for variants in excluded):
+                return True
+        return False
+
+    def matches(self, title: str, product_id=None) -> bool:
+        """
+        True if a title matches the query.
+
+        Args:
+            title: Product title
+            product_id: Product ID used to cache the normalized title (optional)
+        """
+        if not self.clauses:
+            return True
+        key = self.cache.key(product_id, title) if product_id is not None else search_key(title)
+        return self.matches_key(key)
+
+    def matches_product(self, product) -> bool:
+        """True if a Product's title matches the query"""
+        return self.matches(product.title, product.id)
+
+    def filter(self, products: Iterable) -> list:
+        """Products whose title matches the query, in order"""
+        if not self.clauses:
+            return list(products)
+        return [product for product in products if self.matches(product.title, product.id)]
+
+
+@lru_cache(maxsize=256)
+def compile_keyword(query: Optional[str]) -> KeywordMatcher:
+    """Compile a keyword query once; repeated queries return the same matcher"""
+    return KeywordMatcher(query)
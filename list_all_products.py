@@ -10,6 +10,12 @@ import requests
 import json
 from datetime import datetime, timezone, timedelta
 
+from collection_config import load_collection_configs
+from keyword_matcher import compile_keyword
+from observation_store import ObservationStore
+from popmart_api import DEFAULT_CONCURRENCY, fetch_collection
+from snapshot_file import write_snapshot
+
 JST = timezone(timedelta(hours=9))
 
 
@@ -18,66 +24,53 @@ def get_jst_now():
     return datetime.now(JST)
 
 
-def fetch_all_products(collection_id=223):
+def fetch_all_products(collection_id=223, concurrency=DEFAULT_CONCURRENCY):
     """
     指定したコレクションの全商品を取得
 
     Args:
         collection_id: コレクションID（デフォルト: 223 = THE MONSTERS）
+        concurrency: 並列取得するページ数の上限（1 = 逐次取得）
 
     Returns:
-        list: 商品リスト
+        tuple: (商品リスト, コレクション名)。途中のページでエラーになった場合は
+               取得済みのページの商品のみ（1件もなければ空リスト）
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-        'Accept': '*/*',
-        'Referer': 'https://www.popmart.com/',
-    }
-
-    all_products = []
-    page = 1
-    collection_name = None
-    total_products = None
-
     print(f"🔍 コレクションID {collection_id} の商品を取得中...")
 
-    while True:
-        url = f"https://cdn-global.popmart.com/shop_productoncollection-{collection_id}-1-{page}-jp-ja.json"
-
-        try:
-            response = requests.get(url, headers=headers, timeout=30)
-
-            if response.status_code == 404:
-                # 404は次のページがないことを意味する
-                break
-
-            response.raise_for_status()
-            data = response.json()
-
-            if page == 1:
-                collection_name = data.get('name', 'Unknown')
-                total_products = data.get('total', 0)
-                print(f"📦 コレクション: {collection_name}")
-                print(f"📊 総商品数（API報告）: {total_products}件")
-                print()
-
-            products = data.get('productData', [])
-            if not products:
-                break
-
-            all_products.extend(products)
-            print(f"   ページ{page}: {len(products)}件取得（累計: {len(all_products)}件）")
-
-            page += 1
-
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                break
-            print(f"❌ HTTPエラー: {e}")
-            break
-        except Exception as e:
-            print(f"❌ エラー: {e}")
-            break
+    # 途中のページでエラーになっても、取得済みのページの商品は残す
+    fetched_products = []
+    fetched_name = None
+
+    def on_page(page, data, fetched):
+        nonlocal fetched_name
+        fetched_products.extend(data['productData'])
+        if page == 1:
+            fetched_name = data.get('name', 'Unknown')
+            print(f"📦 コレクション: {fetched_name}")
+            print(f"📊 総商品数（API報告）: {data.get('total', 0)}件")
+            print()
+        print(f"   ページ{page}: {len(data['productData'])}件取得（累計: {fetched}件）")
+
+    try:
+        snapshot = fetch_collection(collection_id, concurrency=concurrency, on_page=on_page)
+    except requests.exceptions.HTTPError as e:
+        print(f"❌ HTTPエラー: {e}")
+        snapshot = None
+    except Exception as e:
+        print(f"❌ エラー: {e}")
+        snapshot = None
+
+    if snapshot is not None:
+        all_products = snapshot.products
+        collection_name = snapshot.name
+        total_products = snapshot.total
+    else:
+        all_products = fetched_products
+        collection_name = fetched_name
+        total_products = None
+        if all_products:
+            print(f"⚠️  警告: 取得済みの{len(all_products)}件のみで続行します（残りのページは未取得）")
 
     print(f"\n✅ 取得完了: {len(all_products)}件")
 
@@ -93,45 +86,19 @@ def analyze_products(products):
     商品リストを分析
 
     Args:
-        products: 商品リスト
+        products: 商品リスト（Product）
 
     Returns:
-        dict: 分析結果
+        dict: 分析結果（in_stock / out_of_stock は Product のリスト）
     """
     in_stock = []
     out_of_stock = []
 
     for product in products:
-        total_stock = 0
-        sku_details = []
-
-        for sku in product.get('skus', []):
-            stock = sku.get('stock', {})
-            online_stock = stock.get('onlineStock', 0)
-
-            if online_stock > 0:
-                sku_details.append({
-                    'price': sku.get('price', 0),
-                    'currency': sku.get('currency', 'JPY'),
-                    'stock': online_stock
-                })
-
-            total_stock += online_stock
-
-        product_info = {
-            'id': product.get('id'),
-            'title': product.get('title'),
-            'is_new': product.get('isNew', False),
-            'is_hot': product.get('isHot', False),
-            'total_stock': total_stock,
-            'sku_details': sku_details,
-            'url': f"https://www.popmart.com/jp/products/{product.get('id')}"
-        }
-
-        if total_stock > 0:
-            in_stock.append(product_info)
+        if product.in_stock:
+            in_stock.append(product)
         else:
-            out_of_stock.append(product_info)
+            out_of_stock.append(product)
 
     return {
         'in_stock': in_stock,
@@ -140,7 +107,7 @@ def analyze_products(products):
     }
 
 
-def print_product_list(products, show_all=False, filter_keyword=None):
+def print_product_list(products, show_all=False, filter_keyword=None, snapshot_file=None, collection_id=223):
     """
     商品リストを表示
 
@@ -148,6 +115,8 @@ def print_product_list(products, show_all=False, filter_keyword=None):
         products: 商品リスト
         show_all: 全商品を表示（デフォルト: False）
         filter_keyword: フィルタキーワード（部分一致）
+        snapshot_file: 指定すると all_products.json と同じ内容をバイナリスナップショットにも保存
+        collection_id: 取得したコレクションID（all_products.json に記録）
     """
     results = analyze_products(products)
 
@@ -161,8 +130,9 @@ def print_product_list(products, show_all=False, filter_keyword=None):
 
     # フィルタリング
     if filter_keyword:
-        filtered_in_stock = [p for p in results['in_stock'] if filter_keyword.lower() in p['title'].lower()]
-        filtered_out_of_stock = [p for p in results['out_of_stock'] if filter_keyword.lower() in p['title'].lower()]
+        matcher = compile_keyword(filter_keyword)
+        filtered_in_stock = matcher.filter(results['in_stock'])
+        filtered_out_of_stock = matcher.filter(results['out_of_stock'])
 
         print(f"🔍 キーワードフィルタ: '{filter_keyword}'")
         print(f"   該当商品: {len(filtered_in_stock) + len(filtered_out_of_stock)}件")
@@ -178,20 +148,20 @@ def print_product_list(products, show_all=False, filter_keyword=None):
         print("="*80)
         for idx, product in enumerate(results['in_stock'], 1):
             badges = []
-            if product['is_new']:
+            if product.is_new:
                 badges.append('🆕')
-            if product['is_hot']:
+            if product.is_hot:
                 badges.append('🔥')
 
             badge_str = ' '.join(badges)
-            print(f"\n{idx}. {product['title']} {badge_str}")
-            print(f"   商品ID: {product['id']}")
-            print(f"   総在庫: {product['total_stock']}個")
+            print(f"\n{idx}. {product.title} {badge_str}")
+            print(f"   商品ID: {product.id}")
+            print(f"   総在庫: {product.total_stock}個")
 
-            for sku in product['sku_details']:
-                print(f"   - {sku['price']:,} {sku['currency']}: {sku['stock']}個")
+            for sku in product.in_stock_skus:
+                print(f"   - {sku.price:,} {sku.currency}: {sku.stock}個")
 
-            print(f"   🔗 {product['url']}")
+            print(f"   🔗 {product.url}")
 
     # 売り切れ商品を表示（show_all=Trueの場合のみ）
     if show_all and results['out_of_stock']:
@@ -200,36 +170,25 @@ def print_product_list(products, show_all=False, filter_keyword=None):
         print("="*80)
         for idx, product in enumerate(results['out_of_stock'], 1):
             badges = []
-            if product['is_new']:
+            if product.is_new:
                 badges.append('🆕')
-            if product['is_hot']:
+            if product.is_hot:
                 badges.append('🔥')
 
             badge_str = ' '.join(badges)
-            print(f"\n{idx}. {product['title']} {badge_str}")
-            print(f"   商品ID: {product['id']}")
-            print(f"   🔗 {product['url']}")
+            print(f"\n{idx}. {product.title} {badge_str}")
+            print(f"   商品ID: {product.id}")
+            print(f"   🔗 {product.url}")
 
     # JSONで保存
     output_file = 'all_products.json'
     output_data = {
         'timestamp': get_jst_now().isoformat(),
-        'collection_id': os.environ.get('COLLECTION_ID', '223'),
+        'collection_id': str(collection_id),
         'total': results['total'],
         'in_stock_count': len(results['in_stock']),
         'out_of_stock_count': len(results['out_of_stock']),
-        'products': [
-            {
-                'id': p['id'],
-                'title': p['title'],
-                'is_new': p['is_new'],
-                'is_hot': p['is_hot'],
-                'total_stock': p['total_stock'],
-                'sku_details': p['sku_details'],
-                'url': p['url']
-            }
-            for p in results['in_stock'] + results['out_of_stock']
-        ]
+        'products': [p.to_report_dict() for p in results['in_stock'] + results['out_of_stock']]
     }
 
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -237,15 +196,29 @@ def print_product_list(products, show_all=False, filter_keyword=None):
 
     print(f"\n💾 全商品データを {output_file} に保存しました")
 
+    # バイナリスナップショットを保存（--snapshot指定時のみ）
+    if snapshot_file:
+        try:
+            size = write_snapshot(snapshot_file, output_data)
+            print(f"💾 スナップショットを {snapshot_file} に保存しました（{size:,}バイト）")
+        except ValueError as e:
+            print(f"⚠️  スナップショットを保存できませんでした: {e}")
+
 
 def main():
     """メイン処理"""
     import argparse
 
     parser = argparse.ArgumentParser(description='POP MART 全商品在庫確認ツール')
-    parser.add_argument('--collection-id', type=int, default=223, help='コレクションID（デフォルト: 223）')
+    parser.add_argument('--collection-id', type=int,
+                        help='コレクションID（デフォルト: 環境変数 COLLECTION_ID の最初のコレクション、未設定なら223）')
     parser.add_argument('--show-all', action='store_true', help='売り切れ商品も全て表示')
     parser.add_argument('--filter', type=str, help='商品名でフィルタ（部分一致）')
+    parser.add_argument('--db', type=str, help='在庫の観測データを記録するSQLiteファイル（例: observations.db）')
+    parser.add_argument('--snapshot', type=str,
+                        help='全商品データをバイナリスナップショットにも保存（例: all_products.snap）')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'並列取得するページ数の上限（デフォルト: {DEFAULT_CONCURRENCY}、1で逐次取得）')
 
     args = parser.parse_args()
 
@@ -256,17 +229,39 @@ def main():
     print()
 
     # 環境変数からコレクションIDを取得（コマンドライン引数が優先）
-    collection_id = int(os.environ.get('COLLECTION_ID', args.collection_id))
+    if args.collection_id is not None:
+        collection_id = args.collection_id
+    else:
+        # check_stock.py と同じ書式（"223"、"223:LABUBU,241"、"collections.json"）を受け付ける
+        try:
+            configs = load_collection_configs(os.environ.get('COLLECTION_ID', ''))
+        except ValueError as e:
+            print(f"❌ COLLECTION_ID を解析できません: {e}")
+            sys.exit(1)
+        collection_id = configs[0]['id']
+        if len(configs) > 1:
+            print(f"ℹ️  COLLECTION_ID に{len(configs)}件のコレクションが指定されています。"
+                  f"最初のコレクション（{collection_id}）を表示します（--collection-id で変更可）")
+            print()
 
     # 全商品を取得
-    products, collection_name = fetch_all_products(collection_id)
+    products, collection_name = fetch_all_products(collection_id, concurrency=args.concurrency)
 
     if not products:
         print("❌ 商品を取得できませんでした")
         sys.exit(1)
 
+    # 観測データを記録（--db指定時のみ）
+    if args.db:
+        store = ObservationStore(args.db)
+        rows = store.record_products(products, collection_id)
+        store.apply_retention()
+        store.close()
+        print(f"🗄️  {rows}件のSKU観測データを {args.db} に記録しました")
+
     # 商品リストを表示
-    print_product_list(products, show_all=args.show_all, filter_keyword=args.filter)
+    print_product_list(products, show_all=args.show_all, filter_keyword=args.filter, snapshot_file=args.snapshot,
+                       collection_id=collection_id)
 
     print("\n" + "="*80)
     print("✅ 完了")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Message Templates Module
+Precompiled text/HTML templates for in-stock and upcoming-sale notifications
+"""
+
+import html
+from datetime import datetime, timezone, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional, Tuple
+
+JST = timezone(timedelta(hours=9))
+
+BUTTON_STYLE = 'background-color: {color}; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;'
+
+
+class MessageTemplate:
+    """
+    Templates for one notification kind.
+
+    The format strings are bound once at construction and the static parts
+    of the HTML document (opening tags, heading, closing tags) are prebuilt,
+    so rendering a digest is a single pass over the products.
+    """
+
+    __slots__ = ('subject', '_summary_item', '_text_header', '_text_item', '_text_sku',
+                 '_html_head', '_html_header', '_html_item', '_html_sku', '_html_tail')
+
+    def __init__(self, subject: str, intro: str, heading: str, count_label: str,
+                 text_item: str, html_item: str, summary_item: str, button_color: str,
+                 text_sku: str = '', html_sku: str = ''):
+        """
+        Args:
+            subject: Email subject, with a {count} field
+            intro: First line of the text body
+            heading: <h2> heading of the HTML body
+            count_label: Label of the product count (e.g. '入荷商品数')
+            text_item: Text block per product; fields are the Product.summary()
+                keys plus {index} and {sku_lines}
+            html_item: HTML block per product; same fields plus {button}
+            summary_item: Line per product of the short summary
+            button_color: Background color of the product page button
+            text_sku: Text line per SKU, with the SKU dict's fields (optional)
+            html_sku: HTML line per SKU, with the SKU dict's fields (optional)
+        """
+        self.subject = subject.format
+        self._summary_item = summary_item.format
+        self._text_header = (
+            intro + '\n\nチェック日時: {now} (JST)\n\n' + count_label + ': {count}件\n\n'
+        ).format
+        self._text_item = text_item.format
+        self._text_sku = text_sku.format if text_sku else None
+
+        # Static shell around the per-message parts
+        self._html_head = f'<html><body>\n<h2>{heading}</h2>\n'
+        self._html_header = (
+            '<p><strong>チェック日時:</strong> {now} (JST)</p>\n'
+            '<p><strong>' + count_label + ':</strong> {count}件</p>\n'
+            '<hr>\n'
+        ).format
+        button = f'<p><a href="{{url}}" style="{BUTTON_STYLE.format(color=button_color)}">商品ページを見る</a></p>'
+        self._html_item = html_item.replace('{button}', button).format
+        self._html_sku = html_sku.format if html_sku else None
+        self._html_tail = '</body></html>'
+
+    def render(self, products: List[dict], now: Optional[datetime] = None) -> Tuple[str, str, str]:
+        """
+        Render a notification for a list of products.
+
+        Args:
+            products: Product.summary() dicts
+            now: Check time shown in the message (default: now, JST)
+
+        Returns:
+            tuple: (subject, text body, HTML body)
+        """
+        now_str = (now or datetime.now(JST)).strftime('%Y-%m-%d %H:%M:%S')
+        count = len(products)
+
+        text_parts = [self._text_header(now=now_str, count=count)]
+        html_parts = [self._html_head, self._html_header(now=now_str, count=count)]
+
+        for index, product in enumerate(products, 1):
+            escaped = dict(product, title=html.escape(product['title']), url=html.escape(product['url']))
+            text_skus = html_skus = ''
+            if self._text_sku:
+                text_skus = ''.join(self._text_sku(**sku) for sku in product['skus'])
+            if self._html_sku:
+                html_skus = ''.join(self._html_sku(**sku) for sku in product['skus'])
+
+            text_parts.append(self._text_item(index=index, sku_lines=text_skus, **product))
+            html_parts.append(self._html_item(index=index, sku_lines=html_skus, **escaped))
+
+        html_parts.append(self._html_tail)
+        # Products are separated by a blank line in the text body
+        text = text_parts[0] + '\n'.join(text_parts[1:])
+        return self.subject(count=count), text, ''.join(html_parts)
+
+    def summary(self, products: List[dict]) -> str:
+        """
+        Short plain-text summary (for chat webhooks), one line per product.
+
+        Returns:
+            str: Subject line followed by one line per product
+        """
+        lines = [self.subject(count=len(products))]
+        lines.extend(self._summary_item(**product) for product in products)
+        return '\n'.join(lines)
+
+
+TEMPLATES = {
+    'in_stock': MessageTemplate(
+        subject='POP MART - {count}件の商品が入荷しました！',
+        intro='POP MARTで商品が入荷しました。',
+        heading='POP MART - 商品が入荷しました！',
+        count_label='入荷商品数',
+        text_item='\n{index}. {title}\n{sku_lines}   URL: {url}',
+        text_sku='   価格: {price:,} {currency} - 在庫あり\n',
+        html_item='<h3>{index}. {title}</h3>\n<ul>\n{sku_lines}</ul>\n{button}\n<hr>\n',
+        html_sku='<li><strong>価格:</strong> {price:,} {currency} - 在庫あり</li>\n',
+        summary_item='• {title} {url}',
+        button_color='#4CAF50',
+    ),
+    'upcoming': MessageTemplate(
+        subject='POP MART - {count}件の再販が予定されています！',
+        intro='POP MARTで商品の再販が予定されています。',
+        heading='POP MART - 商品の再販が予定されています！',
+        count_label='再販予定商品数',
+        text_item='\n{index}. {title}\n   販売開始: {upTime_str} (JST)\n   URL: {url}',
+        html_item='<h3>{index}. {title}</h3>\n<p><strong>⏰ 販売開始:</strong> {upTime_str} (JST)</p>\n{button}\n<hr>\n',
+        summary_item='• {title} ({upTime_str} JST) {url}',
+        button_color='#FF6B35',
+    ),
+}
+
+
+def build_message(kind: str, products: List[dict], now: Optional[datetime] = None) -> MIMEMultipart:
+    """
+    Build the email for a notification.
+
+    Args:
+        kind: Notification kind ('in_stock' or 'upcoming')
+        products: Product.summary() dicts
+        now: Check time shown in the message (default: now, JST)
+
+    Returns:
+        MIMEMultipart: Message with Subject and text/HTML bodies (no From/To)
+    """
+    subject, text, body = TEMPLATES[kind].render(products, now)
+
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg.attach(MIMEText(text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(body, 'html', 'utf-8'))
+    return msg
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Product Model Module
+Compact product/SKU objects parsed once from the POP MART API and shared by every tool
+"""
+
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, List, Optional
+
+from keyword_matcher import compile_keyword
+
+JST = timezone(timedelta(hours=9))
+
+PRODUCT_URL = "https://www.popmart.com/jp/products/{product_id}"
+
+
+class Sku:
+    """
+    One SKU of a product.
+
+    Attributes:
+        id: SKU ID (None if the API did not report one)
+        price: Price in the SKU's currency
+        currency: Currency code (e.g. 'JPY')
+        stock: Online stock
+    """
+
+    __slots__ = ('id', 'price', 'currency', 'stock')
+
+    def __init__(self, id=None, price=0, currency='JPY', stock=0):
+        self.id = id
+        self.price = price
+        self.currency = currency
+        self.stock = stock
+
+    @classmethod
+    def from_api(cls, data: dict) -> 'Sku':
+        """Build a Sku from a 'skus' entry of the collection API"""
+        stock = data.get('stock')
+        return cls(
+            id=data.get('id'),
+            price=data.get('price', 0),
+            currency=data.get('currency', 'JPY'),
+            stock=stock.get('onlineStock', 0) if isinstance(stock, dict) else 0,
+        )
+
+    def to_dict(self) -> dict:
+        """{'price', 'currency', 'stock'} as used by notifications and reports"""
+        return {'price': self.price, 'currency': self.currency, 'stock': self.stock}
+
+    def __repr__(self):
+        return f"Sku(id={self.id!r}, price={self.price!r}, stock={self.stock!r})"
+
+
+class Product:
+    """
+    One product of a collection.
+
+    Only the fields used by the checker and the tools are kept. total_stock
+    is computed once at construction and url on first use, so consumers
+    never re-walk the SKU list.
+
+    Attributes:
+        id: Product ID
+        title: Product title
+        up_time: Sale start as a UNIX timestamp (0 if unknown)
+        is_new: 'New' badge
+        is_hot: 'Hot' badge
+        skus: Tuple of Sku
+        total_stock: Online stock summed over all SKUs
+    """
+
+    __slots__ = ('id', 'title', 'up_time', 'is_new', 'is_hot', 'skus', 'total_stock', '_url')
+
+    def __init__(self, id, title='', up_time=0, is_new=False, is_hot=False, skus: Iterable[Sku] = ()):
+        self.id = id
+        self.title = title
+        self.up_time = up_time
+        self.is_new = is_new
+        self.is_hot = is_hot
+        self.skus = tuple(skus)
+        self.total_stock = sum(sku.stock for sku in self.skus)
+        self._url = None
+
+    @classmethod
+    def from_api(cls, data: dict) -> 'Product':
+        """Build a Product from a 'productData' entry of the collection API"""
+        return cls(
+            id=data.get('id'),
+            title=data.get('title', ''),
+            up_time=data.get('upTime', 0),
+            is_new=data.get('isNew', False),
+            is_hot=data.get('isHot', False),
+            skus=[Sku.from_api(sku) for sku in data.get('skus') or []],
+        )
+
+    @classmethod
+    def from_report(cls, data: dict) -> 'Product':
+        """Build a Product from a 'products' entry of all_products.json (in-stock SKUs only)"""
+        product = cls(
+            id=data.get('id'),
+            title=data.get('title', ''),
+            is_new=data.get('is_new', False),
+            is_hot=data.get('is_hot', False),
+            skus=[Sku(price=s.get('price', 0), currency=s.get('currency', 'JPY'), stock=s.get('stock', 0))
+                  for s in data.get('sku_details', [])],
+        )
+        product.total_stock = data.get('total_stock', product.total_stock)
+        return product
+
+    @property
+    def url(self) -> str:
+        """Product page URL"""
+        if self._url is None:
+            self._url = PRODUCT_URL.format(product_id=self.id)
+        return self._url
+
+    @property
+    def in_stock(self) -> bool:
+        """True if any SKU has online stock"""
+        return self.total_stock > 0
+
+    @property
+    def in_stock_skus(self) -> List[Sku]:
+        """SKUs with online stock"""
+        return [sku for sku in self.skus if sku.stock > 0]
+
+    def matches(self, keyword: Optional[str]) -> bool:
+        """True if the title matches a keyword query (see keyword_matcher), or keyword is empty"""
+        return compile_keyword(keyword).matches_product(self)
+
+    def summary(self, collection_id=None) -> dict:
+        """
+        JSON-serializable dict used by notifications.
+
+        Returns:
+            dict: id, title, collection_id, in-stock skus, total_stock, upTime, upTime_str and url
+        """
+        return {
+            'id': self.id,
+            'title': self.title,
+            'collection_id': collection_id,
+            'skus': [sku.to_dict() for sku in self.in_stock_skus],
+            'total_stock': self.total_stock,
+            'upTime': self.up_time,
+            'upTime_str': datetime.fromtimestamp(self.up_time, JST).strftime('%Y-%m-%d %H:%M:%S'),
+            'url': self.url,
+        }
+
+    def to_report_dict(self) -> dict:
+        """Entry of the 'products' list in all_products.json"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'is_new': self.is_new,
+            'is_hot': self.is_hot,
+            'total_stock': self.total_stock,
+            'sku_details': [sku.to_dict() for sku in self.in_stock_skus],
+            'url': self.url,
+        }
+
+    def __repr__(self):
+        return f"Product(id={self.id!r}, title={self.title!r}, total_stock={self.total_stock!r})"
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Notification Queue Module
+Delivers notifications from a background worker so checks never wait on SMTP
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from state_store import StateError, atomic_write_json, load_json
+
+DEFAULT_SPILL_FILE = 'notification_queue.json'
+DEFAULT_MAX_QUEUE = 100
+# A saved job is dropped after this many failed deliveries or this many seconds
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_MAX_AGE = 24 * 3600
+# A failed job is retried after this delay, doubled after each failure up to the maximum
+DEFAULT_RETRY_DELAY = 60
+DEFAULT_MAX_RETRY_DELAY = 3600
+# Seconds the idle worker waits before checking for failed jobs due for retry
+RETRY_POLL_INTERVAL = 1.0
+
+
+class PartialDeliveryError(Exception):
+    """
+    Raised by a handler that delivered only part of a job.
+
+    Attributes:
+        remaining: Payload covering only the undelivered part; the job is
+            retried with it instead of its original payload
+    """
+
+    def __init__(self, message: str, remaining):
+        super().__init__(message)
+        self.remaining = remaining
+
+
+class NotificationDispatcher:
+    """
+    Bounded in-memory queue of notification jobs drained by a worker thread.
+
+    A job is a JSON-serializable dict {'kind': str, 'payload': ...,
+    'enqueued_at': float, 'attempts': int}; the handler registered for its
+    kind performs the delivery. A failed job is re-queued by the worker after
+    an exponential backoff, so a long-running process keeps retrying it. Jobs
+    that cannot be queued (queue full), that are waiting for a retry, or that
+    are still pending at shutdown are spilled to disk and re-queued by the
+    next dispatcher started on the same spill file. Either way a job is
+    dropped once it has failed max_attempts times or is older than max_age.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[object], None]],
+        spill_file: str = DEFAULT_SPILL_FILE,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        max_age: float = DEFAULT_MAX_AGE,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        max_retry_delay: float = DEFAULT_MAX_RETRY_DELAY,
+        refresh: Optional[Dict[str, Callable[[object], object]]] = None
+    ):
+        """
+        Args:
+            handlers: {kind: callable(payload)} delivering each kind of job
+            spill_file: File holding undelivered jobs between runs
+            max_queue: Maximum jobs held in memory (default: 100)
+            max_attempts: Failed deliveries after which a saved job is dropped (default: 10)
+            max_age: Seconds after enqueue after which a saved job is dropped (default: 1 day)
+            retry_delay: Seconds before the first retry of a failed job (default: 60)
+            max_retry_delay: Upper bound of the doubling retry delay (default: 1 hour)
+            refresh: {kind: callable(payload)} applied to re-queued jobs of that kind;
+                returns the payload still worth delivering, or None to drop the job
+                (e.g. sale announcements whose sale has started)
+        """
+        self.handlers = handlers
+        self.spill_file = spill_file
+        self.max_attempts = max_attempts
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.refresh = refresh or {}
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.spilled: List[dict] = []
+        self.failed: List[dict] = []
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        """Re-queue jobs spilled by a previous run and start the worker thread"""
+        try:
+            pending = load_json(self.spill_file) or []
+        except StateError as e:
+            print(f"Warning: {e}")
+            pending = []
+        if pending:
+            os.remove(self.spill_file)
+            pending = [job for job in map(self._revive, pending) if job is not None]
+            if pending:
+                print(f"Re-queuing {len(pending)} undelivered notification(s) from {self.spill_file}")
+            for job in pending:
+                self._put(job)
+
+        self._worker = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+        self._worker.start()
+
+    def _revive(self, job: dict) -> Optional[dict]:
+        # A spilled job that is still worth delivering, or None (with a warning) if it is dropped
+        attempts = job.get('attempts', 0)
+        age = time.time() - job.get('enqueued_at', time.time())
+        if attempts >= self.max_attempts:
+            print(f"Warning: Dropping '{job['kind']}' notification after {attempts} failed attempts")
+            return None
+        if age > self.max_age:
+            print(f"Warning: Dropping '{job['kind']}' notification queued {age / 3600:.0f}h ago")
+            return None
+
+        refresh = self.refresh.get(job['kind'])
+        if refresh is not None:
+            payload = refresh(job['payload'])
+            if payload is None:
+                print(f"Dropping '{job['kind']}' notification: no longer current")
+                return None
+            job = dict(job, payload=payload)
+        return job
+
+    def enqueue(self, kind: str, payload):
+        """
+        Queue a notification without blocking.
+
+        Args:
+            kind: Handler kind (e.g. 'in_stock', 'upcoming')
+            payload: JSON-serializable handler argument
+        """
+        self._put({'kind': kind, 'payload': payload, 'enqueued_at': time.time(), 'attempts': 0})
+
+    def _put(self, job: dict):
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            print(f"Warning: Notification queue full, spilling '{job['kind']}' to {self.spill_file}")
+            with self._lock:
+                self.spilled.append(job)
+
+    def _fail(self, job: dict):
+        # Schedule a retry of a failed job with exponential backoff
+        attempts = job.get('attempts', 0) + 1
+        delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+        with self._lock:
+            self.failed.append(dict(job, attempts=attempts, retry_at=time.time() + delay))
+
+    def _retry_due(self):
+        # Re-queue failed jobs whose backoff has elapsed (and that are still worth delivering)
+        now = time.time()
+        with self._lock:
+            due = [job for job in self.failed if job.get('retry_at', 0) <= now]
+            if not due:
+                return
+            self.failed = [job for job in self.failed if job.get('retry_at', 0) > now]
+        for job in due:
+            job = self._revive(job)
+            if job is not None:
+                print(f"Retrying '{job['kind']}' notification (attempt {job['attempts'] + 1})")
+                self._put(job)
+
+    def _run(self):
+        while True:
+            self._retry_due()
+            try:
+                job = self.queue.get(timeout=RETRY_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if job is None:
+                self.queue.task_done()
+                return
+
+            try:
+                self.handlers[job['kind']](job['payload'])
+                latency = time.time() - job['enqueued_at']
+                with self._lock:
+                    self.latencies.append(latency)
+                print(f"✓ Delivered '{job['kind']}' notification {latency:.1f}s after enqueue")
+            except PartialDeliveryError as e:
+                print(f"✗ Notification '{job['kind']}' partly failed: {e}")
+                self._fail(dict(job, payload=e.remaining))
+            except Exception as e:
+                print(f"✗ Notification '{job['kind']}' failed: {e}")
+                self._fail(job)
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        """
+        Delivery statistics so far.
+
+        Returns:
+            dict: {'delivered', 'failed', 'pending', 'avg_latency', 'max_latency'}
+        """
+        with self._lock:
+            latencies = list(self.latencies)
+            failed = len(self.failed)
+        return {
+            'delivered': len(latencies),
+            'failed': failed,
+            'pending': self.queue.qsize(),
+            'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max_latency': max(latencies) if latencies else 0.0,
+        }
+
+    def shutdown(self, timeout: Optional[float] = None) -> int:
+        """
+        Stop the worker, waiting up to timeout seconds for the queue to drain.
+
+        Whatever is still queued, waiting for a retry, or was spilled while
+        the queue was full is written to the spill file for the next run.
+
+        Args:
+            timeout: Seconds to wait for pending deliveries (None = wait indefinitely)
+
+        Returns:
+            int: Number of jobs left undelivered (spilled to disk)
+        """
+        if self._worker is not None:
+            self._put_stop()
+            self._worker.join(timeout)
+
+        leftovers = []
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                leftovers.append(job)
+
+        with self._lock:
+            undelivered = self.failed + self.spilled + leftovers
+            self.failed, self.spilled = [], []
+
+        if undelivered:
+            try:
+                atomic_write_json(self.spill_file, undelivered, backup=False)
+                print(f"Saved {len(undelivered)} undelivered notification(s) to {self.spill_file}")
+            except Exception as e:
+                print(f"Warning: Could not save undelivered notifications: {e}")
+
+        stats = self.stats()
+        if stats['delivered']:
+            print(f"Notifications: {stats['delivered']} delivered, "
+                  f"latency avg {stats['avg_latency']:.1f}s / max {stats['max_latency']:.1f}s")
+
+        return len(undelivered)
+
+    def _put_stop(self):
+        # The stop marker must not be dropped even if the queue is full
+        while self._worker.is_alive():
+            try:
+                self.queue.put(None, timeout=0.1)
+                return
+            except queue.Full:
+                continue
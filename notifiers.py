@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Notifier Backends Module
+Delivers notifications over email, webhooks and local files, fanned out concurrently
+"""
+
+import copy
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from email_utils import RateLimiter, RateLimitExceeded, get_smtp_sender, is_permanent_recipient_error
+from http_client import HttpClient
+from message_templates import TEMPLATES, build_message
+from subscriptions import SubscriptionRegistry
+
+JST = timezone(timedelta(hours=9))
+
+WEBHOOK_HEADERS = {
+    'User-Agent': 'popmart-stock-checker',
+    'Content-Type': 'application/json',
+}
+
+
+def keyword_matches(products: List[dict]) -> List[dict]:
+    """
+    Products matching their collection's KEYWORD.
+
+    Products outside it are only scanned for subscribers (they carry
+    'matches_keyword': False) and go to nobody else.
+    """
+    return [product for product in products if product.get('matches_keyword', True)]
+
+
+class RecipientsFailed(Exception):
+    """
+    A notifier delivered to some recipients but not to others.
+
+    Attributes:
+        recipients: Addresses still owed the notification
+    """
+
+    def __init__(self, message: str, recipients: List[str]):
+        super().__init__(message)
+        self.recipients = recipients
+
+
+class DeliveryError(Exception):
+    """
+    One or more notifiers failed.
+
+    Attributes:
+        failed: Names of the notifiers that failed
+        recipients: {name: addresses still owed} for notifiers that failed only
+            for some recipients (a retry sends to those addresses only)
+    """
+
+    def __init__(self, failed: List[str], errors: Dict[str, Exception]):
+        super().__init__('; '.join(f"{name}: {errors[name]}" for name in failed))
+        self.failed = failed
+        self.recipients = {
+            name: errors[name].recipients for name in failed if isinstance(errors[name], RecipientsFailed)
+        }
+
+
+class Notifier:
+    """
+    Base class for notification backends.
+
+    Subclasses implement notify(); it must raise on failure so the
+    notification can be retried.
+    """
+
+    name = 'notifier'
+
+    def notify(self, kind: str, products: List[dict], recipients: Optional[List[str]] = None):
+        """
+        Deliver one notification.
+
+        Args:
+            kind: Notification kind ('in_stock' or 'upcoming')
+            products: Product.summary() dicts
+            recipients: Only deliver to these recipients (retry after RecipientsFailed;
+                ignored by notifiers without recipients)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the notifier"""
+
+
+class SMTPNotifier(Notifier):
+    """
+    Sends one email per recipient over the pooled SMTP session.
+
+    The configured recipients receive every product matching the collection
+    KEYWORD. With a subscription registry, each subscriber receives one
+    digest of just the products matching their subscriptions; an address
+    that is both gets the union in one email.
+
+    With a rate limiter, each recipient is limited separately: recipients
+    under their limit are sent to at once, a recipient over it is sent to
+    after waiting (up to max_wait seconds), and a recipient that would need
+    a longer wait is deferred so only that address is retried later.
+    """
+
+    name = 'email'
+
+    def __init__(
+        self,
+        server: str,
+        port: int,
+        username: str,
+        password: str,
+        recipient: str,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_wait: float = 60.0,
+        subscriptions: Optional[SubscriptionRegistry] = None
+    ):
+        """
+        Args:
+            server: SMTP server address
+            port: SMTP server port
+            username: SMTP username (also the From address)
+            password: SMTP password
+            recipient: Recipient email address (comma-separated for several, may be empty
+                with subscriptions)
+            rate_limiter: Per-recipient send rate limit (default: unlimited)
+            max_wait: Longest wait for the rate limit in seconds (default: 60)
+            subscriptions: SubscriptionRegistry routing digests to subscribers (optional)
+        """
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.recipient = recipient
+        self.rate_limiter = rate_limiter
+        self.max_wait = max_wait
+        self.subscriptions = subscriptions
+
+    def notify(self, kind: str, products: List[dict], recipients: Optional[List[str]] = None):
+        # The configured recipients get everything matching the collection keyword
+        watched = keyword_matches(products)
+        digests = {}
+        if watched:
+            for address in (a.strip() for a in (self.recipient or '').split(',')):
+                if address:
+                    digests[address] = watched
+
+        # Subscribers get a digest of their own matches
+        if self.subscriptions:
+            for address, digest in self.subscriptions.route(kind, products).items():
+                if address in digests:
+                    wanted = {id(p) for p in digests[address]} | {id(p) for p in digest}
+                    digest = [p for p in products if id(p) in wanted]
+                digests[address] = digest
+
+        messages = {}
+        shared = None
+        for address, digest in digests.items():
+            if digest is watched:
+                # Identical emails are built once and copied per recipient
+                if shared is None:
+                    shared = build_message(kind, watched)
+                    shared['From'] = self.username
+                message = copy.deepcopy(shared)
+            else:
+                message = build_message(kind, digest)
+                message['From'] = self.username
+            message['To'] = address
+            messages[address] = message
+
+        # A retry only goes to the recipients that did not get the notification
+        if recipients is not None:
+            messages = {address: messages[address] for address in recipients if address in messages}
+        addresses = list(messages)
+
+        if not messages:
+            print(f"No email recipient subscribed to this '{kind}' notification")
+            return
+
+        # Recipients under their rate limit go first; throttled ones wait or are deferred
+        waits = {address: 0.0 for address in addresses}
+        retry = {}
+        if self.rate_limiter:
+            for address in addresses:
+                try:
+                    waits[address] = self.rate_limiter.reserve(address, self.max_wait)
+                except RateLimitExceeded as e:
+                    print(f"Rate limit: deferring email to {address}")
+                    del waits[address]
+                    retry[address] = e
+        ready = [address for address, wait in waits.items() if wait == 0]
+        delayed = sorted((address for address, wait in waits.items() if wait > 0), key=waits.get)
+
+        failures = []
+        if waits:
+            print(f"Attempting to send email via {self.server}:{self.port}")
+            sender = get_smtp_sender(self.server, self.port, self.username, self.password)
+            failures = sender.send_many(messages[address] for address in ready)
+            if delayed:
+                wait = waits[delayed[-1]]
+                print(f"Rate limit: waiting {wait:.0f}s before emailing {len(delayed)} more recipient(s)")
+                time.sleep(wait)
+                failures += sender.send_many(messages[address] for address in delayed)
+
+        for message, error in failures:
+            if is_permanent_recipient_error(error):
+                # Resending cannot succeed; the other recipients are not held back by it
+                print(f"✗ Dropping email to {message['To']}: permanently refused ({error})")
+            else:
+                retry[message['To']] = error
+
+        sent = len(messages) - len(failures) - (len(addresses) - len(waits))
+        if sent:
+            print(f"Email notification sent ({len(products)} products, {sent}/{len(messages)} recipient(s))")
+        if retry:
+            raise RecipientsFailed(f"{len(retry)} recipient(s) failed: {list(retry.values())[-1]}", list(retry))
+
+
+class WebhookNotifier(Notifier):
+    """
+    POSTs each notification as JSON to a webhook URL.
+
+    The body carries a ready-to-post 'text' (accepted by most chat
+    webhooks) alongside the structured product list.
+    """
+
+    name = 'webhook'
+
+    def __init__(self, url: str, client: Optional[HttpClient] = None, timeout: int = 10, name: str = 'webhook'):
+        """
+        Args:
+            url: Webhook URL
+            client: HttpClient to post with (default: a dedicated client)
+            timeout: Request timeout in seconds (default: 10)
+            name: Channel name, unique per NotifierGroup (default: 'webhook')
+        """
+        self.url = url
+        self.name = name
+        self.client = client or HttpClient(headers=WEBHOOK_HEADERS, timeout=timeout, max_retries=2)
+
+    def notify(self, kind: str, products: List[dict], recipients: Optional[List[str]] = None):
+        products = keyword_matches(products)
+        if not products:
+            return
+        body = {
+            'kind': kind,
+            'count': len(products),
+            'sent_at': datetime.now(JST).isoformat(timespec='seconds'),
+            'text': TEMPLATES[kind].summary(products),
+            'products': products,
+        }
+        response = self.client.post(self.url, data=json.dumps(body, ensure_ascii=False).encode('utf-8'))
+        response.raise_for_status()
+
+    def close(self):
+        self.client.close()
+
+
+class FileNotifier(Notifier):
+    """
+    Appends each notification as one JSON line to a file ('-' for stdout).
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str = '-'):
+        """
+        Args:
+            path: File to append to, or '-' for stdout (default: '-')
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, kind: str, products: List[dict], recipients: Optional[List[str]] = None):
+        products = keyword_matches(products)
+        if not products:
+            return
+        line = json.dumps({
+            'kind': kind,
+            'sent_at': datetime.now(JST).isoformat(timespec='seconds'),
+            'products': products,
+        }, ensure_ascii=False)
+
+        with self._lock:
+            if self.path == '-':
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+            else:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+
+class NotifierGroup:
+    """
+    Fans a notification out to several notifiers concurrently.
+
+    Each notifier runs on its own worker thread, so a slow channel (e.g.
+    SMTP) never delays a fast one (e.g. a webhook). Notifier names must be
+    unique; they identify the channels still owed a notification after a
+    partial failure.
+    """
+
+    def __init__(self, notifiers: Iterable[Notifier]):
+        """
+        Args:
+            notifiers: Notifier instances
+        """
+        self.notifiers = {n.name: n for n in notifiers}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.notifiers)), thread_name_prefix='notifier'
+        )
+
+    @property
+    def names(self) -> List[str]:
+        """Names of all notifiers in the group"""
+        return list(self.notifiers)
+
+    def _deliver(self, notifier: Notifier, kind: str, products: List[dict],
+                 recipients: Optional[List[str]]) -> float:
+        started = time.monotonic()
+        notifier.notify(kind, products, recipients=recipients)
+        return time.monotonic() - started
+
+    def notify(self, kind: str, products: List[dict], channels: Optional[Iterable[str]] = None,
+               recipients: Optional[Dict[str, List[str]]] = None):
+        """
+        Deliver a notification to every (or the given) notifier in parallel.
+
+        Args:
+            kind: Notification kind ('in_stock' or 'upcoming')
+            products: Product.summary() dicts
+            channels: Only deliver to notifiers with these names (default: all)
+            recipients: {name: addresses} restricting a notifier to the recipients
+                it still owes (from DeliveryError.recipients; default: all recipients)
+
+        Raises:
+            DeliveryError: If any notifier failed (the others still delivered)
+        """
+        names = self.names if channels is None else [n for n in channels if n in self.notifiers]
+        recipients = recipients or {}
+        futures = {
+            name: self._executor.submit(self._deliver, self.notifiers[name], kind, products, recipients.get(name))
+            for name in names
+        }
+
+        errors = {}
+        for name, future in futures.items():
+            try:
+                elapsed = future.result()
+                print(f"✓ {name}: '{kind}' delivered in {elapsed:.1f}s")
+            except Exception as e:
+                print(f"✗ {name}: '{kind}' failed: {e}")
+                errors[name] = e
+
+        if errors:
+            raise DeliveryError([n for n in names if n in errors], errors)
+
+    def close(self):
+        """Stop the worker threads and close every notifier"""
+        self._executor.shutdown(wait=True)
+        for notifier in self.notifiers.values():
+            notifier.close()
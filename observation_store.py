@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Observation Store Module
+Records per-SKU stock observations in an embedded SQLite time-series database
+"""
+
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+from models import Product
+
+DEFAULT_DB_FILE = 'observations.db'
+
+# Retention policy: raw observations for 7 days, then one per SKU per hour
+# until 180 days, then deleted
+DEFAULT_RAW_DAYS = 7
+DEFAULT_RETENTION_DAYS = 180
+DOWNSAMPLE_BUCKET = 3600
+
+# Retention runs at most this often (seconds)
+RETENTION_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    observed_at   INTEGER NOT NULL,
+    collection_id INTEGER,
+    product_id    TEXT    NOT NULL,
+    sku_id        TEXT    NOT NULL,
+    price         INTEGER,
+    stock         INTEGER NOT NULL,
+    up_time       INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_observations_product ON observations (product_id, observed_at);
+CREATE INDEX IF NOT EXISTS idx_observations_time ON observations (observed_at);
+
+CREATE TABLE IF NOT EXISTS products (
+    product_id    TEXT PRIMARY KEY,
+    collection_id INTEGER,
+    title         TEXT,
+    last_seen     INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ObservationStore:
+    """
+    SQLite store of per-SKU stock observations.
+
+    The database runs in WAL mode so readers (reports) never block the
+    checker. Each recorded scan is inserted as one batch in one transaction.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_FILE,
+        raw_days: int = DEFAULT_RAW_DAYS,
+        retention_days: int = DEFAULT_RETENTION_DAYS
+    ):
+        """
+        Args:
+            path: SQLite database file (created on demand)
+            raw_days: Days raw observations are kept before hourly downsampling (default: 7)
+            retention_days: Days any observation is kept (default: 180)
+        """
+        self.path = path
+        self.raw_days = raw_days
+        self.retention_days = retention_days
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def record_products(self, products: Iterable[Product], collection_id: Optional[int] = None,
+                        observed_at: Optional[int] = None) -> int:
+        """
+        Record one observation per SKU of every product, in a single transaction.
+
+        Args:
+            products: Products from the collection API
+            collection_id: Collection the products belong to
+            observed_at: UNIX timestamp of the observation (default: now)
+
+        Returns:
+            int: Number of observation rows inserted
+        """
+        observed_at = int(time.time()) if observed_at is None else int(observed_at)
+        rows = []
+        catalog = []
+
+        for product in products:
+            product_id = str(product.id)
+            catalog.append((product_id, collection_id, product.title, observed_at))
+            for index, sku in enumerate(product.skus):
+                rows.append((
+                    observed_at,
+                    collection_id,
+                    product_id,
+                    str(index if sku.id is None else sku.id),
+                    sku.price,
+                    sku.stock,
+                    product.up_time,
+                ))
+
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO observations (observed_at, collection_id, product_id, sku_id, price, stock, up_time) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.executemany(
+                'INSERT INTO products (product_id, collection_id, title, last_seen) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(product_id) DO UPDATE SET '
+                'collection_id = excluded.collection_id, title = excluded.title, last_seen = excluded.last_seen',
+                catalog
+            )
+
+        return len(rows)
+
+    def record_snapshot(self, snapshot) -> int:
+        """Record every product of a CollectionSnapshot at its fetch time"""
+        return self.record_products(snapshot.products, snapshot.collection_id, snapshot.timestamp)
+
+    def history(self, product_id: str, since: Optional[int] = None) -> List[tuple]:
+        """
+        Observations of one product, oldest first.
+
+        Args:
+            product_id: Product ID
+            since: Only observations at or after this UNIX timestamp
+
+        Returns:
+            list: (observed_at, sku_id, price, stock, up_time) tuples
+        """
+        return self.conn.execute(
+            'SELECT observed_at, sku_id, price, stock, up_time FROM observations '
+            'WHERE product_id = ? AND observed_at >= ? ORDER BY observed_at, sku_id',
+            (str(product_id), since or 0)
+        ).fetchall()
+
+    def apply_retention(self, now: Optional[int] = None, force: bool = False) -> int:
+        """
+        Downsample old observations to one per SKU per hour and drop expired ones.
+
+        Runs at most once per RETENTION_INTERVAL unless forced.
+
+        Args:
+            now: Current UNIX timestamp (default: now)
+            force: Run even if retention ran recently
+
+        Returns:
+            int: Number of rows deleted
+        """
+        now = int(time.time()) if now is None else int(now)
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_retention'").fetchone()
+        if not force and row and now - int(row[0]) < RETENTION_INTERVAL:
+            return 0
+
+        expire_before = now - self.retention_days * 86400
+        raw_before = now - self.raw_days * 86400
+
+        with self.conn:
+            deleted = self.conn.execute(
+                'DELETE FROM observations WHERE observed_at < ?', (expire_before,)
+            ).rowcount
+            # Keep the last observation per SKU per bucket outside the raw window
+            deleted += self.conn.execute(
+                'DELETE FROM observations WHERE observed_at < ? AND rowid NOT IN ('
+                '  SELECT MAX(rowid) FROM observations WHERE observed_at < ?'
+                '  GROUP BY product_id, sku_id, observed_at / ?'
+                ')',
+                (raw_before, raw_before, DOWNSAMPLE_BUCKET)
+            ).rowcount
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('last_retention', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(now),)
+            )
+
+        return deleted
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Page Cache Module
+Persists CDN page bodies with their validators for conditional GET requests
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+from state_store import atomic_write_json
+
+DEFAULT_CACHE_DIR = '.page_cache'
+
+# Bytes read per step when a cached body is streamed back from disk
+READ_CHUNK_SIZE = 16384
+
+
+def _parse_json(chunks: Iterable[str]):
+    """Default parser: the whole body as one JSON document"""
+    return json.loads(''.join(chunks))
+
+
+class PageCache:
+    """
+    On-disk cache of page bodies keyed by URL.
+
+    Each URL has a body file holding the raw page and a small metadata file
+    holding its ETag and Last-Modified validators. A downloaded body is
+    parsed as it streams in and written to disk chunk by chunk, and a 304
+    Not Modified streams the body back from disk, so at most one page is
+    held in memory at a time. Only the validators are kept in memory.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            cache_dir: Directory holding the files of each cached URL (created on demand)
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _meta_path(self, url: str) -> str:
+        return self._path(url)[:-len('.json')] + '.meta.json'
+
+    def _entry(self, url: str) -> Optional[dict]:
+        """Validators of a cached URL (the body is not kept in memory)"""
+        with self._lock:
+            if url in self._entries:
+                return self._entries[url]
+
+        try:
+            with open(self._meta_path(url), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            entry = {'etag': meta.get('etag'), 'last_modified': meta.get('last_modified')}
+        except Exception:
+            entry = None
+
+        with self._lock:
+            self._entries[url] = entry
+        return entry
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Build If-None-Match / If-Modified-Since headers for a URL.
+
+        Returns:
+            dict: Conditional request headers (empty if the URL is not cached)
+        """
+        entry = self._entry(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, url: str, parse: Callable[[Iterable[str]], object] = _parse_json) -> Optional[dict]:
+        """
+        Return the cached page for a URL after a 304 Not Modified.
+
+        Args:
+            url: Request URL
+            parse: Parser applied to the cached body as text chunks (default: json.loads)
+
+        Returns:
+            dict: Parsed page, or None if nothing usable is cached
+        """
+        if not self._entry(url):
+            return None
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                data = parse(iter(lambda: f.read(READ_CHUNK_SIZE), ''))
+        except Exception:
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def store(self, url: str, response, parse: Callable[[Iterable[str]], object] = _parse_json) -> dict:
+        """
+        Parse a 200 response while writing its body and validators to the cache.
+
+        Args:
+            url: Request URL
+            response: requests.Response with status 200 (ideally requested with stream=True)
+            parse: Parser applied to the body as text chunks (default: json.loads)
+
+        Returns:
+            dict: Parsed page
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        chunks = response.iter_content(READ_CHUNK_SIZE, decode_unicode=True)
+
+        with self._lock:
+            self._entries[url] = None
+            self.misses += 1
+
+        # Responses without validators can never be revalidated; skip the disk
+        if not (etag or last_modified):
+            return parse(chunks)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # The old validators must not outlive the body they describe
+            if os.path.exists(self._meta_path(url)):
+                os.remove(self._meta_path(url))
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        except OSError as e:
+            print(f"Warning: Could not save page cache: {e}")
+            return parse(chunks)
+
+        errors = []
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                teed = self._tee(chunks, f, errors)
+                data = parse(teed)
+                # Whatever follows the parsed value (e.g. a trailing newline) is kept too
+                for _ in teed:
+                    pass
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+
+        try:
+            if errors:
+                raise errors[0]
+            os.replace(tmp_path, self._path(url))
+            atomic_write_json(self._meta_path(url), {'url': url, 'etag': etag, 'last_modified': last_modified},
+                              backup=False)
+        except OSError as e:
+            self._discard(tmp_path)
+            print(f"Warning: Could not save page cache: {e}")
+            return data
+
+        with self._lock:
+            self._entries[url] = {'etag': etag, 'last_modified': last_modified}
+        return data
+
+    @staticmethod
+    def _tee(chunks: Iterable[str], f, errors: list) -> Iterator[str]:
+        # Write every chunk to the body file as the parser pulls it; a write
+        # error only disables caching, the page is still parsed
+        for chunk in chunks:
+            if not errors:
+                try:
+                    f.write(chunk)
+                except OSError as e:
+                    errors.append(e)
+            yield chunk
+
+    @staticmethod
+    def _discard(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
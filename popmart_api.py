@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+POP MART Collection API Module
+Fetches a collection from the POP MART CDN once and exposes it as a snapshot
+"""
+
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import requests
+
+from http_client import HttpClient, get_default_client
+from models import Product
+from page_cache import PageCache
+
+JST = timezone(timedelta(hours=9))
+
+# URL pattern: shop_productoncollection-{collection_id}-1-{page}-jp-ja.json
+COLLECTION_URL = "https://cdn-global.popmart.com/shop_productoncollection-{collection_id}-1-{page}-jp-ja.json"
+
+# Maximum number of pages requested in parallel once page 1 reports 'total'
+DEFAULT_CONCURRENCY = 4
+
+# Bytes read from the network per parsing step
+STREAM_CHUNK_SIZE = 16384
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """
+    Minimal pull parser over an iterable of text chunks.
+
+    Structural characters are consumed one at a time and complete values are
+    decoded with json.JSONDecoder.raw_decode, reading more chunks whenever the
+    buffer ends mid-value. Only the unconsumed tail of the input is buffered.
+    """
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _more(self) -> bool:
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = self._buf[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character (not consumed)"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                raise ValueError("unexpected end of JSON input")
+
+    def expect(self, char: str):
+        """Consume one structural character"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r}, found {found!r}")
+        self._pos += 1
+
+    def value(self):
+        """Decode and consume one complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue
+                raise
+            # A number ending exactly at the buffer end may continue in the next chunk
+            if end == len(self._buf) and not self._eof and self._more():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_page(chunks: Iterable[str]) -> Iterator[tuple]:
+    """
+    Stream a collection page, yielding its fields as they are parsed.
+
+    Args:
+        chunks: Page JSON as an iterable of text chunks
+
+    Yields:
+        tuple: ('product', Product) for each entry of 'productData', and
+        (key, value) for every other top-level field
+    """
+    stream = _JsonStream(chunks)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+
+    while True:
+        key = stream.value()
+        stream.expect(':')
+
+        if key == 'productData' and stream.peek() == '[':
+            stream.expect('[')
+            if stream.peek() != ']':
+                while True:
+                    yield 'product', Product.from_api(stream.value())
+                    if stream.peek() != ',':
+                        break
+                    stream.expect(',')
+            stream.expect(']')
+        else:
+            yield key, stream.value()
+
+        if stream.peek() != ',':
+            break
+        stream.expect(',')
+    stream.expect('}')
+
+
+def parse_page(chunks: Iterable[str]) -> dict:
+    """
+    Parse a collection page into Product objects.
+
+    Args:
+        chunks: Page JSON as an iterable of text chunks (a str also works)
+
+    Returns:
+        dict: Page JSON with 'productData' holding Product objects; other
+        top-level fields are kept as-is
+    """
+    if isinstance(chunks, str):
+        text = chunks
+        chunks = (text[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(text), STREAM_CHUNK_SIZE))
+
+    page = {'productData': []}
+    for key, value in iter_page(chunks):
+        if key == 'product':
+            page['productData'].append(value)
+        else:
+            page[key] = value
+    return page
+
+
+class CollectionSnapshot:
+    """
+    Point-in-time view of every product in a collection.
+
+    Attributes:
+        collection_id: Collection ID the snapshot was fetched for
+        name: Collection name reported by page 1
+        total: Total product count reported by page 1
+        products: Product objects from every page, in page order
+        pages: Number of pages fetched
+        fetched_at: JST datetime when the fetch started
+    """
+
+    def __init__(self, collection_id, name, total, products, pages, fetched_at):
+        self.collection_id = collection_id
+        self.name = name
+        self.total = total
+        self.products = products
+        self.pages = pages
+        self.fetched_at = fetched_at
+
+    @property
+    def timestamp(self) -> int:
+        """UNIX timestamp of the fetch, used as "now" by every detector"""
+        return int(self.fetched_at.timestamp())
+
+    def __len__(self):
+        return len(self.products)
+
+    def __repr__(self):
+        return (f"CollectionSnapshot(collection_id={self.collection_id!r}, name={self.name!r}, "
+                f"products={len(self.products)}/{self.total}, pages={self.pages})")
+
+
+def collection_page_url(collection_id: int, page: int) -> str:
+    """Build the CDN URL for one page of a collection"""
+    return COLLECTION_URL.format(collection_id=collection_id, page=page)
+
+
+def fetch_page(
+    collection_id: int,
+    page: int,
+    timeout: int = 30,
+    client: Optional[HttpClient] = None,
+    cache: Optional[PageCache] = None
+) -> Optional[dict]:
+    """
+    Fetch one page of a collection.
+
+    With a cache, the request is made conditional on the cached ETag /
+    Last-Modified and a 304 Not Modified is answered from the cache.
+
+    Args:
+        collection_id: Collection ID
+        page: Page number (1-based)
+        timeout: Request timeout in seconds (default: 30)
+        client: HttpClient to use (default: the shared client)
+        cache: PageCache for conditional requests (default: no caching)
+
+    Returns:
+        dict: Page JSON with Product objects (see parse_page), or None if
+        the page does not exist (404)
+
+    Raises:
+        requests.exceptions.HTTPError: On any non-404 HTTP error
+    """
+    client = client or get_default_client()
+    url = collection_page_url(collection_id, page)
+    headers = cache.conditional_headers(url) if cache else None
+
+    try:
+        response = client.get(url, timeout=timeout, headers=headers, stream=True)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        # 404 means no more pages
+        if e.response.status_code == 404:
+            return None
+        raise
+
+    if cache:
+        if response.status_code == 304:
+            response.close()
+            data = cache.load(url, parse=parse_page)
+            if data is not None:
+                return data
+            # Cache entry vanished between the request and now; refetch in full
+            response = client.get(url, timeout=timeout, stream=True)
+            response.raise_for_status()
+        # The body is parsed as it streams in and written to the cache at the same time
+        try:
+            return cache.store(url, response, parse=parse_page)
+        finally:
+            response.close()
+
+    # Parse while downloading: only the current chunk and parsed products are held
+    if response.encoding is None:
+        response.encoding = 'utf-8'
+    try:
+        return parse_page(response.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True))
+    finally:
+        response.close()
+
+
+def fetch_collection(
+    collection_id: int = 223,
+    timeout: int = 30,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_page: Optional[Callable[[int, dict, int], None]] = None,
+    client: Optional[HttpClient] = None,
+    cache: Optional[PageCache] = None
+) -> CollectionSnapshot:
+    """
+    Fetch every page of a collection in a single pass.
+
+    Page 1 is always fetched first. When it reports 'total', the page count is
+    computed from it and the remaining pages are requested concurrently, then
+    reassembled in page order. With concurrency <= 1, or when 'total' is
+    missing, pages are walked one by one until a 404 or an empty page.
+
+    Args:
+        collection_id: Collection ID to fetch (default: 223 for THE MONSTERS)
+        timeout: Per-request timeout in seconds (default: 30)
+        concurrency: Maximum pages requested in parallel (default: 4)
+        on_page: Optional callback(page, page_json, fetched_so_far), called in page order
+        client: HttpClient to use (default: the shared client)
+        cache: PageCache for conditional requests (default: no caching)
+
+    Returns:
+        CollectionSnapshot: All products of the collection plus total/name metadata
+
+    Raises:
+        requests.exceptions.HTTPError: On any non-404 HTTP error left after retries
+    """
+    client = client or get_default_client()
+    fetched_at = datetime.now(JST)
+    all_products: List[Product] = []
+    total_products: Optional[int] = None
+    collection_name: Optional[str] = None
+
+    def accept(page, data):
+        """Append one page; return False when pagination should stop"""
+        products = data.get('productData', []) if data else []
+        if not products:
+            return False
+
+        all_products.extend(products)
+        if on_page:
+            on_page(page, data, len(all_products))
+
+        # If we've fetched all products, stop
+        return not (total_products and len(all_products) >= total_products)
+
+    first = fetch_page(collection_id, 1, timeout, client, cache)
+    if first is not None:
+        total_products = first.get('total', 0)
+        collection_name = first.get('name', 'Unknown')
+
+    page = 1
+    keep_going = accept(1, first)
+
+    if keep_going and concurrency > 1 and total_products:
+        page_size = len(first['productData'])
+        last_page = math.ceil(total_products / page_size)
+        remaining = range(2, last_page + 1)
+
+        if remaining:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(remaining))) as executor:
+                pages = executor.map(lambda p: fetch_page(collection_id, p, timeout, client, cache), remaining)
+                for page, data in zip(remaining, pages):
+                    keep_going = accept(page, data)
+                    if not keep_going:
+                        break
+
+    # Sequential walk: the whole fetch when not concurrent, otherwise only
+    # pages past the computed page count (if the last page came back short)
+    while keep_going:
+        page += 1
+        keep_going = accept(page, fetch_page(collection_id, page, timeout, client, cache))
+
+    return CollectionSnapshot(
+        collection_id=collection_id,
+        name=collection_name,
+        total=total_products,
+        products=all_products,
+        pages=page,
+        fetched_at=fetched_at,
+    )
+
+
+def fetch_collections(
+    collection_ids: List[int],
+    timeout: int = 30,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    client: Optional[HttpClient] = None,
+    cache: Optional[PageCache] = None
+) -> Dict[int, Union[CollectionSnapshot, Exception]]:
+    """
+    Fetch several collections concurrently.
+
+    A failure in one collection does not abort the others; its exception is
+    returned in place of the snapshot.
+
+    Args:
+        collection_ids: Collection IDs to fetch
+        timeout: Per-request timeout in seconds (default: 30)
+        concurrency: Maximum collections, and pages per collection, fetched in parallel
+        client: HttpClient to use (default: the shared client)
+        cache: PageCache for conditional requests (default: no caching)
+
+    Returns:
+        dict: {collection_id: CollectionSnapshot or Exception}
+    """
+    def fetch_one(collection_id):
+        try:
+            return fetch_collection(collection_id, timeout=timeout, concurrency=concurrency,
+                                    client=client, cache=cache)
+        except Exception as e:
+            return e
+
+    if not collection_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(collection_ids)))) as executor:
+        return dict(zip(collection_ids, executor.map(fetch_one, collection_ids)))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Polling Scheduler Module
+Decides how long the daemon sleeps between checks based on upcoming upTimes
+"""
+
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+DEFAULT_BASE_INTERVAL = 300
+DEFAULT_MIN_INTERVAL = 15
+DEFAULT_APPROACH_WINDOW = 1800
+DEFAULT_DROP_WINDOW = 600
+DEFAULT_BACKOFF_FACTOR = 2.0
+DEFAULT_BURST_LEAD = 30
+DEFAULT_BURST_TAIL = 300
+DEFAULT_BURST_INTERVAL = 5
+
+
+class AdaptiveScheduler:
+    """
+    Adaptive polling interval.
+
+    Far from any known upTime the scheduler polls every base_interval. Inside
+    approach_window before an upTime the interval shrinks linearly towards
+    min_interval, and it never sleeps past the upTime itself. For drop_window
+    after an upTime it polls at min_interval, then backs off geometrically
+    (backoff_factor per check) until it is back at base_interval.
+    """
+
+    def __init__(
+        self,
+        base_interval: float = DEFAULT_BASE_INTERVAL,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        approach_window: float = DEFAULT_APPROACH_WINDOW,
+        drop_window: float = DEFAULT_DROP_WINDOW,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR
+    ):
+        """
+        Args:
+            base_interval: Idle polling interval in seconds (default: 300)
+            min_interval: Fastest polling interval in seconds (default: 15)
+            approach_window: Seconds before an upTime where polling tightens (default: 1800)
+            drop_window: Seconds after an upTime polled at min_interval (default: 600)
+            backoff_factor: Interval growth per check while backing off (default: 2.0)
+        """
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.approach_window = approach_window
+        self.drop_window = drop_window
+        self.backoff_factor = backoff_factor
+        self.uptimes = set()
+        self.last_interval = base_interval
+
+    def track(self, uptimes: Iterable[int]):
+        """Remember upTimes (epoch seconds) of tracked upcoming sales"""
+        self.uptimes.update(int(t) for t in uptimes)
+
+    def next_interval(self, now: Optional[float] = None) -> float:
+        """
+        Compute the delay until the next check.
+
+        Args:
+            now: Current epoch time (default: time.time())
+
+        Returns:
+            float: Seconds to sleep before the next check
+        """
+        now = time.time() if now is None else now
+
+        # Forget drops whose post-release window is over
+        self.uptimes = {t for t in self.uptimes if t + self.drop_window > now}
+
+        upcoming = [t - now for t in self.uptimes if t > now]
+        in_drop = any(t <= now for t in self.uptimes)
+
+        if in_drop:
+            interval = self.min_interval
+        elif upcoming and min(upcoming) <= self.approach_window:
+            # Linear ramp from base_interval at the window edge to min_interval at the drop
+            remaining = min(upcoming)
+            ratio = remaining / self.approach_window
+            interval = self.min_interval + (self.base_interval - self.min_interval) * ratio
+            # Wake up exactly at the drop rather than sleeping past it
+            interval = min(interval, remaining)
+        else:
+            # Back off from a previous burst instead of jumping straight to idle
+            interval = min(self.base_interval, self.last_interval * self.backoff_factor)
+            if upcoming:
+                interval = min(interval, min(upcoming) - self.approach_window)
+            interval = max(self.min_interval, interval)
+
+        self.last_interval = interval
+        return interval
+
+
+class DropTimers:
+    """
+    One timer per scheduled drop, opening a burst window around its upTime.
+
+    A window runs from burst_lead seconds before a product's upTime until
+    burst_tail seconds after it. While any window is open the daemon checks
+    only the collections owning those drops, every burst_interval seconds.
+    """
+
+    def __init__(
+        self,
+        burst_lead: float = DEFAULT_BURST_LEAD,
+        burst_tail: float = DEFAULT_BURST_TAIL,
+        burst_interval: float = DEFAULT_BURST_INTERVAL
+    ):
+        """
+        Args:
+            burst_lead: Seconds before an upTime the burst starts (default: 30)
+            burst_tail: Seconds after an upTime the burst ends (default: 300)
+            burst_interval: Seconds between checks during a burst (default: 5)
+        """
+        self.burst_lead = burst_lead
+        self.burst_tail = burst_tail
+        self.burst_interval = burst_interval
+        self.timers: Dict[Tuple[int, str], int] = {}
+
+    def register(self, collection_id: int, product_id: str, uptime: int):
+        """Set (or move) the timer for a product's upTime"""
+        self.timers[(collection_id, product_id)] = int(uptime)
+
+    def _prune(self, now: float):
+        self.timers = {key: t for key, t in self.timers.items() if t + self.burst_tail > now}
+
+    def active_collections(self, now: Optional[float] = None) -> Set[int]:
+        """
+        Collections with a burst window open at the given time.
+
+        Args:
+            now: Current epoch time (default: time.time())
+
+        Returns:
+            set: Collection IDs to check at burst_interval
+        """
+        now = time.time() if now is None else now
+        self._prune(now)
+        return {
+            collection_id for (collection_id, _), t in self.timers.items()
+            if t - self.burst_lead <= now
+        }
+
+    def seconds_until_next_burst(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        Delay until the next burst window opens.
+
+        Returns:
+            float: Seconds until the earliest pending window, or None if no timers
+        """
+        now = time.time() if now is None else now
+        self._prune(now)
+        starts = [t - self.burst_lead - now for t in self.timers.values()]
+        return max(0.0, min(starts)) if starts else None
+
+    def drops_for(self, collection_id: int) -> Iterable[int]:
+        """Distinct upTimes registered for a collection, earliest first"""
+        return sorted({t for (cid, _), t in self.timers.items() if cid == collection_id})
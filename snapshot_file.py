@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Snapshot File Module
+Compact, memory-mapped binary alternative to all_products.json with random access by product
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from typing import Iterator, List, Optional
+
+from keyword_matcher import compile_keyword
+from models import PRODUCT_URL
+
+MAGIC = b'PMSNAP\x00\x00'
+FORMAT_VERSION = 1
+
+DEFAULT_SNAPSHOT_FILE = 'all_products.snap'
+
+# Header: magic, format version, flags, product count, metadata length, dictionary length
+HEADER = struct.Struct('<8sHHIII')
+FLAG_COMPRESSED = 1
+
+# Product flags column
+NEW = 1
+HOT = 2
+STRING_ID = 4  # the ID was a numeric string in the source data
+
+# Records sampled (evenly across the snapshot) for the shared compression dictionary
+DICTIONARY_SAMPLE = 256
+DICTIONARY_SIZE = 16 * 1024
+
+# Layout after the header (all integers little-endian, columns 8-byte aligned):
+#   ids             int64  x count    product IDs
+#   record_offsets  uint64 x count+1  record i spans [offsets[i], offsets[i+1]) of the records area
+#   stock           int32  x count    total stock
+#   order           uint32 x count    positions sorted by product ID (for lookups)
+#   flags           uint8  x count    NEW | HOT | STRING_ID
+#   (padding to 8 bytes)
+#   metadata        JSON   timestamp, collection_id, total, in_stock_count, out_of_stock_count
+#   dictionary      zlib preset dictionary shared by every record (compressed snapshots only)
+#   records         one [title, [[price, currency, stock], ...]] JSON per product,
+#                   raw-deflated with the dictionary when compressed
+#
+# Filtering on stock/new/hot reads only the fixed-width columns, and fetching a
+# product decodes only its own record, so a reader never parses the whole file.
+
+
+def _encode_record(entry: dict) -> bytes:
+    skus = [[s.get('price', 0), s.get('currency', 'JPY'), s.get('stock', 0)] for s in entry.get('sku_details', [])]
+    return json.dumps([entry.get('title', ''), skus], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _build_dictionary(records: List[bytes]) -> bytes:
+    # zlib favours the end of the dictionary, so the sample is capped from the front
+    step = max(1, len(records) // DICTIONARY_SAMPLE)
+    return b''.join(records[::step])[-DICTIONARY_SIZE:]
+
+
+def write_snapshot(path: str, data: dict, compress: bool = True) -> int:
+    """
+    Write all_products.json data as a binary snapshot.
+
+    The file is written to a temporary file and renamed, so readers never
+    see a partial snapshot.
+
+    Args:
+        path: Snapshot file
+        data: all_products.json content (metadata plus 'products')
+        compress: Deflate each record with a dictionary shared across the snapshot
+
+    Returns:
+        int: Size of the written file in bytes
+
+    Raises:
+        ValueError: If a product ID is not an integer (or a string of one)
+    """
+    entries = data.get('products', [])
+    count = len(entries)
+    try:
+        ids = [int(entry.get('id')) for entry in entries]
+    except (TypeError, ValueError):
+        raise ValueError('snapshot product IDs must be integers')
+
+    records = [_encode_record(entry) for entry in entries]
+    dictionary = _build_dictionary(records) if compress and records else b''
+    if compress:
+        # Copying a primed compressor is much cheaper than loading the dictionary per record
+        primed = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=dictionary)
+        compressed = []
+        for record in records:
+            compressor = primed.copy()
+            compressed.append(compressor.compress(record) + compressor.flush())
+        records = compressed
+
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    meta = json.dumps({key: value for key, value in data.items() if key != 'products'},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    flags = FLAG_COMPRESSED if compress else 0
+
+    columns = b''.join((
+        struct.pack(f'<{count}q', *ids),
+        struct.pack(f'<{count + 1}Q', *offsets),
+        struct.pack(f'<{count}i', *(int(entry.get('total_stock', 0)) for entry in entries)),
+        struct.pack(f'<{count}I', *sorted(range(count), key=ids.__getitem__)),
+        bytes((NEW if entry.get('is_new') else 0) | (HOT if entry.get('is_hot') else 0)
+              | (STRING_ID if isinstance(entry.get('id'), str) else 0) for entry in entries),
+    ))
+    padding = b'\x00' * (-(HEADER.size + len(columns)) % 8)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, count, len(meta), len(dictionary)))
+        f.write(columns)
+        f.write(padding)
+        f.write(meta)
+        f.write(dictionary)
+        for record in records:
+            f.write(record)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def is_snapshot(path: str) -> bool:
+    """True if the file starts with the snapshot magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class SnapshotReader:
+    """
+    Memory-mapped reader for a snapshot written by write_snapshot().
+
+    Opening a snapshot only validates the header; columns are read in
+    place from the mapping and a product's record is decoded when that
+    product is requested. Products are returned as all_products.json
+    'products' entries.
+
+    Usable as a context manager.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Snapshot file
+
+        Raises:
+            ValueError: If the file is not a snapshot or is truncated
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a snapshot file")
+        magic, version, flags, count, meta_len, dict_len = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} snapshot file")
+
+        columns = HEADER.size + 25 * count + 8
+        if columns + (-columns % 8) + meta_len + dict_len > len(self._map):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+        self.count = count
+        self.compressed = bool(flags & FLAG_COMPRESSED)
+        view = self._view = memoryview(self._map)
+        position = HEADER.size
+        self._ids = self._column(view, position, 'q', count)
+        position += 8 * count
+        self._offsets = self._column(view, position, 'Q', count + 1)
+        position += 8 * (count + 1)
+        self._stock = self._column(view, position, 'i', count)
+        position += 4 * count
+        self._order = self._column(view, position, 'I', count)
+        position += 4 * count
+        self._flags = view[position:position + count]
+        position += count + (-position - count) % 8
+
+        self.meta = json.loads(bytes(view[position:position + meta_len]).decode('utf-8'))
+        position += meta_len
+        self._dictionary = bytes(view[position:position + dict_len])
+        self._records = position + dict_len
+
+        if self._records + self._offsets[count] > len(self._map):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    @staticmethod
+    def _column(view: memoryview, position: int, code: str, length: int):
+        size = struct.calcsize(code) * length
+        if sys.byteorder == 'little':
+            return view[position:position + size].cast(code)
+        return struct.unpack_from(f'<{length}{code}', view, position)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the mapping"""
+        for name in ('_ids', '_offsets', '_stock', '_order', '_flags', '_view'):
+            column = getattr(self, name, None)
+            if isinstance(column, memoryview):
+                column.release()
+        if isinstance(self._map, mmap.mmap) and not self._map.closed:
+            self._map.close()
+
+    def _record(self, position: int) -> list:
+        start, end = self._offsets[position], self._offsets[position + 1]
+        raw = self._map[self._records + start:self._records + end]
+        if self.compressed:
+            decompressor = zlib.decompressobj(-15, zdict=self._dictionary)
+            raw = decompressor.decompress(raw) + decompressor.flush()
+        return json.loads(raw.decode('utf-8'))
+
+    def entry(self, position: int) -> dict:
+        """
+        Product at a position of the snapshot, in file order
+
+        Returns:
+            dict: all_products.json 'products' entry
+        """
+        title, skus = self._record(position)
+        product_id = self._ids[position]
+        flags = self._flags[position]
+        if flags & STRING_ID:
+            product_id = str(product_id)
+        return {
+            'id': product_id,
+            'title': title,
+            'is_new': bool(flags & NEW),
+            'is_hot': bool(flags & HOT),
+            'total_stock': self._stock[position],
+            'sku_details': [{'price': price, 'currency': currency, 'stock': stock} for price, currency, stock in skus],
+            'url': PRODUCT_URL.format(product_id=product_id),
+        }
+
+    def position(self, product_id) -> Optional[int]:
+        """Position of a product ID (binary search over the sorted order column), or None"""
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+        ids, order = self._ids, self._order
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ids[order[middle]] < product_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and ids[order[low]] == product_id:
+            return order[low]
+        return None
+
+    def get(self, product_id) -> Optional[dict]:
+        """The product with this ID (only its record is decoded), or None"""
+        position = self.position(product_id)
+        return None if position is None else self.entry(position)
+
+    def select(self, in_stock: Optional[bool] = None, new: Optional[bool] = None, hot: Optional[bool] = None,
+               keyword: Optional[str] = None, ids=None) -> Iterator[dict]:
+        """
+        Products matching every given condition, in file order.
+
+        Stock, badge and ID conditions are checked on the columns; only the
+        products passing them are decoded (and then matched on keyword).
+
+        Args:
+            in_stock: True = in stock only, False = sold out only
+            new: Filter on the 'new' badge
+            hot: Filter on the 'hot' badge
+            keyword: Keyword query on titles (see keyword_matcher)
+            ids: Product IDs to include
+
+        Yields:
+            dict: all_products.json 'products' entries
+        """
+        if ids is not None:
+            positions = sorted(p for p in map(self.position, ids) if p is not None)
+        else:
+            positions = range(self.count)
+
+        stock, flags = self._stock, self._flags
+        if in_stock is not None:
+            positions = [p for p in positions if (stock[p] > 0) == in_stock]
+        if new is not None:
+            positions = [p for p in positions if bool(flags[p] & NEW) == new]
+        if hot is not None:
+            positions = [p for p in positions if bool(flags[p] & HOT) == hot]
+
+        matcher = compile_keyword(keyword)
+        for position in positions:
+            entry = self.entry(position)
+            if not matcher or matcher.matches(entry['title'], entry['id']):
+                yield entry
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self.entry(position) for position in range(self.count))
+
+    def to_report(self) -> dict:
+        """Full all_products.json content"""
+        return dict(self.meta, products=list(self))
+
+
+def load_report(path: str) -> dict:
+    """
+    Read all_products.json data from a JSON file or a snapshot file
+
+    Raises:
+        OSError, ValueError: If the file cannot be read or parsed
+    """
+    if is_snapshot(path):
+        with SnapshotReader(path) as reader:
+            return reader.to_report()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """Convert all_products.json to a snapshot, or query a snapshot"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='POP MART snapshot file tool')
+    parser.add_argument('snapshot', nargs='?', default=DEFAULT_SNAPSHOT_FILE, help='Snapshot file')
+    parser.add_argument('--from-json', type=str, help='Convert this all_products.json into the snapshot')
+    parser.add_argument('--no-compress', action='store_true', help='Store records uncompressed')
+    parser.add_argument('--id', action='append', help='Print the product with this ID (repeatable)')
+    parser.add_argument('--filter', type=str, help='Print products whose title matches this keyword query')
+    parser.add_argument('--in-stock', action='store_true', help='Print in-stock products only')
+
+    args = parser.parse_args()
+
+    if args.from_json:
+        with open(args.from_json, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        size = write_snapshot(args.snapshot, data, compress=not args.no_compress)
+        print(f"Wrote {len(data.get('products', []))} products to {args.snapshot} "
+              f"({size:,} bytes, JSON: {os.path.getsize(args.from_json):,} bytes)")
+        return
+
+    try:
+        reader = SnapshotReader(args.snapshot)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    with reader:
+        if not (args.id or args.filter or args.in_stock):
+            print(json.dumps(dict(reader.meta, products=len(reader)), ensure_ascii=False, indent=2))
+            return
+        for entry in reader.select(in_stock=True if args.in_stock else None, keyword=args.filter, ids=args.id):
+            print(json.dumps(entry, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+State Store Module
+Crash-safe JSON persistence for history files
+"""
+
+import json
+import os
+import tempfile
+from typing import Callable, Optional
+
+BACKUP_SUFFIX = '.bak'
+
+
+class StateError(Exception):
+    """A state file exists but neither it nor its backup can be loaded"""
+
+
+def _fsync_dir(directory: str):
+    """Flush a directory entry so a rename survives a crash (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data, backup: bool = True):
+    """
+    Write JSON so that readers only ever see the old or the new content.
+
+    The data is written to a temporary file in the same directory, fsynced and
+    renamed over the target. With backup, the previous generation is kept as
+    path + '.bak'.
+
+    Args:
+        path: Target file
+        data: JSON-serializable data
+        backup: Keep the previous file as path + '.bak' (default: True)
+
+    Raises:
+        OSError: If the file cannot be written (the previous file is left intact)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # A crash between these renames leaves only the backup; load_json falls back to it
+        if backup and os.path.exists(path):
+            os.replace(path, path + BACKUP_SUFFIX)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    _fsync_dir(directory)
+
+
+def load_json(path: str, validate: Optional[Callable[[object], None]] = None):
+    """
+    Load a JSON state file, falling back to its backup.
+
+    Args:
+        path: State file written by atomic_write_json
+        validate: Optional callable raising ValueError if the data is malformed
+
+    Returns:
+        The loaded data, or None if neither the file nor its backup exists
+
+    Raises:
+        StateError: If a file exists but neither it nor the backup is valid
+    """
+    found = False
+
+    for candidate in (path, path + BACKUP_SUFFIX):
+        if not os.path.exists(candidate):
+            continue
+        found = True
+
+        try:
+            with open(candidate, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if validate:
+                validate(data)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load {candidate}: {e}")
+            continue
+
+        if candidate != path:
+            print(f"Warning: Recovered state from backup {candidate}")
+        return data
+
+    if found:
+        raise StateError(f"{path} and its backup are unreadable; fix or delete them to reset history")
+    return None
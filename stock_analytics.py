@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Stock Analytics Module
+Sell-out speed, restock cadence and restock hours computed from the observation store
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from observation_store import ObservationStore
+
+# JST offset used for hour-of-day statistics
+JST_OFFSET = 9 * 3600
+
+# Splits each product's stock history into alternating in-stock / sold-out runs.
+# Everything is aggregated inside SQLite, so months of observations never reach
+# Python row by row. LAG compares each observation with the previous one of the
+# same product to find changes of availability; LEAD then only runs over the
+# (few) changes to find where each run ends.
+RUNS_QUERY = """
+CREATE TEMP TABLE analytics_runs AS
+WITH series AS (
+    SELECT product_id, observed_at, SUM(stock) > 0 AS available
+    FROM observations
+    WHERE observed_at >= ?
+    GROUP BY product_id, observed_at
+),
+marked AS (
+    SELECT product_id, observed_at, available,
+           LAG(available) OVER (PARTITION BY product_id ORDER BY observed_at) AS previous
+    FROM series
+),
+changes AS (
+    SELECT product_id, observed_at AS started_at, available, previous IS NULL AS initial
+    FROM marked
+    WHERE previous IS NULL OR previous != available
+)
+SELECT product_id, started_at, available, initial,
+       LEAD(started_at) OVER (PARTITION BY product_id ORDER BY started_at) AS ended_at
+FROM changes
+"""
+
+PRODUCT_STATS_QUERY = """
+SELECT r.product_id,
+       COALESCE(p.title, '') AS title,
+       SUM(r.available AND NOT r.initial) AS restocks,
+       AVG(CASE WHEN r.available AND NOT r.initial AND r.ended_at IS NOT NULL
+                THEN r.ended_at - r.started_at END) AS avg_sellout,
+       MIN(CASE WHEN r.available AND NOT r.initial AND r.ended_at IS NOT NULL
+                THEN r.ended_at - r.started_at END) AS fastest_sellout,
+       MIN(CASE WHEN r.available AND NOT r.initial THEN r.started_at END) AS first_restock,
+       MAX(CASE WHEN r.available AND NOT r.initial THEN r.started_at END) AS last_restock
+FROM analytics_runs r
+LEFT JOIN products p ON p.product_id = r.product_id
+GROUP BY r.product_id
+HAVING restocks > 0
+"""
+
+RESTOCK_HOUR_QUERY = """
+SELECT product_id, ((started_at + ?) / 3600) % 24 AS hour, COUNT(*) AS count
+FROM analytics_runs
+WHERE available AND NOT initial
+GROUP BY product_id, hour
+"""
+
+
+class StockAnalytics:
+    """
+    Historical statistics over an ObservationStore.
+
+    A restock is a product's total stock going from 0 to above 0 between two
+    observations; its sell-out time is how long it stayed above 0. Stock
+    already present at the first observation is not counted as a restock,
+    since its start is unknown. Precision is bounded by the polling interval
+    (and by hourly downsampling beyond the store's raw window).
+    """
+
+    def __init__(self, store: ObservationStore, since: Optional[int] = None):
+        """
+        Args:
+            store: ObservationStore to analyse
+            since: Only use observations at or after this UNIX timestamp (default: all)
+        """
+        self.conn = store.conn
+        self.since = since or 0
+        with self.conn:
+            self.conn.execute('DROP TABLE IF EXISTS temp.analytics_runs')
+            self.conn.execute(RUNS_QUERY, (self.since,))
+
+    def observed_range(self) -> Tuple[Optional[int], Optional[int], int]:
+        """
+        Returns:
+            tuple: (first observation, last observation, number of products observed)
+        """
+        return self.conn.execute(
+            'SELECT MIN(observed_at), MAX(observed_at), COUNT(DISTINCT product_id) '
+            'FROM observations WHERE observed_at >= ?',
+            (self.since,)
+        ).fetchone()
+
+    def product_stats(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Per-product restock statistics, fastest-selling first.
+
+        Args:
+            limit: Return at most this many products (default: all)
+
+        Returns:
+            list: dicts with product_id, title, restocks, avg_sellout and
+                  fastest_sellout (seconds, None if never sold out),
+                  restock_interval (mean seconds between restocks, None if
+                  restocked once), typical_hour (most common JST restock hour)
+                  and last_restock (UNIX timestamp)
+        """
+        hours: Dict[str, Tuple[int, int]] = {}
+        for product_id, hour, count in self.conn.execute(RESTOCK_HOUR_QUERY, (JST_OFFSET,)):
+            best = hours.get(product_id)
+            if best is None or count > best[1] or (count == best[1] and hour < best[0]):
+                hours[product_id] = (hour, count)
+
+        stats = []
+        for row in self.conn.execute(PRODUCT_STATS_QUERY):
+            product_id, title, restocks, avg_sellout, fastest, first_restock, last_restock = row
+            stats.append({
+                'product_id': product_id,
+                'title': title,
+                'restocks': restocks,
+                'avg_sellout': avg_sellout,
+                'fastest_sellout': fastest,
+                'restock_interval': (last_restock - first_restock) / (restocks - 1) if restocks > 1 else None,
+                'typical_hour': hours[product_id][0] if product_id in hours else None,
+                'last_restock': last_restock,
+            })
+
+        # Products that sold out come first, fastest average first; then by restock count
+        stats.sort(key=lambda s: (s['avg_sellout'] is None, s['avg_sellout'] or 0, -s['restocks']))
+        return stats[:limit] if limit else stats
+
+    def restock_hours(self) -> List[int]:
+        """Number of restocks in each JST hour of the day (index 0-23)"""
+        counts = [0] * 24
+        for hour, count in self.conn.execute(
+            'SELECT ((started_at + ?) / 3600) % 24 AS hour, COUNT(*) FROM analytics_runs '
+            'WHERE available AND NOT initial GROUP BY hour',
+            (JST_OFFSET,)
+        ):
+            counts[hour] = count
+        return counts
+
+    def depletion_curve(self, product_id: str) -> List[Tuple[int, int]]:
+        """
+        Stock over the product's latest in-stock run.
+
+        Returns:
+            list: (seconds since the run started, total stock) pairs, ending
+                  with a 0 point if the run sold out; empty if never in stock
+        """
+        run = self.conn.execute(
+            'SELECT started_at, ended_at FROM analytics_runs '
+            'WHERE product_id = ? AND available ORDER BY started_at DESC LIMIT 1',
+            (str(product_id),)
+        ).fetchone()
+        if not run:
+            return []
+
+        started_at, ended_at = run
+        points = self.conn.execute(
+            'SELECT observed_at - ?, SUM(stock) FROM observations '
+            'WHERE product_id = ? AND observed_at >= ? AND observed_at < ? '
+            'GROUP BY observed_at ORDER BY observed_at',
+            (started_at, str(product_id), started_at, ended_at if ended_at is not None else 2 ** 62)
+        ).fetchall()
+        if ended_at is not None:
+            points.append((ended_at - started_at, 0))
+        return points
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Human-readable duration in Japanese (e.g. '45秒', '12分', '3時間5分', '2.5日')"""
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    if seconds < 60:
+        return f'{seconds}秒'
+    if seconds < 3600:
+        return f'{seconds // 60}分'
+    if seconds < 86400:
+        hours, minutes = divmod(seconds // 60, 60)
+        return f'{hours}時間{minutes}分' if minutes else f'{hours}時間'
+    return f'{seconds / 86400:.1f}日'
+
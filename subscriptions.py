@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Subscriptions Module
+Routes notifications to recipients by collection and keyword, one digest per recipient
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+from keyword_matcher import compile_keyword
+from title_index import TitleIndex
+
+KINDS = ('in_stock', 'upcoming')
+
+
+class Subscription:
+    """
+    One recipient's watch list entry.
+
+    Attributes:
+        email: Recipient email address
+        collections: Collection IDs watched (None = every collection)
+        keyword: Keyword query (see keyword_matcher; '' = every product)
+        kinds: Notification kinds wanted ('in_stock', 'upcoming')
+    """
+
+    __slots__ = ('email', 'collections', 'keyword', 'kinds')
+
+    def __init__(self, email: str, collections: Optional[Iterable[int]] = None, keyword: str = '',
+                 kinds: Iterable[str] = KINDS):
+        self.email = email
+        self.collections = None if collections is None else tuple(collections)
+        self.keyword = keyword
+        self.kinds = tuple(kinds)
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> 'Subscription':
+        """
+        Build a Subscription from a config file entry
+
+        Raises:
+            ValueError: If the entry is malformed
+        """
+        if not isinstance(entry, dict) or not str(entry.get('email') or '').strip():
+            raise ValueError(f"invalid subscription entry: {entry!r}")
+
+        collections = entry.get('collections')
+        if collections is not None:
+            if not isinstance(collections, list):
+                collections = [collections]
+            try:
+                collections = [int(c) for c in collections]
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid collection ID in subscription: {entry!r}")
+
+        kinds = entry.get('kinds') or KINDS
+        if isinstance(kinds, str):
+            kinds = [kinds]
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            raise ValueError(f"unknown notification kind {unknown[0]!r} in subscription: {entry!r}")
+
+        return cls(str(entry['email']).strip(), collections, entry.get('keyword') or '', kinds)
+
+    def __repr__(self):
+        return f"Subscription({self.email!r}, collections={self.collections!r}, keyword={self.keyword!r})"
+
+
+class SubscriptionRegistry:
+    """
+    Every subscription, sharded by collection and notification kind.
+
+    Subscriptions sharing a keyword are grouped, so routing a digest
+    evaluates each distinct keyword once (through a TitleIndex of the
+    digest's products) no matter how many recipients watch it.
+    """
+
+    def __init__(self, subscriptions: Iterable[Subscription]):
+        """
+        Args:
+            subscriptions: Subscription objects
+        """
+        self.subscriptions = list(subscriptions)
+        # {collection_id or None (= all): {kind: {keyword: [email, ...]}}}
+        self._shards: Dict[Optional[int], Dict[str, Dict[str, List[str]]]] = {}
+
+        for sub in self.subscriptions:
+            for collection_id in sub.collections or (None,):
+                shard = self._shards.setdefault(collection_id, {})
+                for kind in sub.kinds:
+                    emails = shard.setdefault(kind, {}).setdefault(sub.keyword, [])
+                    if sub.email not in emails:
+                        emails.append(sub.email)
+
+    @classmethod
+    def load(cls, path: str) -> 'SubscriptionRegistry':
+        """
+        Load subscriptions from a JSON file
+
+        The file holds a list (or {"subscriptions": [...]}) of entries such as
+        {"email": "a@example.com", "collections": [223], "keyword": "LABUBU",
+        "kinds": ["in_stock"]}; only "email" is required.
+
+        Raises:
+            ValueError: If the file cannot be read or an entry is malformed
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"could not read {path}: {e}")
+        if isinstance(entries, dict):
+            entries = entries.get('subscriptions', [])
+        if not isinstance(entries, list):
+            raise ValueError(f"{path} must hold a list of subscriptions")
+        return cls(Subscription.from_dict(entry) for entry in entries)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    @property
+    def recipients(self) -> List[str]:
+        """Distinct recipient addresses, in file order"""
+        return list(dict.fromkeys(sub.email for sub in self.subscriptions))
+
+    @property
+    def collection_ids(self) -> List[int]:
+        """Collection IDs named by any subscription"""
+        return sorted(cid for cid in self._shards if cid is not None)
+
+    def covers(self, collection_id: int) -> bool:
+        """True if any subscription watches the collection"""
+        return None in self._shards or collection_id in self._shards
+
+    def route(self, kind: str, products: List[dict]) -> Dict[str, List[dict]]:
+        """
+        Split a notification into one digest per subscribed recipient.
+
+        Args:
+            kind: Notification kind ('in_stock' or 'upcoming')
+            products: Product.summary() dicts
+
+        Returns:
+            dict: {email: [product, ...]} in the order of products; recipients
+                  without a matching product are left out
+        """
+        by_collection: Dict[object, Dict[str, int]] = {}
+        for position, product in enumerate(products):
+            by_collection.setdefault(product.get('collection_id'), {})[str(product['id'])] = position
+
+        digests: Dict[str, set] = {}
+        for collection_id, positions in by_collection.items():
+            keywords: Dict[str, List[str]] = {}
+            for shard_id in (collection_id, None):
+                for keyword, emails in self._shards.get(shard_id, {}).get(kind, {}).items():
+                    keywords.setdefault(keyword, []).extend(emails)
+            if not keywords:
+                continue
+
+            index = TitleIndex()
+            index.sync_titles((pid, products[position]['title']) for pid, position in positions.items())
+
+            for keyword, emails in keywords.items():
+                matched = [positions[pid] for pid in index.search(compile_keyword(keyword))]
+                if not matched:
+                    continue
+                for email in emails:
+                    digests.setdefault(email, set()).update(matched)
+
+        return {email: [products[position] for position in sorted(matched)] for email, matched in digests.items()}
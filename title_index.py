@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Title Index Module
+Inverted n-gram index over normalized product titles for matching many keyword queries
+"""
+
+from typing import Dict, Iterable, Set, Tuple
+
+from keyword_matcher import DEFAULT_TITLE_CACHE, KeywordMatcher, TitleCache
+
+# Length of the indexed character n-grams
+GRAM_SIZE = 2
+
+
+def grams(text: str, size: int = GRAM_SIZE) -> Set[str]:
+    """Distinct character n-grams of a text (the text itself if shorter than size)"""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class TitleIndex:
+    """
+    Inverted index from title n-grams to product IDs.
+
+    A term's candidates are the intersection of the posting sets of its
+    n-grams, confirmed with a substring test on the few candidates, so a
+    query costs roughly its number of matches instead of one substring
+    test per product. It pays off when many queries run against the same
+    titles, as when routing a digest to every subscription's keyword; a
+    single query is cheaper with KeywordMatcher.filter().
+    """
+
+    def __init__(self, cache: TitleCache = DEFAULT_TITLE_CACHE):
+        """
+        Args:
+            cache: TitleCache providing normalized title keys
+        """
+        self.cache = cache
+        self.keys: Dict[str, str] = {}
+        self.postings: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _add(self, product_id: str, key: str):
+        self.keys[product_id] = key
+        for gram in grams(key):
+            self.postings.setdefault(gram, set()).add(product_id)
+
+    def _remove(self, product_id: str):
+        key = self.keys.pop(product_id)
+        for gram in grams(key):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(product_id)
+                if not posting:
+                    del self.postings[gram]
+
+    def sync_titles(self, titles: Iterable[Tuple[object, str]]) -> int:
+        """
+        Make the index reflect exactly these (product_id, title) pairs.
+
+        Only products whose title changed are re-indexed, and products not
+        listed are removed.
+
+        Returns:
+            int: Number of products (re-)indexed or removed
+        """
+        changed = 0
+        seen = set()
+
+        for product_id, title in titles:
+            product_id = str(product_id)
+            seen.add(product_id)
+            key = self.cache.key(product_id, title)
+            old = self.keys.get(product_id)
+            if old == key:
+                continue
+            if old is not None:
+                self._remove(product_id)
+            self._add(product_id, key)
+            changed += 1
+
+        for product_id in [pid for pid in self.keys if pid not in seen]:
+            self._remove(product_id)
+            changed += 1
+
+        return changed
+
+    def _term(self, variants) -> Set[str]:
+        """IDs of products containing any variant of a term"""
+        found = set()
+        for variant in variants:
+            term_grams = grams(variant)
+            if len(variant) < GRAM_SIZE:
+                # Too short to index: test every product
+                candidates = self.keys
+            else:
+                postings = sorted((self.postings.get(g, set()) for g in term_grams), key=len)
+                candidates = set.intersection(*postings) if postings else set()
+            found.update(pid for pid in candidates if variant in self.keys[pid])
+        return found
+
+    def search(self, matcher: KeywordMatcher) -> Set[str]:
+        """
+        IDs of the products matching a compiled query.
+
+        Args:
+            matcher: KeywordMatcher (an empty one matches every product)
+
+        Returns:
+            set: Matching product IDs (as strings)
+        """
+        if not matcher.clauses:
+            return set(self.keys)
+
+        matched = set()
+        for required, excluded in matcher.clauses:
+            if required:
+                # Stop intersecting as soon as nothing is left
+                clause = None
+                for variants in required:
+                    ids = self._term(variants)
+                    clause = ids if clause is None else clause & ids
+                    if not clause:
+                        break
+            else:
+                clause = set(self.keys)
+            for variants in excluded:
+                if not clause:
+                    break
+                clause -= self._term(variants)
+            matched |= clause
+        return matched